@@ -0,0 +1,296 @@
+"""
+Пакетная генерация планов питания для JSONL файла с UserInput.
+
+Примеры:
+    python batch.py users.jsonl -o plans.jsonl --workers 8
+    python batch.py users.jsonl -o plans.jsonl --append
+    python batch.py users.jsonl -o plans.jsonl --shopping shopping.json
+    python batch.py users.jsonl -o plans.jsonl --store plans.store
+    cat users.jsonl | python batch.py - > plans.jsonl
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+from typing import AbstractSet, Any, Dict, List, Optional, Set, TextIO
+
+from src.models.schemas import UserInput
+from src.graph.workflow import MealPlannerWorkflow
+from src.utils.metrics import SINKS, write_metrics
+from src.utils.plan_store import PlanStore
+from src.utils.scheduler import get_scheduler, llm_priority
+from src.utils.shopping import ShoppingListAggregator
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Возвращает перцентиль отсортированного списка (ближайший ранг).
+    
+    Args:
+        values: Отсортированные значения
+        q: Перцентиль от 0 до 100
+        
+    Returns:
+        float: Значение перцентиля или 0, если список пуст
+    """
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(q / 100 * len(values))) - 1))
+    return values[rank]
+
+
+def completed_indices(path: str) -> Set[int]:
+    """
+    Собирает индексы записей, уже записанных в файл результатов.
+    
+    Результаты пишутся в порядке завершения, поэтому продолжение прерванного
+    запуска пропускает именно эти индексы, а не первые N записей. Строка,
+    оборванная при прерывании, не учитывается, и запись обрабатывается заново.
+    
+    Args:
+        path: JSONL файл результатов
+        
+    Returns:
+        Set: Индексы готовых записей; пустое множество, если файла нет
+    """
+    indices: Set[int] = set()
+    if not os.path.exists(path):
+        return indices
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and isinstance(record.get("index"), int):
+                indices.add(record["index"])
+    return indices
+
+
+def _terminate_last_line(output: TextIO) -> None:
+    """Завершает строку, оборванную при прерывании, чтобы дописанные записи начинались с новой строки."""
+    if output.tell() == 0:
+        return
+    with open(output.name, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            output.write("\n")
+
+
+async def _read_records(
+    stream: TextIO,
+    queue: asyncio.Queue,
+    skip: AbstractSet[int],
+    limit: Optional[int],
+    workers: int
+) -> None:
+    """Читает записи построчно и кладет их в очередь, не загружая файл целиком."""
+    loop = asyncio.get_running_loop()
+    index = 0
+    queued = 0
+    while limit is None or queued < limit:
+        line = await loop.run_in_executor(None, stream.readline)
+        if not line:
+            break
+        if not line.strip():
+            continue
+        if index not in skip:
+            await queue.put((index, line))
+            queued += 1
+        index += 1
+    
+    # Сигнал завершения для каждого воркера
+    for _ in range(workers):
+        await queue.put(None)
+
+
+async def _worker(
+    workflow: MealPlannerWorkflow,
+    queue: asyncio.Queue,
+    output: TextIO,
+    latencies: List[float],
+    counters: Dict[str, int],
+    shopping: Optional[ShoppingListAggregator] = None,
+    store: Optional[PlanStore] = None
+) -> None:
+    """Берет записи из очереди и пишет результаты в порядке завершения."""
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        index, line = item
+        
+        started = time.perf_counter()
+        record: Dict[str, Any] = {"index": index, "user_input": None, "final_plan": None, "error": None}
+        try:
+            user_input = UserInput.model_validate_json(line)
+            record["user_input"] = user_input.model_dump()
+            final_state = await workflow.arun(user_input)
+            if final_state.get("final_plan"):
+                record["final_plan"] = final_state["final_plan"].model_dump()
+                if shopping is not None:
+                    shopping.add_plan(final_state["final_plan"])
+                if store is not None:
+                    store.add(record["final_plan"])
+            else:
+                record["error"] = final_state.get("error") or "План не был создан"
+        except Exception as e:
+            record["error"] = str(e)
+        
+        latency = time.perf_counter() - started
+        record["latency_s"] = round(latency, 3)
+        latencies.append(latency)
+        counters["failed" if record["error"] else "succeeded"] += 1
+        
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+
+
+async def run_batch(
+    source: TextIO,
+    output: TextIO,
+    workers: int = 4,
+    skip: AbstractSet[int] = frozenset(),
+    limit: Optional[int] = None,
+    shopping: Optional[ShoppingListAggregator] = None,
+    store: Optional[PlanStore] = None
+) -> Dict[str, Any]:
+    """
+    Прогоняет записи из source через MealPlannerWorkflow.
+    
+    Args:
+        source: Поток с JSONL записями UserInput
+        output: Поток для JSONL результатов
+        workers: Число одновременно обрабатываемых записей
+        skip: Индексы записей, которые уже есть в файле результатов (продолжение прерванного запуска)
+        limit: Максимум обрабатываемых записей
+        shopping: Агрегатор общего списка покупок по всем планам
+        store: Колоночное хранилище, в которое дописываются планы
+        
+    Returns:
+        Dict: Сводка по пропускной способности и задержкам
+    """
+    workflow = MealPlannerWorkflow(max_concurrency=workers)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    latencies: List[float] = []
+    counters = {"succeeded": 0, "failed": 0}
+    
+    started = time.perf_counter()
+    # Запросы пакета уступают очередь интерактивным запросам процесса
+    with llm_priority("batch"):
+        await asyncio.gather(
+            _read_records(source, queue, skip, limit, workers),
+            *(_worker(workflow, queue, output, latencies, counters, shopping, store) for _ in range(workers))
+        )
+    elapsed = time.perf_counter() - started
+    
+    latencies.sort()
+    processed = counters["succeeded"] + counters["failed"]
+    return {
+        "processed": processed,
+        "succeeded": counters["succeeded"],
+        "failed": counters["failed"],
+        "elapsed_s": elapsed,
+        "throughput_per_min": processed / elapsed * 60 if elapsed else 0.0,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "latency_max_s": latencies[-1] if latencies else 0.0,
+        "plan_reuse": workflow.plan_index.stats() if workflow.plan_index is not None else None,
+        "scheduler": get_scheduler().stats()
+    }
+
+
+def print_batch_summary(summary: Dict[str, Any], stream: TextIO = sys.stderr) -> None:
+    """
+    Выводит итоговую статистику пакетного запуска.
+    
+    Args:
+        summary: Результат run_batch
+        stream: Поток для вывода
+    """
+    print("\n" + "="*60, file=stream)
+    print("📦 ИТОГИ ПАКЕТНОЙ ГЕНЕРАЦИИ", file=stream)
+    print("="*60, file=stream)
+    print(f"Обработано: {summary['processed']} "
+          f"(успешно: {summary['succeeded']}, с ошибкой: {summary['failed']})", file=stream)
+    print(f"Время: {summary['elapsed_s']:.1f} с | "
+          f"Пропускная способность: {summary['throughput_per_min']:.1f} планов/мин", file=stream)
+    print(f"Задержка: p50 {summary['latency_p50_s']:.2f} с | "
+          f"p95 {summary['latency_p95_s']:.2f} с | "
+          f"max {summary['latency_max_s']:.2f} с", file=stream)
+    reuse = summary.get("plan_reuse")
+    if reuse is not None:
+        print(f"Повторное использование планов: {reuse['hits']} из {reuse['hits'] + reuse['misses']} "
+              f"({reuse['hit_rate']:.0%}), отклонено проверкой: {reuse['rejected']}, "
+              f"планов в индексе: {reuse['plans']}", file=stream)
+    scheduler = summary.get("scheduler")
+    if scheduler is not None:
+        print(f"Запросы к модели: лимит одновременных {scheduler['limit']}, "
+              f"ответов 429: {scheduler['throttled']}", file=stream)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Пакетная генерация планов питания")
+    parser.add_argument("input", help="JSONL файл с UserInput или '-' для stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL файл результатов или '-' для stdout")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Число параллельных запусков")
+    parser.add_argument("--limit", type=int, default=None, help="Обработать не более N записей")
+    parser.add_argument("--append", action="store_true", help="Дописывать в файл результатов, пропуская уже записанные в него индексы")
+    parser.add_argument("--metrics", choices=sorted(SINKS), default=None,
+                        help="Вывести метрики узлов и вызовов модели в stderr в заданном формате")
+    parser.add_argument("--shopping", default=None,
+                        help="JSON файл для общего списка покупок по всем планам запуска")
+    parser.add_argument("--store", default=None,
+                        help="Каталог колоночного хранилища, в которое дописываются планы")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Точка входа пакетного режима."""
+    args = parse_args(argv)
+    # Прогресс узлов пишется через logging в stderr и не смешивается с JSONL в stdout
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    
+    skip: Set[int] = set()
+    with contextlib.ExitStack() as stack:
+        source = sys.stdin if args.input == "-" else stack.enter_context(
+            open(args.input, encoding="utf-8")
+        )
+        if args.output == "-":
+            output = sys.stdout
+            # Прогресс узлов не должен смешиваться с JSONL в stdout
+            stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        else:
+            output = stack.enter_context(
+                open(args.output, "a" if args.append else "w", encoding="utf-8")
+            )
+            if args.append:
+                # Готовые записи берутся из самого файла результатов
+                skip = completed_indices(args.output)
+                _terminate_last_line(output)
+        
+        shopping = ShoppingListAggregator() if args.shopping else None
+        # Буфер хранилища сбрасывается на диск при выходе из ExitStack
+        store = stack.enter_context(PlanStore(args.store)) if args.store else None
+        summary = asyncio.run(
+            run_batch(source, output, args.workers, skip, args.limit, shopping, store)
+        )
+    
+    print_batch_summary(summary)
+    if shopping is not None:
+        with open(args.shopping, "w", encoding="utf-8") as f:
+            json.dump(shopping.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"🛒 Список покупок ({shopping.plans} планов): {args.shopping}", file=sys.stderr)
+    if store is not None:
+        print(f"🗄️ Хранилище планов ({len(store)} планов): {args.store}", file=sys.stderr)
+    if args.metrics:
+        write_metrics(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
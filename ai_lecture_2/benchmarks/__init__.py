@@ -0,0 +1,3 @@
+"""
+Бенчмарки агентной системы. Запуск из корня проекта: python -m benchmarks.<имя>
+"""
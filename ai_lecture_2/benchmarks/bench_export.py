@@ -0,0 +1,87 @@
+"""
+Бенчмарк экспорта планов: сборка документов и пакетная запись в пуле процессов.
+
+Замеряется время сборки эталонного плана в каждом формате и пропускная
+способность export_batch (файлов в секунду) при разном числе процессов.
+
+Запуск:
+    python -m benchmarks.bench_export
+    python -m benchmarks.bench_export --plans 5000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence
+
+from benchmarks.common import load_sample_plan, measure, save_results
+from src.utils.renderers import RENDERERS, export_batch, render
+
+
+def bench_render(iterations: int) -> Dict[str, Dict[str, float]]:
+    """Сборка документа эталонного плана в каждом формате."""
+    plan = load_sample_plan()
+    return {
+        f"render.{fmt}": measure(lambda fmt=fmt: render(plan, fmt), iterations)
+        for fmt in RENDERERS
+    }
+
+
+def bench_batch(plans: int, workers: Sequence[int], formats: Sequence[str]) -> Dict[str, Dict[str, float]]:
+    """
+    Пакетный экспорт plans планов для каждого числа процессов.
+    
+    Args:
+        plans: Число планов
+        workers: Варианты числа процессов
+        formats: Форматы экспорта
+        
+    Returns:
+        Dict: Время и пропускная способность для каждого варианта
+    """
+    plan = load_sample_plan()
+    results = {}
+    for count in workers:
+        with tempfile.TemporaryDirectory() as directory:
+            started = time.perf_counter()
+            written = export_batch(((str(i), plan) for i in range(plans)), directory, formats, count)
+            elapsed = time.perf_counter() - started
+        results[f"export_batch.workers_{count}"] = {
+            "elapsed_s": elapsed,
+            "files": written,
+            "files_per_s": written / elapsed if elapsed else 0.0
+        }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description="Бенчмарк экспорта планов")
+    parser.add_argument("--iterations", type=int, default=200, help="Повторов сборки документа")
+    parser.add_argument("--plans", type=int, default=2000, help="Планов в пакетном экспорте")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1],
+                        help="Варианты числа процессов")
+    parser.add_argument("--formats", nargs="+", choices=sorted(RENDERERS), default=sorted(RENDERERS),
+                        help="Форматы пакетного экспорта")
+    parser.add_argument("--output", help="Путь к JSON с результатами")
+    args = parser.parse_args(argv)
+    
+    render_results = bench_render(args.iterations)
+    print(f"{'формат':<16} {'среднее, мс':>12} {'оп/с':>10}")
+    for name, result in render_results.items():
+        print(f"{name:<16} {result['mean_ms']:>12.3f} {result['ops_per_s']:>10.0f}")
+    
+    batch_results = bench_batch(args.plans, sorted(set(args.workers)), args.formats)
+    print(f"\n{'процессов':<24} {'время, с':>10} {'файлов/с':>10}")
+    for name, result in batch_results.items():
+        print(f"{name:<24} {result['elapsed_s']:>10.2f} {result['files_per_s']:>10.0f}")
+    
+    path = save_results("export", {
+        "params": {"plans": args.plans, "formats": args.formats, "cpu_count": os.cpu_count()},
+        "results": {**render_results, **batch_results}
+    }, args.output)
+    print(f"\n💾 Результаты сохранены: {path}")
+
+
+if __name__ == "__main__":
+    main()
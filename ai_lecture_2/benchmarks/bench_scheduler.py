@@ -0,0 +1,151 @@
+"""
+Бенчмарк планировщика запросов против локальной имитации квот провайдера.
+
+Стабовая модель стоит за ThrottlingLLM, который отвечает 429 сверх квоты
+запросов в окне и сверх лимита одновременных запросов. Сравниваются:
+- direct: все запросы сразу, без планировщика (как до него);
+- quota: планировщик с квотой, равной квоте провайдера;
+- adaptive: планировщик без квоты, лимит одновременных запросов подбирается по 429;
+- priority: половина запросов пакетные, половина интерактивные.
+
+Окно квоты сокращено до --window секунд, чтобы прогон занимал секунды.
+
+Запуск:
+    python -m benchmarks.bench_scheduler
+    python -m benchmarks.bench_scheduler --requests 400 --quota 50 --provider-concurrency 8
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import save_results, stub_llm
+from src.utils.llm_backends import RateLimitError, ThrottlingLLM
+from src.utils.scheduler import RequestScheduler, llm_priority
+
+
+PROMPT = "Составь рекомендации по питанию"
+
+
+async def _call(llm: ThrottlingLLM, scheduler: Optional[RequestScheduler], waits: List[float]) -> bool:
+    """Один запрос; True, если модель ответила."""
+    started = time.perf_counter()
+    try:
+        if scheduler is None:
+            await llm.ainvoke(PROMPT)
+        else:
+            async with scheduler.aslot(100):
+                waits.append(time.perf_counter() - started)
+                await llm.ainvoke(PROMPT)
+    except RateLimitError:
+        return False
+    return True
+
+
+async def _run(
+    llm: ThrottlingLLM,
+    scheduler: Optional[RequestScheduler],
+    requests: int,
+    batch_share: float = 0.0
+) -> Dict[str, Any]:
+    """Отправляет requests запросов одновременно и собирает итоги."""
+    waits: Dict[str, List[float]] = {"interactive": [], "batch": []}
+    batch_count = int(requests * batch_share)
+    
+    async def submit(priority: str) -> bool:
+        with llm_priority(priority):
+            return await _call(llm, scheduler, waits[priority])
+    
+    started = time.perf_counter()
+    # Пакетные запросы ставятся в очередь первыми: интерактивные должны их обогнать
+    results = await asyncio.gather(
+        *(submit("batch") for _ in range(batch_count)),
+        *(submit("interactive") for _ in range(requests - batch_count))
+    )
+    elapsed = time.perf_counter() - started
+    result = {
+        "succeeded": sum(results),
+        "throttled": llm.stats()["rejected"],
+        "peak_concurrency": llm.stats()["peak_concurrency"],
+        "elapsed_s": elapsed
+    }
+    if scheduler is not None:
+        result["final_limit"] = scheduler.stats()["limit"]
+        for priority, values in waits.items():
+            if values:
+                result[f"wait_{priority}_s"] = sum(values) / len(values)
+    return result
+
+
+def bench_scheduler(
+    requests: int,
+    quota: int,
+    window: float,
+    provider_concurrency: int,
+    latency: float
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Прогоняет все сценарии.
+    
+    Args:
+        requests: Запросов в сценарии
+        quota: Квота провайдера (запросов в окне)
+        window: Длина окна квоты, с
+        provider_concurrency: Лимит одновременных запросов провайдера
+        latency: Задержка ответа стабовой модели, с
+        
+    Returns:
+        Dict: Итоги по сценариям
+    """
+    def provider(limited_quota: bool = True) -> ThrottlingLLM:
+        return ThrottlingLLM(
+            stub_llm(latency),
+            requests_per_window=quota if limited_quota else 0,
+            window_s=window,
+            max_concurrency=provider_concurrency
+        )
+    
+    return {
+        "direct": asyncio.run(_run(provider(), None, requests)),
+        "quota": asyncio.run(_run(
+            provider(),
+            RequestScheduler(requests_per_minute=quota, max_concurrency=provider_concurrency, period_s=window),
+            requests
+        )),
+        "adaptive": asyncio.run(_run(provider(limited_quota=False), RequestScheduler(max_concurrency=64), requests)),
+        "priority": asyncio.run(_run(
+            provider(),
+            RequestScheduler(requests_per_minute=quota, max_concurrency=provider_concurrency, period_s=window),
+            requests,
+            batch_share=0.5
+        ))
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description="Бенчмарк планировщика запросов к модели")
+    parser.add_argument("--requests", type=int, default=200, help="Запросов в сценарии")
+    parser.add_argument("--quota", type=int, default=40, help="Квота провайдера, запросов в окне")
+    parser.add_argument("--window", type=float, default=1.0, help="Длина окна квоты, с")
+    parser.add_argument("--provider-concurrency", type=int, default=8,
+                        help="Лимит одновременных запросов провайдера")
+    parser.add_argument("--latency", type=float, default=0.02, help="Задержка стабовой модели, с")
+    parser.add_argument("--output", help="Путь к JSON с результатами")
+    args = parser.parse_args(argv)
+    
+    results = bench_scheduler(args.requests, args.quota, args.window, args.provider_concurrency, args.latency)
+    print(f"{'сценарий':<10} {'успешно':>8} {'429':>6} {'пик':>5} {'лимит':>6} {'время, с':>9}")
+    for name, result in results.items():
+        print(f"{name:<10} {result['succeeded']:>8} {result['throttled']:>6} {result['peak_concurrency']:>5} "
+              f"{result.get('final_limit', '-'):>6} {result['elapsed_s']:>9.2f}")
+    priority = results["priority"]
+    print(f"\nОжидание в очереди: интерактивные {priority.get('wait_interactive_s', 0):.2f} с, "
+          f"пакетные {priority.get('wait_batch_s', 0):.2f} с")
+    
+    path = save_results("scheduler", {"params": vars(args), "results": results}, args.output)
+    print(f"\n💾 Результаты сохранены: {path}")
+
+
+if __name__ == "__main__":
+    main()
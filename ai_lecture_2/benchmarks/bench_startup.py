@@ -0,0 +1,104 @@
+"""
+Бенчмарк холодного старта: время импорта в новом процессе интерпретатора.
+
+Запуск:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 20 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+
+# Сценарии: что импортирует процесс
+SCENARIOS = {
+    "python": "pass",
+    "schemas": "import src.models.schemas",
+    "visualizer": "import src.utils.visualizer",
+    "cli": "import main",
+    "batch_cli": "import batch",
+    "workflow": "from src.graph.workflow import MealPlannerWorkflow",
+}
+
+# Модули, появление которых означает загрузку LLM стека
+HEAVY_MODULES = ("langchain", "langchain_core", "langchain_google_genai", "langgraph", "numpy")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+print(json.dumps({{"import_s": elapsed, "heavy": heavy}}))
+"""
+
+
+def measure(statement: str, repeat: int) -> Dict[str, object]:
+    """
+    Запускает statement в отдельных процессах и замеряет время.
+    
+    Args:
+        statement: Код для выполнения (обычно импорт)
+        repeat: Число запусков
+        
+    Returns:
+        Dict: Медианы полного времени процесса и времени импорта, загруженные тяжелые модули
+    """
+    import time
+    
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = _PROBE.format(statement=statement, heavy=HEAVY_MODULES)
+    process_times: List[float] = []
+    import_times: List[float] = []
+    heavy: List[str] = []
+    
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=project_root,
+            capture_output=True,
+            text=True
+        )
+        process_times.append(time.perf_counter() - started)
+        if result.returncode != 0:
+            return {"error": result.stderr.strip().splitlines()[-1]}
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        import_times.append(probe["import_s"])
+        heavy = probe["heavy"]
+    
+    return {
+        "process_s": statistics.median(process_times),
+        "import_s": statistics.median(import_times),
+        "heavy_modules": heavy
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description="Бенчмарк холодного старта")
+    parser.add_argument("--repeat", type=int, default=10, help="Запусков на сценарий")
+    parser.add_argument("--json", help="Сохранить результаты в JSON файл")
+    args = parser.parse_args(argv)
+    
+    results = {name: measure(statement, args.repeat) for name, statement in SCENARIOS.items()}
+    
+    print(f"{'сценарий':<12} {'процесс, мс':>12} {'импорт, мс':>12}  тяжелые модули")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<12} ошибка: {result['error']}")
+            continue
+        print(f"{name:<12} {result['process_s'] * 1000:>12.1f} {result['import_s'] * 1000:>12.1f}  "
+              f"{', '.join(result['heavy_modules']) or '-'}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
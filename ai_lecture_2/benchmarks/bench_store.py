@@ -0,0 +1,132 @@
+"""
+Бенчмарк колоночного хранилища планов против архива JSON.
+
+Архив из вариаций эталонного плана сохраняется как JSON файлы (по одному на
+план, с отступами, как meal_plan.json) и как PlanStore. Сравниваются размер
+на диске, время подсчета калорий приемов пищи по всем планам и время сборки
+отдельных планов из хранилища.
+
+Запуск:
+    python -m benchmarks.bench_store
+    python -m benchmarks.bench_store --plans 100000
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import load_sample_plan, save_results
+from src.utils.plan_store import PlanStore
+
+
+def make_plans(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Вариации эталонного плана с разной калорийностью приемов пищи."""
+    rng = random.Random(seed)
+    sample = load_sample_plan()
+    plans = []
+    for _ in range(count):
+        plan = copy.deepcopy(sample)
+        for day in plan["week_plan"]:
+            for meal in day["meals"]:
+                meal["calories"] = round(meal["calories"] * rng.uniform(0.8, 1.2), 1)
+        plans.append(plan)
+    return plans
+
+
+def _directory_size(directory: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+
+def bench_store(plans: List[Dict[str, Any]], reads: int) -> Dict[str, Dict[str, float]]:
+    """
+    Замеры JSON архива и хранилища на одних и тех же планах.
+    
+    Args:
+        plans: Планы
+        reads: Сколько планов собрать из хранилища
+        
+    Returns:
+        Dict: Размер, время записи и подсчета для каждого варианта
+    """
+    import numpy as np
+    
+    with tempfile.TemporaryDirectory() as directory:
+        archive = os.path.join(directory, "json")
+        os.makedirs(archive)
+        started = time.perf_counter()
+        for i, plan in enumerate(plans):
+            with open(os.path.join(archive, f"meal_plan_{i:06d}.json"), "w", encoding="utf-8") as f:
+                json.dump(plan, f, ensure_ascii=False, indent=2)
+        json_write = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        json_calories = []
+        for name in sorted(os.listdir(archive)):
+            with open(os.path.join(archive, name), encoding="utf-8") as f:
+                plan = json.load(f)
+            json_calories.append(sum(meal["calories"] for day in plan["week_plan"] for meal in day["meals"]))
+        json_scan = time.perf_counter() - started
+        
+        store_path = os.path.join(directory, "store")
+        started = time.perf_counter()
+        with PlanStore(store_path) as store:
+            store.append(plans)
+        store_write = time.perf_counter() - started
+        
+        # Новый экземпляр: чтение начинается с открытия файлов, как у отдельного процесса
+        started = time.perf_counter()
+        store = PlanStore(store_path)
+        store_calories = np.bincount(store.plan_ids("meals"), weights=store.column("meals", "calories"))
+        store_scan = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        for index in range(min(reads, len(store))):
+            store.get(index)
+        store_get = time.perf_counter() - started
+        
+        error = float(np.abs(store_calories - np.array(json_calories)).max())
+        return {
+            "json": {
+                "bytes_per_plan": _directory_size(archive) / len(plans),
+                "write_s": json_write,
+                "scan_calories_s": json_scan
+            },
+            "store": {
+                "bytes_per_plan": store.size_bytes() / len(plans),
+                "write_s": store_write,
+                "scan_calories_s": store_scan,
+                "get_ms": store_get / max(min(reads, len(store)), 1) * 1000,
+                "max_abs_error_kcal": error
+            }
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description="Бенчмарк колоночного хранилища планов")
+    parser.add_argument("--plans", type=int, default=10000, help="Планов в архиве")
+    parser.add_argument("--reads", type=int, default=1000, help="Планов, собираемых из хранилища")
+    parser.add_argument("--output", help="Путь к JSON с результатами")
+    args = parser.parse_args(argv)
+    
+    results = bench_store(make_plans(args.plans), args.reads)
+    json_result, store_result = results["json"], results["store"]
+    print(f"{'':<8} {'байт/план':>10} {'запись, с':>10} {'калории, с':>11}")
+    for name, result in results.items():
+        print(f"{name:<8} {result['bytes_per_plan']:>10.0f} {result['write_s']:>10.2f} "
+              f"{result['scan_calories_s']:>11.3f}")
+    print(f"\nРазмер меньше в {json_result['bytes_per_plan'] / store_result['bytes_per_plan']:.1f} раза, "
+          f"подсчет быстрее в {json_result['scan_calories_s'] / max(store_result['scan_calories_s'], 1e-9):.0f} раз")
+    print(f"Сборка плана из хранилища: {store_result['get_ms']:.2f} мс, "
+          f"расхождение калорий (float32): {store_result['max_abs_error_kcal']:.4f} ккал")
+    
+    path = save_results("store", {"params": {"plans": args.plans}, "results": results}, args.output)
+    print(f"\n💾 Результаты сохранены: {path}")
+
+
+if __name__ == "__main__":
+    main()
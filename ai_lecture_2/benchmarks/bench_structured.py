@@ -0,0 +1,111 @@
+"""
+Бенчмарк текстового и нативного структурированного режимов ответа.
+
+Для PreferencesAgent и FinalAgent сравниваются размер промпта (токены),
+время вызова агента и время парсинга ответа на нашей стороне. Модель -
+стабовая, поэтому разница в латентности отражает только накладные расходы
+промптов и парсинга; экономию на стороне модели показывают токены промпта.
+
+Запуск:
+    python -m benchmarks.bench_structured
+    python -m benchmarks.bench_structured --iterations 50 --latency 0.05
+"""
+import argparse
+from typing import Any, Dict, List, Optional
+
+from benchmarks.bench_workflow import SAMPLE_INPUT, build_workflow
+from benchmarks.common import measure, quiet, save_results
+from src.utils.metrics import get_metrics
+from src.utils.nutrition_calculator import calculate_nutrition
+
+
+def _agent_stats(snapshot: Dict[str, Any], agent: str) -> Dict[str, float]:
+    """Средние на вызов модели: токены промпта, длительность вызова и парсинга."""
+    def counter(name: str) -> float:
+        return sum(
+            item["value"] for item in snapshot["counters"].get(name, [])
+            if item["labels"].get("agent") == agent
+        )
+    
+    def histogram(name: str) -> Dict[str, float]:
+        items = [
+            item for item in snapshot["histograms"].get(name, [])
+            if item["labels"].get("agent") == agent
+        ]
+        return {
+            "count": sum(item["count"] for item in items),
+            "sum": sum(item["sum"] for item in items)
+        }
+    
+    calls = counter("llm_calls_total") or 1
+    parse = histogram("parse_duration_seconds")
+    return {
+        "prompt_tokens": counter("llm_prompt_tokens_total") / calls,
+        "parse_ms": parse["sum"] / calls * 1000,
+        "fallbacks": counter("structured_output_fallbacks_total")
+    }
+
+
+def bench_mode(structured: bool, iterations: int, latency_s: float) -> Dict[str, Dict[str, float]]:
+    """
+    Замеряет агентов в одном режиме.
+    
+    Args:
+        structured: Использовать нативный структурированный вывод
+        iterations: Повторов на агента
+        latency_s: Задержка стабовой модели
+        
+    Returns:
+        Dict: Результаты по агентам
+    """
+    workflow = build_workflow(latency_s)
+    preferences_agent = workflow.preferences_agent
+    final_agent = workflow.final_agent
+    preferences_agent.structured_output = structured
+    final_agent.structured_output = structured
+    
+    nutrition = calculate_nutrition(SAMPLE_INPUT)
+    preferences = preferences_agent.analyze(SAMPLE_INPUT)
+    
+    results = {}
+    metrics = get_metrics()
+    for name, fn in (
+        ("preferences", lambda: preferences_agent.analyze(SAMPLE_INPUT)),
+        ("final", lambda: final_agent.create_plan(SAMPLE_INPUT, nutrition, preferences))
+    ):
+        metrics.reset()
+        with quiet():
+            timing = measure(fn, iterations)
+        results[name] = {"mean_ms": timing["mean_ms"], **_agent_stats(metrics.snapshot(), name)}
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description="Сравнение текстового и структурированного режимов")
+    parser.add_argument("--iterations", type=int, default=20, help="Повторов на агента")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка стабовой модели, с")
+    parser.add_argument("--output", help="Путь к JSON с результатами")
+    args = parser.parse_args(argv)
+    
+    modes = {
+        "text": bench_mode(False, args.iterations, args.latency),
+        "structured": bench_mode(True, args.iterations, args.latency)
+    }
+    
+    print(f"{'агент':<14} {'режим':<12} {'токены промпта':>15} {'вызов, мс':>10} {'парсинг, мс':>12}")
+    for agent in ("preferences", "final"):
+        for mode, results in modes.items():
+            result = results[agent]
+            print(f"{agent:<14} {mode:<12} {result['prompt_tokens']:>15.0f} "
+                  f"{result['mean_ms']:>10.3f} {result['parse_ms']:>12.3f}")
+    
+    path = save_results("structured", {
+        "params": {"iterations": args.iterations, "latency_s": args.latency},
+        "modes": modes
+    }, args.output)
+    print(f"\n💾 Результаты сохранены: {path}")
+
+
+if __name__ == "__main__":
+    main()
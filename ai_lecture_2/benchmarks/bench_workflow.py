@@ -0,0 +1,190 @@
+"""
+Бенчмарк накладных расходов оркестрации на стабовой модели.
+
+Стабовая модель отвечает мгновенно (или с заданной задержкой), поэтому
+замеры показывают стоимость форматирования промптов, парсинга ответов,
+графа LangGraph и визуализации без учета сети.
+
+Запуск:
+    python -m benchmarks.bench_workflow
+    python -m benchmarks.bench_workflow --latency 0.05 --concurrency 1 8 32
+    python -m benchmarks.bench_workflow --compare benchmarks/results/workflow-abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import (
+    load_sample_plan,
+    measure,
+    print_comparison,
+    quiet,
+    save_results,
+    stub_llm
+)
+from src.graph.workflow import MealPlannerWorkflow
+from src.models.schemas import UserInput
+from src.utils.cache import PersistentLRUCache
+from src.utils.nutrition_calculator import calculate_nutrition
+from src.utils.visualizer import (
+    export_to_markdown,
+    generate_shopping_list,
+    print_shopping_list,
+    print_weekly_plan
+)
+
+
+SAMPLE_INPUT = UserInput(
+    goal="gain_weight",
+    gender="male",
+    weight=75.0,
+    height=180.0,
+    age=28,
+    preferences="Нет особых предпочтений"
+)
+
+
+def build_workflow(latency_s: float, max_concurrency: int = 16) -> MealPlannerWorkflow:
+    """
+    Создает workflow, все агенты которого используют стабовую модель.
+    
+    Кэш предпочтений отключен, чтобы каждый запуск проходил весь путь.
+    """
+    workflow = MealPlannerWorkflow(max_concurrency=max_concurrency)
+    llm = stub_llm(latency_s)
+    workflow.nutrition_agent.llm = llm
+    workflow.preferences_agent.llm = llm
+    workflow.preferences_agent.cache = PersistentLRUCache(path=None, max_size=0)
+    workflow.final_agent.llm = llm
+    return workflow
+
+
+def bench_agents(workflow: MealPlannerWorkflow, iterations: int) -> Dict[str, Dict[str, float]]:
+    """Форматирование промптов и PydanticOutputParser.parse для каждого агента."""
+    nutrition = calculate_nutrition(SAMPLE_INPUT)
+    llm = stub_llm()
+    preferences_prompt = workflow.preferences_agent._format_prompt(SAMPLE_INPUT)
+    preferences_text = llm.invoke(preferences_prompt).content
+    preferences = workflow.preferences_agent.output_parser.parse(preferences_text)
+    final_prompt = workflow.final_agent._format_prompt(SAMPLE_INPUT, nutrition, preferences)
+    plan_text = llm.invoke(final_prompt).content
+    
+    return {
+        "nutrition.calculate": measure(lambda: calculate_nutrition(SAMPLE_INPUT), iterations),
+        "nutrition.format_prompt": measure(
+            lambda: workflow.nutrition_agent._format_prompt(SAMPLE_INPUT, nutrition), iterations
+        ),
+        "preferences.format_prompt": measure(
+            lambda: workflow.preferences_agent._format_prompt(SAMPLE_INPUT), iterations
+        ),
+        "preferences.parse": measure(
+            lambda: workflow.preferences_agent.output_parser.parse(preferences_text), iterations
+        ),
+        "final.format_prompt": measure(
+            lambda: workflow.final_agent._format_prompt(SAMPLE_INPUT, nutrition, preferences), iterations
+        ),
+        "final.parse": measure(
+            lambda: workflow.final_agent.output_parser.parse(plan_text), iterations
+        ),
+    }
+
+
+def bench_visualizer(iterations: int) -> Dict[str, Dict[str, float]]:
+    """Функции визуализации на эталонном плане."""
+    plan = load_sample_plan()
+    with tempfile.TemporaryDirectory() as tmp:
+        markdown_path = os.path.join(tmp, "plan.md")
+        with quiet():
+            return {
+                "visualizer.print_weekly_plan": measure(lambda: print_weekly_plan(plan), iterations),
+                "visualizer.print_shopping_list": measure(lambda: print_shopping_list(plan), iterations),
+                "visualizer.generate_shopping_list": measure(lambda: generate_shopping_list(plan), iterations),
+                "visualizer.export_to_markdown": measure(
+                    lambda: export_to_markdown(plan, markdown_path), iterations
+                ),
+            }
+
+
+def bench_run(workflow: MealPlannerWorkflow, iterations: int) -> Dict[str, Dict[str, float]]:
+    """Синхронный MealPlannerWorkflow.run и время отдельных узлов графа."""
+    node_timings: Dict[str, List[float]] = {}
+    
+    def run_once() -> None:
+        final_state = workflow.run(SAMPLE_INPUT)
+        if final_state.get("error"):
+            raise RuntimeError(final_state["error"])
+        for node, seconds in final_state.get("timings", {}).items():
+            node_timings.setdefault(node, []).append(seconds)
+    
+    with quiet():
+        results = {"workflow.run": measure(run_once, iterations)}
+    
+    for node, values in node_timings.items():
+        results[f"workflow.node.{node}"] = {"mean_ms": sum(values) / len(values) * 1000}
+    return results
+
+
+def bench_concurrency(latency_s: float, levels: List[int], plans_per_level: int) -> Dict[str, Dict[str, float]]:
+    """Пропускная способность MealPlannerWorkflow.arun_many при разном параллелизме."""
+    results = {}
+    for level in levels:
+        workflow = build_workflow(latency_s, max_concurrency=level)
+        inputs = [SAMPLE_INPUT] * plans_per_level
+        with quiet():
+            asyncio.run(workflow.arun_many(inputs[:1]))
+            started = time.perf_counter()
+            states = asyncio.run(workflow.arun_many(inputs))
+            elapsed = time.perf_counter() - started
+        failed = sum(1 for state in states if state.get("error"))
+        results[f"workflow.arun_many.c{level}"] = {
+            "mean_ms": elapsed / plans_per_level * 1000,
+            "plans_per_s": plans_per_level / elapsed,
+            "failed": failed
+        }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description="Бенчмарк workflow на стабовой модели")
+    parser.add_argument("--iterations", type=int, default=20, help="Повторов на стадию")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка стабовой модели, с")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64],
+                        help="Уровни параллелизма для arun_many")
+    parser.add_argument("--plans", type=int, default=64, help="Планов на уровень параллелизма")
+    parser.add_argument("--output", help="Путь к JSON с результатами")
+    parser.add_argument("--compare", help="JSON предыдущего запуска для сравнения")
+    args = parser.parse_args(argv)
+    
+    workflow = build_workflow(args.latency)
+    stages: Dict[str, Dict[str, Any]] = {}
+    stages.update(bench_agents(workflow, args.iterations))
+    stages.update(bench_visualizer(args.iterations))
+    stages.update(bench_run(workflow, args.iterations))
+    stages.update(bench_concurrency(args.latency, args.concurrency, args.plans))
+    
+    print(f"{'стадия':<40} {'среднее, мс':>12} {'оп/с':>10} {'пик памяти, КБ':>15}")
+    for stage, result in stages.items():
+        ops = result.get("ops_per_s", result.get("plans_per_s"))
+        peak = result.get("peak_alloc_kb")
+        print(f"{stage:<40} {result['mean_ms']:>12.3f} "
+              f"{ops if ops is not None else float('nan'):>10.1f} "
+              f"{peak if peak is not None else float('nan'):>15.1f}")
+    
+    path = save_results("workflow", {
+        "params": {"iterations": args.iterations, "latency_s": args.latency, "plans": args.plans},
+        "stages": stages
+    }, args.output)
+    print(f"\n💾 Результаты сохранены: {path}")
+    
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(stages, json.load(f)["stages"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Общие инструменты бенчмарков: замер времени и памяти, стабовая модель, результаты.
+"""
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Optional
+
+from src.utils.llm_backends import ReplayLLM
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_PLAN_PATH = os.path.join(BENCHMARKS_DIR, "fixtures", "sample_plan.json")
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+
+
+def load_sample_plan() -> Dict[str, Any]:
+    """Загружает эталонный недельный план из fixtures."""
+    with open(SAMPLE_PLAN_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def stub_llm(latency_s: float = 0.0) -> ReplayLLM:
+    """
+    Детерминированная модель для бенчмарков: ответы собираются из эталонного плана.
+    
+    Args:
+        latency_s: Искусственная задержка ответа в секундах
+        
+    Returns:
+        ReplayLLM: Стабовая модель
+    """
+    return ReplayLLM(load_sample_plan(), latency_s=latency_s)
+
+
+def measure(fn: Callable[[], Any], iterations: int) -> Dict[str, float]:
+    """
+    Замеряет время и выделения памяти функции.
+    
+    Args:
+        fn: Функция без аргументов
+        iterations: Число повторов
+        
+    Returns:
+        Dict: Время (мс), пропускная способность (оп/с) и пик выделенной памяти (КБ)
+    """
+    # Прогрев: ленивые импорты и кэши не должны попадать в замер
+    fn()
+    
+    times = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    
+    # Память замеряется отдельным прогоном: tracemalloc замедляет выполнение
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    mean = statistics.mean(times)
+    return {
+        "mean_ms": mean * 1000,
+        "p50_ms": statistics.median(times) * 1000,
+        "min_ms": min(times) * 1000,
+        "ops_per_s": 1 / mean if mean else 0.0,
+        "peak_alloc_kb": peak / 1024
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    """Подавляет вывод print() в измеряемом коде."""
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def current_commit() -> str:
+    """Короткий хэш текущего коммита или "workdir", если git недоступен."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCHMARKS_DIR,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "workdir"
+
+
+def save_results(name: str, results: Dict[str, Any], path: Optional[str] = None) -> str:
+    """
+    Сохраняет результаты в benchmarks/results/<name>-<commit>.json.
+    
+    Args:
+        name: Имя бенчмарка
+        results: Результаты
+        path: Явный путь к файлу
+        
+    Returns:
+        str: Путь к сохраненному файлу
+    """
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{name}-{current_commit()}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def print_comparison(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]) -> None:
+    """
+    Выводит изменение среднего времени стадий относительно базового запуска.
+    
+    Args:
+        current: Текущие замеры по стадиям
+        baseline: Замеры базового запуска
+    """
+    print(f"\n{'стадия':<40} {'база, мс':>10} {'сейчас, мс':>11} {'изменение':>10}")
+    for stage, result in current.items():
+        base = baseline.get(stage)
+        if not base or "mean_ms" not in result or "mean_ms" not in base:
+            continue
+        delta = (result["mean_ms"] - base["mean_ms"]) / base["mean_ms"] * 100 if base["mean_ms"] else 0.0
+        print(f"{stage:<40} {base['mean_ms']:>10.3f} {result['mean_ms']:>11.3f} {delta:>+9.1f}%")
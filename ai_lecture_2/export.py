@@ -0,0 +1,67 @@
+"""
+Экспорт планов из JSONL результатов batch.py в Markdown, JSON, CSV и HTML.
+
+Примеры:
+    python export.py plans.jsonl -d exports
+    python export.py plans.jsonl -d exports -f md html csv --workers 8
+    cat plans.jsonl | python export.py - -d exports -f json
+"""
+import argparse
+import contextlib
+import json
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from src.utils.renderers import RENDERERS, export_batch
+
+
+def read_plans(stream: TextIO) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Читает планы из JSONL построчно.
+    
+    Args:
+        stream: Поток с записями batch.py (index, final_plan, ...)
+        
+    Returns:
+        Iterator: Пары (номер записи, план); записи без плана пропускаются
+    """
+    for line in stream:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if record.get("final_plan"):
+            yield f"{record['index']:06d}", record["final_plan"]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Экспорт планов питания из JSONL")
+    parser.add_argument("input", help="JSONL файл результатов batch.py или '-' для stdin")
+    parser.add_argument("-d", "--directory", default="exports", help="Каталог для файлов")
+    parser.add_argument("-f", "--formats", nargs="+", choices=sorted(RENDERERS), default=["md"],
+                        help="Форматы экспорта")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Число процессов (по умолчанию по числу CPU, 1 - без пула)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Точка входа экспорта."""
+    args = parse_args(argv)
+    
+    with contextlib.ExitStack() as stack:
+        source = sys.stdin if args.input == "-" else stack.enter_context(
+            open(args.input, encoding="utf-8")
+        )
+        started = time.perf_counter()
+        written = export_batch(read_plans(source), args.directory, args.formats, args.workers)
+        elapsed = time.perf_counter() - started
+    
+    rate = written / elapsed if elapsed else 0.0
+    print(f"💾 Записано файлов: {written} в {args.directory} за {elapsed:.1f} с ({rate:.0f} файлов/с)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,19 @@
 """
 Главный файл для запуска агентной системы составления рациона питания.
 """
-import json
-from typing import Literal
+import argparse
+import logging
+import os
+from typing import List, Literal, Optional, Tuple
 
 from src.models.schemas import UserInput
 from src.graph.workflow import MealPlannerWorkflow
+from src.utils.renderers import export_plan, plan_filename
 from src.utils.visualizer import (
+    print_daily_plan,
     print_weekly_plan,
     print_shopping_list,
+    print_validation_report,
     export_to_markdown
 )
 
@@ -21,17 +26,35 @@ def save_plan_to_json(plan_data: dict, filename: str = "meal_plan.json"):
         plan_data: Данные плана
         filename: Имя файла для сохранения
     """
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(plan_data, f, ensure_ascii=False, indent=2)
+    export_plan(plan_data, filename, "json")
     print(f"\n💾 План сохранен в файл: {filename}")
 
 
-def print_plan_summary(final_state):
+def plan_paths(output: Optional[str], run_id: str) -> Tuple[str, str]:
+    """
+    Пути файлов JSON и Markdown для плана запуска.
+    
+    Args:
+        output: Путь к JSON файлу из командной строки; Markdown пишется
+            рядом с тем же именем и расширением .md
+        run_id: Идентификатор запуска для имен по умолчанию
+        
+    Returns:
+        Tuple: (путь JSON, путь Markdown); по умолчанию
+        meal_plan_<run_id>.json и meal_plan_<run_id>.md
+    """
+    if output is None:
+        return plan_filename(run_id, "json"), plan_filename(run_id, "md")
+    return output, os.path.splitext(output)[0] + ".md"
+
+
+def print_plan_summary(final_state, days_printed: bool = False):
     """
     Выводит краткую информацию о плане.
     
     Args:
         final_state: Финальное состояние графа
+        days_printed: Дни уже выведены по мере готовности
     """
     if final_state.get("error"):
         print(f"\n❌ Произошла ошибка: {final_state['error']}")
@@ -43,8 +66,11 @@ def print_plan_summary(final_state):
     
     # Используем улучшенную визуализацию
     plan_dict = final_state["final_plan"].model_dump()
-    print_weekly_plan(plan_dict)
+    print_weekly_plan(plan_dict, include_days=not days_printed)
     print_shopping_list(plan_dict)
+    
+    if final_state.get("validation"):
+        print_validation_report(final_state["validation"].model_dump())
 
 
 def get_user_input_interactive() -> UserInput:
@@ -108,8 +134,23 @@ def get_user_input_interactive() -> UserInput:
     )
 
 
-def main():
+def print_streamed_day(daily_plan) -> None:
+    """Выводит день плана, как только агент его закончил."""
+    print_daily_plan(daily_plan.model_dump())
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Составление персонального рациона питания")
+    parser.add_argument("-o", "--output", default=None,
+                        help="JSON файл плана; Markdown сохраняется рядом с расширением .md "
+                             "(по умолчанию meal_plan_<run_id>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
     """Главная функция."""
+    args = parse_args(argv)
     try:
         # Получаем данные от пользователя
         user_input = get_user_input_interactive()
@@ -117,23 +158,25 @@ def main():
         # Создаем workflow
         workflow = MealPlannerWorkflow()
         
-        # Запускаем систему
-        final_state = workflow.run(user_input)
+        # Запускаем систему; дни выводятся по мере готовности
+        final_state = workflow.run(user_input, on_day=print_streamed_day)
         
         # Выводим результаты
-        print_plan_summary(final_state)
+        print_plan_summary(final_state, days_printed=True)
         
         # Сохраняем в JSON и Markdown
         if final_state.get("final_plan"):
             plan_dict = final_state["final_plan"].model_dump()
-            save_plan_to_json(plan_dict)
-            export_to_markdown(plan_dict)
+            # Имена по run_id: повторный запуск не перезаписывает прошлый план
+            json_path, markdown_path = plan_paths(args.output, final_state["run_id"])
+            save_plan_to_json(plan_dict, json_path)
+            export_to_markdown(plan_dict, markdown_path)
             
             print("\n" + "="*60)
             print("✨ Ваш персональный план питания готов!")
-            print("📄 Файлы: meal_plan.json, meal_plan.md")
+            print(f"📄 Файлы: {json_path}, {markdown_path}")
             print("="*60)
-        
+    
     except KeyboardInterrupt:
         print("\n\n❌ Программа прервана пользователем")
     except Exception as e:
@@ -182,6 +225,9 @@ def run_example():
 
 
 if __name__ == "__main__":
+    # Узлы workflow сообщают о прогрессе через logging
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     # Раскомментируйте нужную функцию:
     
     # Интерактивный режим
@@ -0,0 +1,357 @@
+"""
+Базовый класс агентов с ленивым доступом к общему LLM клиенту.
+"""
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from src.graph.retry import is_transient
+from src.utils.config import get_settings
+from src.utils.llm import get_llm
+from src.utils.llm_backends import LLMResponse, token_usage
+from src.utils.metrics import current_run_id, get_metrics
+from src.utils.repair import repair_json
+from src.utils.scheduler import llm_response_tokens
+
+
+T = TypeVar("T")
+
+# Сколько символов ошибки валидации возвращается модели при перезапросе
+FEEDBACK_ERROR_LIMIT = 1500
+
+# Подставляется вместо инструкций формата, когда схему ответа задает сама модель
+STRUCTURED_OUTPUT_HINT = "Ответ автоматически приводится к заданной схеме: заполни все ее поля."
+
+
+@lru_cache(maxsize=None)
+def format_instructions(schema: type) -> str:
+    """
+    Инструкции формата PydanticOutputParser для схемы.
+    
+    Строятся один раз на класс: для вложенных схем (WeeklyMealPlan) это
+    заметная работа, а текст от вызова к вызову не меняется.
+    
+    Args:
+        schema: Pydantic модель ответа
+        
+    Returns:
+        str: Текст инструкций с JSON схемой
+    """
+    from langchain.output_parsers import PydanticOutputParser
+    
+    return PydanticOutputParser(pydantic_object=schema).get_format_instructions()
+
+
+class BaseAgent:
+    """Базовый агент: клиент модели берется из общего пула при первом обращении."""
+    
+    # Имя агента для переопределений <NAME>_MODEL и <NAME>_TEMPERATURE
+    agent_name = "agent"
+    # Оценка токенов ответа для квоты планировщика (уточняется по ответу)
+    expected_response_tokens = 1024
+    
+    def __init__(self, model: Optional[str] = None, temperature: Optional[float] = None):
+        """
+        Инициализация агента.
+        
+        Args:
+            model: Название модели; по умолчанию из настроек агента
+            temperature: Температура генерации; по умолчанию из настроек агента
+        """
+        settings = get_settings()
+        agent_settings = settings.agent(self.agent_name)
+        self.model = model or agent_settings.model
+        self.temperature = agent_settings.temperature if temperature is None else temperature
+        self.repair_budget = settings.repair_budget
+        self.structured_output = settings.structured_output
+        self._llm: Optional[Any] = None
+        self._structured_clients: Dict[type, Any] = {}
+    
+    @property
+    def llm(self) -> Any:
+        """Клиент модели; создается (или берется из пула) при первом вызове."""
+        if self._llm is None:
+            self._llm = get_llm(
+                self.model,
+                self.temperature,
+                convert_system_message_to_human=True
+            )
+        return self._llm
+    
+    @llm.setter
+    def llm(self, value: Any) -> None:
+        self._llm = value
+        self._structured_clients = {}
+    
+    def _format_instructions(self, schema: type, structured: bool = False) -> str:
+        """Инструкции формата для промпта; в структурированном режиме - короткая подсказка."""
+        return STRUCTURED_OUTPUT_HINT if structured else format_instructions(schema)
+    
+    def _structured_client(self, schema: type) -> Any:
+        """Клиент модели, возвращающий объекты схемы (with_structured_output), один на схему."""
+        client = self._structured_clients.get(schema)
+        if client is None:
+            client = self._structured_clients[schema] = self.llm.with_structured_output(schema)
+        return client
+    
+    def _invoke_structured(self, schema: type, messages: Any) -> Optional[Any]:
+        """
+        Запрашивает ответ в нативном структурированном режиме модели.
+        
+        Args:
+            schema: Pydantic модель ответа
+            messages: Сообщения, отформатированные с STRUCTURED_OUTPUT_HINT
+            
+        Returns:
+            Объект схемы или None, если модель не поддерживает режим или
+            ответ не прошел проверку (тогда вызывающий переходит на текстовый режим)
+            
+        Raises:
+            Exception: Временная ошибка модели (429, 503, таймаут): текстовый
+                запрос к той же модели не поможет, ее повторяет узел графа
+        """
+        started = time.perf_counter()
+        try:
+            with llm_response_tokens(self.expected_response_tokens):
+                result = self._structured_client(schema).invoke(messages)
+            if not isinstance(result, schema):
+                result = self._parse(schema.model_validate, result)
+        except Exception as error:
+            if is_transient(error):
+                self._record_call_failure(started)
+                raise
+            self._record_structured_failure(started)
+            return None
+        self._record_call(messages, LLMResponse(content=result.model_dump_json()), started)
+        return result
+    
+    async def _ainvoke_structured(self, schema: type, messages: Any) -> Optional[Any]:
+        """Асинхронная версия _invoke_structured."""
+        started = time.perf_counter()
+        try:
+            with llm_response_tokens(self.expected_response_tokens):
+                result = await self._structured_client(schema).ainvoke(messages)
+            if not isinstance(result, schema):
+                result = self._parse(schema.model_validate, result)
+        except Exception as error:
+            if is_transient(error):
+                self._record_call_failure(started)
+                raise
+            self._record_structured_failure(started)
+            return None
+        self._record_call(messages, LLMResponse(content=result.model_dump_json()), started)
+        return result
+    
+    def _invoke(self, messages: Any) -> Any:
+        """
+        Вызывает модель через общий планировщик запросов и записывает
+        длительность вызова и число токенов.
+        
+        Args:
+            messages: Отформатированные сообщения
+            
+        Returns:
+            Ответ модели
+        """
+        started = time.perf_counter()
+        try:
+            with llm_response_tokens(self.expected_response_tokens):
+                response = self.llm.invoke(messages)
+        except Exception:
+            self._record_call_failure(started)
+            raise
+        self._record_call(messages, response, started)
+        return response
+    
+    async def _ainvoke(self, messages: Any) -> Any:
+        """Асинхронная версия _invoke."""
+        started = time.perf_counter()
+        try:
+            with llm_response_tokens(self.expected_response_tokens):
+                response = await self.llm.ainvoke(messages)
+        except Exception:
+            self._record_call_failure(started)
+            raise
+        self._record_call(messages, response, started)
+        return response
+    
+    def _stream(self, messages: Any) -> Iterator[str]:
+        """
+        Транслирует ответ модели по кускам текста.
+        
+        Длительность и токены записываются, когда поток дочитан до конца.
+        
+        Args:
+            messages: Отформатированные сообщения
+            
+        Returns:
+            Iterator: Куски текста ответа
+        """
+        started = time.perf_counter()
+        parts = []
+        try:
+            # Оценка ответа нужна только при открытии потока: в контекст потребителя она не попадает
+            with llm_response_tokens(self.expected_response_tokens):
+                chunks = self.llm.stream(messages)
+            for chunk in chunks:
+                parts.append(chunk.content)
+                yield chunk.content
+        except Exception:
+            self._record_call_failure(started)
+            raise
+        self._record_call(messages, LLMResponse(content="".join(parts)), started)
+    
+    async def _astream(self, messages: Any) -> AsyncIterator[str]:
+        """Асинхронная версия _stream."""
+        started = time.perf_counter()
+        parts = []
+        try:
+            with llm_response_tokens(self.expected_response_tokens):
+                chunks = self.llm.astream(messages)
+            async for chunk in chunks:
+                parts.append(chunk.content)
+                yield chunk.content
+        except Exception:
+            self._record_call_failure(started)
+            raise
+        self._record_call(messages, LLMResponse(content="".join(parts)), started)
+    
+    def _parse(self, parse: Callable[[str], T], content: str) -> T:
+        """
+        Парсит ответ модели и записывает длительность парсинга и ошибки.
+        
+        Args:
+            parse: Функция парсинга (например, output_parser.parse)
+            content: Текст ответа модели
+            
+        Returns:
+            Результат parse
+        """
+        metrics = get_metrics()
+        started = time.perf_counter()
+        try:
+            return parse(content)
+        except Exception:
+            metrics.inc("parse_failures_total", agent=self.agent_name)
+            raise
+        finally:
+            metrics.observe("parse_duration_seconds", time.perf_counter() - started, agent=self.agent_name)
+    
+    def _parse_repaired(self, parse: Callable[[str], T], content: str) -> T:
+        """
+        Парсит ответ, при ошибке пробует локально исправленный JSON.
+        
+        Args:
+            parse: Функция парсинга
+            content: Текст ответа модели
+            
+        Returns:
+            Результат parse
+            
+        Raises:
+            Exception: Исходная ошибка парсинга, если исправление не помогло
+        """
+        try:
+            return self._parse(parse, content)
+        except Exception as error:
+            repaired = repair_json(content)
+            if repaired == content:
+                raise
+            try:
+                result = self._parse(parse, repaired)
+            except Exception:
+                raise error
+            get_metrics().inc("repairs_total", agent=self.agent_name, kind="local")
+            return result
+    
+    @staticmethod
+    def _with_feedback(messages: List[Any], content: str, error: Exception) -> List[Any]:
+        """
+        Дополняет промпт невалидным ответом и ошибкой валидации для перезапроса.
+        
+        Args:
+            messages: Исходные сообщения
+            content: Ответ, не прошедший проверку
+            error: Ошибка парсинга или валидации
+            
+        Returns:
+            List: Сообщения для повторного запроса
+        """
+        from langchain_core.messages import AIMessage, HumanMessage
+        
+        return list(messages) + [
+            AIMessage(content=content),
+            HumanMessage(content=(
+                f"Ответ не прошел проверку: {str(error)[:FEEDBACK_ERROR_LIMIT]}\n"
+                "Исправь ошибки и верни только исправленный JSON по той же схеме."
+            ))
+        ]
+    
+    def _parse_or_rerequest(self, parse: Callable[[str], T], messages: List[Any], content: str) -> T:
+        """
+        Парсит ответ; если не помогло и локальное исправление, перезапрашивает
+        ответ с приложенной ошибкой, не более repair_budget раз.
+        
+        Args:
+            parse: Функция парсинга
+            messages: Сообщения, на которые был получен ответ
+            content: Текст ответа модели
+            
+        Returns:
+            Результат parse
+        """
+        try:
+            return self._parse_repaired(parse, content)
+        except Exception as error:
+            last_error = error
+        for _ in range(self.repair_budget):
+            get_metrics().inc("repairs_total", agent=self.agent_name, kind="rerequest")
+            content = self._invoke(self._with_feedback(messages, content, last_error)).content
+            try:
+                return self._parse_repaired(parse, content)
+            except Exception as error:
+                last_error = error
+        get_metrics().inc("repair_failures_total", agent=self.agent_name)
+        raise last_error
+    
+    async def _aparse_or_rerequest(self, parse: Callable[[str], T], messages: List[Any], content: str) -> T:
+        """Асинхронная версия _parse_or_rerequest."""
+        try:
+            return self._parse_repaired(parse, content)
+        except Exception as error:
+            last_error = error
+        for _ in range(self.repair_budget):
+            get_metrics().inc("repairs_total", agent=self.agent_name, kind="rerequest")
+            content = (await self._ainvoke(self._with_feedback(messages, content, last_error))).content
+            try:
+                return self._parse_repaired(parse, content)
+            except Exception as error:
+                last_error = error
+        get_metrics().inc("repair_failures_total", agent=self.agent_name)
+        raise last_error
+    
+    def _record_call(self, messages: Any, response: Any, started: float) -> None:
+        duration = time.perf_counter() - started
+        prompt_tokens, response_tokens = token_usage(messages, response)
+        metrics = get_metrics()
+        metrics.observe("llm_call_duration_seconds", duration, agent=self.agent_name)
+        metrics.inc("llm_calls_total", agent=self.agent_name)
+        metrics.inc("llm_prompt_tokens_total", prompt_tokens, agent=self.agent_name)
+        metrics.inc("llm_response_tokens_total", response_tokens, agent=self.agent_name)
+        metrics.event(
+            kind="llm_call",
+            run_id=current_run_id.get(),
+            agent=self.agent_name,
+            duration_s=round(duration, 4),
+            prompt_tokens=prompt_tokens,
+            response_tokens=response_tokens
+        )
+    
+    def _record_structured_failure(self, started: float) -> None:
+        self._record_call_failure(started)
+        get_metrics().inc("structured_output_fallbacks_total", agent=self.agent_name)
+    
+    def _record_call_failure(self, started: float) -> None:
+        metrics = get_metrics()
+        metrics.observe("llm_call_duration_seconds", time.perf_counter() - started, agent=self.agent_name)
+        metrics.inc("llm_call_failures_total", agent=self.agent_name)
@@ -1,30 +1,224 @@
 """
 Финальный агент для составления недельного плана питания.
 """
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Generator, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
 
+from src.agents.base import BaseAgent
+from src.graph.retry import RetryPolicy, is_transient
 from src.models.schemas import (
     UserInput,
     NutritionAnalysis,
     PreferencesAnalysis,
+    DailyPlan,
+    LocalDailyPlan,
+    LocalWeeklyMealPlan,
     WeeklyMealPlan
 )
-from src.utils.config import MODEL_NAME, TEMPERATURE
+from src.utils.config import get_settings
+from src.utils.food_db import get_food_db
+from src.utils.json_stream import JsonArrayStreamParser
+from src.utils.metrics import get_metrics
+from src.utils.repair import loads_lenient
+from src.utils.validation import recompute_day_totals
 
 
-class FinalAgent:
+WEEK_DAYS = [
+    "Понедельник",
+    "Вторник",
+    "Среда",
+    "Четверг",
+    "Пятница",
+    "Суббота",
+    "Воскресенье"
+]
+
+# Сколько продуктов попадает в подсказки о разнообразии для одного дня
+VARIETY_HINT_SIZE = 5
+
+# Требование к числам в приемах пищи: от модели или по таблице продуктов (LOCAL_NUTRIENTS)
+NUTRIENTS_RULES = {
+    False: "Указывай калорийность и макронутриенты для каждого приема пищи",
+    True: (
+        "Указывай вес каждого продукта в граммах (например, «Овсяные хлопья (60г)»); "
+        "крупы, макароны и бобовые указывай в готовом виде (например, «Гречка отварная (150г)»), "
+        "сухой вес помечай словом «сухой»; "
+        "калорийность, макронутриенты и итоги дня не указывай - они рассчитываются по таблице продуктов"
+    )
+}
+
+# Обработчик дня, готового раньше всего плана
+DayCallback = Callable[[DailyPlan], None]
+
+T = TypeVar("T")
+
+# Выставляется, когда один из параллельных дней окончательно упал: остальные дни не повторяют запрос
+_days_cancelled: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar(
+    "days_cancelled", default=None
+)
+
+
+def _plan_model(value: T, model: type) -> T:
+    """Приводит ответ по схеме LOCAL_NUTRIENTS к модели плана после расчета чисел."""
+    return value if type(value) is model else model.model_validate(value.model_dump())
+
+
+def _display_day(daily_plan: DailyPlan) -> DailyPlan:
+    """
+    Копия дня для обработчика on_day.
+    
+    Итоги пересчитаны по приемам пищи, как после узла validate_plan; сам день
+    плана не меняется, чтобы проверка плана увидела итоги модели.
+    """
+    return recompute_day_totals(daily_plan.model_copy(deep=True))
+
+
+def _missing_days(weekly_plan: WeeklyMealPlan, emitted: Set[str]) -> List[DailyPlan]:
+    """Дни итогового плана, которые не были выданы из потока (невалидные в потоке и перезапрошенные)."""
+    return [_display_day(day) for day in weekly_plan.week_plan if day.day not in emitted]
+
+
+def _check_days_cancelled() -> None:
+    """
+    Raises:
+        CancelledError: Если параллельная генерация дней отменена
+    """
+    stop = _days_cancelled.get()
+    if stop is not None and stop.is_set():
+        raise CancelledError("Генерация дня отменена: другой день не удалось создать")
+
+
+def _sleep_day_retry(delay: float) -> None:
+    """
+    Ждет перед повтором дня; ожидание прерывается отменой параллельных дней.
+    
+    Raises:
+        CancelledError: Если параллельная генерация дней отменена
+    """
+    stop = _days_cancelled.get()
+    if stop is None:
+        time.sleep(delay)
+    else:
+        stop.wait(delay)
+    _check_days_cancelled()
+
+
+def _run_threaded(jobs: List[Callable[[], T]]) -> Iterator[Tuple[int, T]]:
+    """
+    Выполняет задачи в потоках и выдает (индекс задачи, результат) по мере завершения.
+    
+    При первой ошибке ожидающие задачи отменяются, выполняющиеся не
+    повторяют запрос, и ошибка пробрасывается, не дожидаясь их ответов.
+    
+    Args:
+        jobs: Функции без аргументов
+        
+    Returns:
+        Iterator: Пары (индекс, результат) в порядке завершения
+    """
+    stop = threading.Event()
+    token = _days_cancelled.set(stop)
+    try:
+        # Контекст копируется в каждую задачу, чтобы события дней несли run_id запуска
+        contexts = [contextvars.copy_context() for _ in jobs]
+    finally:
+        _days_cancelled.reset(token)
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, len(jobs)))
+    futures = {
+        executor.submit(context.run, job): index
+        for index, (context, job) in enumerate(zip(contexts, jobs))
+    }
+    completed = False
+    try:
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+        completed = True
+    finally:
+        if not completed:
+            stop.set()
+        executor.shutdown(wait=completed, cancel_futures=True)
+
+
+async def _gather_cancelling(coroutines: Iterable[Awaitable[T]]) -> List[T]:
+    """asyncio.gather, который при первой ошибке отменяет остальные задачи."""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return list(await asyncio.gather(*tasks))
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _drain(stream: Generator[DailyPlan, None, WeeklyMealPlan], on_day: DayCallback) -> WeeklyMealPlan:
+    """Передает дни генератора в обработчик и возвращает итоговый план."""
+    while True:
+        try:
+            on_day(next(stream))
+        except StopIteration as stop:
+            return stop.value
+
+
+class _FirstDayTimer:
+    """Записывает время от начала генерации до первого готового дня."""
+    
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.reported = False
+    
+    def day_ready(self) -> None:
+        if not self.reported:
+            self.reported = True
+            get_metrics().observe(
+                "time_to_first_day_seconds",
+                time.perf_counter() - self.started,
+                agent=FinalAgent.agent_name,
+                mode=self.mode
+            )
+
+
+class FinalAgent(BaseAgent):
     """Финальный агент для создания недельного плана питания."""
     
-    def __init__(self):
-        """Инициализация агента."""
-        self.llm = ChatGoogleGenerativeAI(
-            model=MODEL_NAME,
-            temperature=TEMPERATURE,
-            convert_system_message_to_human=True
-        )
-        self.output_parser = PydanticOutputParser(pydantic_object=WeeklyMealPlan)
+    agent_name = "final"
+    # Недельный план - самый длинный ответ; в режиме per_day квота уточняется по фактическим ответам
+    expected_response_tokens = 4096
+    
+    def __init__(self, mode: Optional[str] = None, day_retries: Optional[int] = None):
+        """
+        Инициализация агента.
+        
+        Args:
+            mode: "weekly" - вся неделя одним запросом;
+                "per_day" - каждый день отдельным параллельным запросом;
+                по умолчанию из настроек
+            day_retries: Сколько раз повторять запрос дня, который не удалось разобрать
+        """
+        from langchain.prompts import ChatPromptTemplate
+        from langchain.output_parsers import PydanticOutputParser
+        
+        settings = get_settings()
+        mode = mode or settings.final_agent_mode
+        if mode not in ("weekly", "per_day"):
+            raise ValueError(f"Неизвестный режим FinalAgent: {mode}")
+        self.mode = mode
+        self.day_retries = settings.day_retries if day_retries is None else day_retries
+        # Временные ошибки запроса дня повторяются здесь же, как узел графа: остальные дни не теряются
+        self.day_retry_policy = RetryPolicy(max_attempts=settings.node_attempts, initial_delay=settings.retry_delay)
+        self.local_nutrients = settings.local_nutrients
+        # Схемы ответа модели: при LOCAL_NUTRIENTS числа не обязательны и считаются после разбора
+        self.week_schema = LocalWeeklyMealPlan if self.local_nutrients else WeeklyMealPlan
+        self.day_schema = LocalDailyPlan if self.local_nutrients else DailyPlan
+        super().__init__()
+        self.output_parser = PydanticOutputParser(pydantic_object=self.week_schema)
+        self.day_parser = PydanticOutputParser(pydantic_object=self.day_schema)
         
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """Ты опытный диетолог, специализирующийся на составлении индивидуальных планов питания.
@@ -36,7 +230,7 @@ class FinalAgent:
 - План на 7 дней (Понедельник-Воскресенье)
 - 4-5 приемов пищи в день: Завтрак, Перекус, Обед, Полдник, Ужин
 - Каждый прием пищи должен содержать конкретные продукты с указанием примерного количества
-- Указывай калорийность и макронутриенты для каждого приема пищи
+- {nutrients_rule}
 - Соблюдай дневную норму калорий (±50 ккал)
 - Соблюдай баланс макронутриентов
 - Используй только разрешенные продукты
@@ -75,17 +269,363 @@ class FinalAgent:
 
 Составь детальный план питания на неделю с учетом всех указанных параметров.""")
         ])
+        
+        self.day_prompt = ChatPromptTemplate.from_messages([
+            ("system", """Ты опытный диетолог, специализирующийся на составлении индивидуальных планов питания.
+Твоя задача - составить детальный план питания на один день недели на основе:
+1. Анализа физических показателей (калории, макронутриенты)
+2. Анализа пищевых предпочтений (разрешенные/запрещенные продукты)
+
+Требования к плану:
+- 4-5 приемов пищи: Завтрак, Перекус, Обед, Полдник, Ужин
+- Каждый прием пищи должен содержать конкретные продукты с указанием примерного количества
+- {nutrients_rule}
+- Соблюдай дневную норму калорий (±50 ккал)
+- Соблюдай баланс макронутриентов
+- Используй только разрешенные продукты
+- Указывай время приемов пищи
+
+Примерное время приемов пищи:
+- Завтрак: 08:00
+- Перекус: 11:00
+- Обед: 14:00
+- Полдник: 17:00
+- Ужин: 20:00
+
+{format_instructions}"""),
+            ("user", """Составь план питания на день "{day}" на основе следующих данных:
+
+=== ПОЛЬЗОВАТЕЛЬСКИЕ ДАННЫЕ ===
+Цель: {goal}
+Пол: {gender}
+Вес: {weight} кг
+Рост: {height} см
+Возраст: {age} лет
+Предпочтения: {preferences}
+
+=== АНАЛИЗ ПИТАНИЯ ===
+Дневная норма калорий: {daily_calories} ккал
+Белки: {protein_g} г
+Жиры: {fats_g} г
+Углеводы: {carbs_g} г
+Рекомендации: {nutrition_recommendations}
+
+=== АНАЛИЗ ПРЕДПОЧТЕНИЙ ===
+Разрешенные продукты: {allowed_foods}
+Запрещенные продукты: {restricted_foods}
+Рекомендации: {preferences_recommendations}
+
+=== РАЗНООБРАЗИЕ ===
+Сделай основой дня: {focus_foods}
+Не используй как основу блюд (они в соседних днях): {avoid_foods}
+
+В поле day укажи "{day}".""")
+        ])
     
-    def create_plan(
+    def _format_prompt(
+        self,
+        user_input: UserInput,
+        nutrition_analysis: NutritionAnalysis,
+        preferences_analysis: PreferencesAnalysis,
+        structured: bool = False
+    ):
+        """Подставляет данные пользователя и результаты анализов в промпт."""
+        return self.prompt.format_messages(
+            **self._context(user_input, nutrition_analysis, preferences_analysis),
+            format_instructions=self._format_instructions(self.week_schema, structured)
+        )
+    
+    def _context(
         self,
         user_input: UserInput,
         nutrition_analysis: NutritionAnalysis,
         preferences_analysis: PreferencesAnalysis
+    ) -> Dict[str, Any]:
+        """Общий контекст промптов: данные пользователя и результаты анализов."""
+        return {
+            "goal": user_input.goal,
+            "gender": user_input.gender,
+            "weight": user_input.weight,
+            "height": user_input.height,
+            "age": user_input.age,
+            "preferences": user_input.preferences,
+            "daily_calories": nutrition_analysis.daily_calories,
+            "protein_g": nutrition_analysis.protein_g,
+            "fats_g": nutrition_analysis.fats_g,
+            "carbs_g": nutrition_analysis.carbs_g,
+            "nutrition_recommendations": nutrition_analysis.recommendations,
+            "allowed_foods": ", ".join(preferences_analysis.allowed_foods),
+            "restricted_foods": ", ".join(preferences_analysis.restricted_foods),
+            "preferences_recommendations": preferences_analysis.recommendations,
+            "nutrients_rule": NUTRIENTS_RULES[self.local_nutrients]
+        }
+    
+    @staticmethod
+    def _variety_hints(allowed_foods: List[str]) -> List[Dict[str, str]]:
+        """
+        Распределяет разрешенные продукты по дням недели.
+        
+        Дни генерируются параллельно и не видят друг друга, поэтому каждому
+        дню заранее назначаются свои основные продукты, а продукты соседних
+        дней передаются как нежелательные.
+        
+        Args:
+            allowed_foods: Разрешенные продукты
+            
+        Returns:
+            List: Для каждого дня строки focus_foods и avoid_foods
+        """
+        days = len(WEEK_DAYS)
+        focus = [allowed_foods[i::days][:VARIETY_HINT_SIZE] for i in range(days)]
+        hints = []
+        for i in range(days):
+            neighbours = focus[(i - 1) % days] + focus[(i + 1) % days]
+            hints.append({
+                "focus_foods": ", ".join(focus[i]) or "любые разрешенные продукты",
+                "avoid_foods": ", ".join(neighbours[:VARIETY_HINT_SIZE]) or "нет"
+            })
+        return hints
+    
+    def _format_day_prompts(
+        self,
+        user_input: UserInput,
+        nutrition_analysis: NutritionAnalysis,
+        preferences_analysis: PreferencesAnalysis,
+        structured: bool = False
+    ) -> List[Any]:
+        """Готовит промпты для всех дней недели."""
+        context = self._context(user_input, nutrition_analysis, preferences_analysis)
+        format_instructions = self._format_instructions(self.day_schema, structured)
+        hints = self._variety_hints(preferences_analysis.allowed_foods)
+        return [
+            self.day_prompt.format_messages(
+                **context,
+                **hint,
+                day=day,
+                format_instructions=format_instructions
+            )
+            for day, hint in zip(WEEK_DAYS, hints)
+        ]
+    
+    def _fill_nutrients(self, days: List[DailyPlan]) -> None:
+        """При LOCAL_NUTRIENTS считает калорийность и БЖУ приемов пищи по таблице продуктов."""
+        if not self.local_nutrients:
+            return
+        unresolved = get_food_db().fill_days(days)
+        if unresolved:
+            get_metrics().inc("food_lookup_misses_total", len(unresolved), agent=self.agent_name)
+    
+    def _finish_day(self, day: str, daily_plan: DailyPlan) -> DailyPlan:
+        daily_plan.day = day
+        self._fill_nutrients([daily_plan])
+        return _plan_model(daily_plan, DailyPlan)
+    
+    def _finish_week(self, weekly_plan: WeeklyMealPlan) -> WeeklyMealPlan:
+        self._fill_nutrients(weekly_plan.week_plan)
+        return _plan_model(weekly_plan, WeeklyMealPlan)
+    
+    def _parse_day(self, day: str, content: str) -> DailyPlan:
+        return self._finish_day(day, self._parse_repaired(self.day_parser.parse, content))
+    
+    def _create_day(self, day: str, formatted_prompt) -> DailyPlan:
+        """
+        Генерирует один день, повторяя запрос при ошибке.
+        
+        Если ответ не прошел проверку, повторный запрос содержит этот ответ
+        и ошибку валидации, чтобы модель исправила именно ее (до day_retries
+        раз). Временные ошибки модели (429, 503) повторяются с задержкой по
+        day_retry_policy: повторяется только этот день, готовые дни недели
+        не запрашиваются заново.
+        
+        Args:
+            day: Название дня недели
+            formatted_prompt: Готовый промпт дня
+            
+        Returns:
+            DailyPlan: План на день
+        """
+        messages = formatted_prompt
+        failures = 0
+        transient_failures = 0
+        while True:
+            _check_days_cancelled()
+            content = None
+            try:
+                content = self._invoke(messages).content
+                return self._parse_day(day, content)
+            except Exception as error:
+                delay = self._day_retry_delay(error, failures, transient_failures)
+                if is_transient(error):
+                    transient_failures += 1
+                else:
+                    failures += 1
+                    if content is not None:
+                        messages = self._with_feedback(formatted_prompt, content, error)
+            _sleep_day_retry(delay)
+    
+    async def _acreate_day(self, day: str, formatted_prompt) -> DailyPlan:
+        """Асинхронная версия _create_day."""
+        messages = formatted_prompt
+        failures = 0
+        transient_failures = 0
+        while True:
+            content = None
+            try:
+                content = (await self._ainvoke(messages)).content
+                return self._parse_day(day, content)
+            except Exception as error:
+                delay = self._day_retry_delay(error, failures, transient_failures)
+                if is_transient(error):
+                    transient_failures += 1
+                else:
+                    failures += 1
+                    if content is not None:
+                        messages = self._with_feedback(formatted_prompt, content, error)
+            await asyncio.sleep(delay)
+    
+    def _day_retry_delay(self, error: Exception, failures: int, transient_failures: int) -> float:
+        """
+        Задержка перед повтором запроса дня или исходная ошибка, если повторы исчерпаны.
+        
+        Args:
+            error: Ошибка попытки
+            failures: Сколько ответов уже не прошли проверку
+            transient_failures: Сколько запросов уже завершились временной ошибкой
+            
+        Returns:
+            float: Задержка, с (0 - повторить сразу с приложенной ошибкой)
+        """
+        if is_transient(error):
+            if transient_failures + 1 >= self.day_retry_policy.max_attempts:
+                raise error
+            delay = self.day_retry_policy.delay(transient_failures + 1)
+        else:
+            if failures == self.day_retries:
+                raise error
+            delay = 0.0
+        get_metrics().inc("llm_retries_total", agent=self.agent_name)
+        return delay
+    
+    def _create_day_structured(self, day: str, formatted_prompt, fallback_prompt: Callable[[], Any]) -> DailyPlan:
+        """
+        Генерирует день в структурированном режиме модели.
+        
+        Args:
+            day: Название дня недели
+            formatted_prompt: Промпт дня без инструкций формата
+            fallback_prompt: Возвращает текстовый промпт дня, если режим не сработал
+            
+        Returns:
+            DailyPlan: План на день
+        """
+        daily_plan = self._invoke_structured(self.day_schema, formatted_prompt)
+        if daily_plan is None:
+            return self._create_day(day, fallback_prompt())
+        return self._finish_day(day, daily_plan)
+    
+    async def _acreate_day_structured(self, day: str, formatted_prompt, fallback_prompt: Callable[[], Any]) -> DailyPlan:
+        """Асинхронная версия _create_day_structured."""
+        daily_plan = await self._ainvoke_structured(self.day_schema, formatted_prompt)
+        if daily_plan is None:
+            return await self._acreate_day(day, fallback_prompt())
+        return self._finish_day(day, daily_plan)
+    
+    def _day_jobs(
+        self,
+        user_input: UserInput,
+        nutrition_analysis: NutritionAnalysis,
+        preferences_analysis: PreferencesAnalysis,
+        asynchronous: bool = False
+    ) -> List[Callable[[], Any]]:
+        """
+        Готовит генерацию каждого дня недели как функцию без аргументов.
+        
+        Args:
+            user_input: Входные данные пользователя
+            nutrition_analysis: Анализ физических показателей
+            preferences_analysis: Анализ пищевых предпочтений
+            asynchronous: Вернуть корутинные функции вместо синхронных
+            
+        Returns:
+            List: По функции на день в порядке недели
+        """
+        if not self.structured_output:
+            create_day = self._acreate_day if asynchronous else self._create_day
+            prompts = self._format_day_prompts(user_input, nutrition_analysis, preferences_analysis)
+            return [partial(create_day, day, prompt) for day, prompt in zip(WEEK_DAYS, prompts)]
+        
+        create_day = self._acreate_day_structured if asynchronous else self._create_day_structured
+        prompts = self._format_day_prompts(user_input, nutrition_analysis, preferences_analysis, structured=True)
+        
+        def fallback(index: int) -> Any:
+            return self._format_day_prompts(user_input, nutrition_analysis, preferences_analysis)[index]
+        
+        return [
+            partial(create_day, day, prompt, partial(fallback, index))
+            for index, (day, prompt) in enumerate(zip(WEEK_DAYS, prompts))
+        ]
+    
+    def _salvage_week(self, content: str) -> Tuple[List[Optional[DailyPlan]], Dict[int, Tuple[str, Exception]], str]:
+        """
+        Разбирает недельный ответ по дням, отделяя валидные дни от невалидных.
+        
+        Args:
+            content: Ответ модели, который не удалось разобрать целиком
+            
+        Returns:
+            Tuple: (дни по порядку недели, None на месте невалидных;
+                {индекс дня: (фрагмент ответа, ошибка)}; резюме)
+                
+        Raises:
+            ValueError: Если из ответа нельзя извлечь список дней
+        """
+        data = loads_lenient(content)
+        if not isinstance(data, dict) or not isinstance(data.get("week_plan"), list):
+            raise ValueError("Ответ модели не содержит списка week_plan")
+        
+        days: List[Optional[DailyPlan]] = [None] * len(WEEK_DAYS)
+        broken: Dict[int, Tuple[str, Exception]] = {}
+        fragments = data["week_plan"][:len(WEEK_DAYS)]
+        for index, day in enumerate(WEEK_DAYS):
+            if index >= len(fragments):
+                broken[index] = ("", ValueError(f"День {day} отсутствует в ответе"))
+                continue
+            fragment = fragments[index]
+            try:
+                days[index] = self._finish_day(day, self.day_schema.model_validate(fragment))
+            except Exception as error:
+                broken[index] = (json.dumps(fragment, ensure_ascii=False), error)
+        
+        summary = data.get("summary") if isinstance(data.get("summary"), str) else ""
+        return days, broken, summary
+    
+    def _finish_salvage(
+        self,
+        days: List[DailyPlan],
+        summary: str,
+        nutrition_analysis: NutritionAnalysis
+    ) -> WeeklyMealPlan:
+        get_metrics().inc("repairs_total", agent=self.agent_name, kind="fragment")
+        if summary:
+            return WeeklyMealPlan(week_plan=days, summary=summary)
+        return self._assemble(days, nutrition_analysis)
+    
+    def _parse_week(
+        self,
+        content: str,
+        user_input: UserInput,
+        nutrition_analysis: NutritionAnalysis,
+        preferences_analysis: PreferencesAnalysis
     ) -> WeeklyMealPlan:
         """
-        Создает недельный план питания.
+        Разбирает недельный план; при ошибке перезапрашивает только невалидные дни.
+        
+        Сначала пробуется локальное исправление JSON. Если и оно не помогло,
+        валидные дни сохраняются, а невалидные и недостающие (не больше
+        repair_budget) генерируются заново запросом дня с приложенной ошибкой.
         
         Args:
+            content: Ответ модели
             user_input: Входные данные пользователя
             nutrition_analysis: Анализ физических показателей
             preferences_analysis: Анализ пищевых предпочтений
@@ -93,30 +633,339 @@ class FinalAgent:
         Returns:
             WeeklyMealPlan: Недельный план питания
         """
-        # Подготовка промпта
-        formatted_prompt = self.prompt.format_messages(
-            goal=user_input.goal,
-            gender=user_input.gender,
-            weight=user_input.weight,
-            height=user_input.height,
-            age=user_input.age,
-            preferences=user_input.preferences,
-            daily_calories=nutrition_analysis.daily_calories,
-            protein_g=nutrition_analysis.protein_g,
-            fats_g=nutrition_analysis.fats_g,
-            carbs_g=nutrition_analysis.carbs_g,
-            nutrition_recommendations=nutrition_analysis.recommendations,
-            allowed_foods=", ".join(preferences_analysis.allowed_foods),
-            restricted_foods=", ".join(preferences_analysis.restricted_foods),
-            preferences_recommendations=preferences_analysis.recommendations,
-            format_instructions=self.output_parser.get_format_instructions()
+        try:
+            return self._finish_week(self._parse_repaired(self.output_parser.parse, content))
+        except Exception as error:
+            original_error = error
+        try:
+            days, broken, summary = self._salvage_week(content)
+        except ValueError:
+            raise original_error
+        if len(broken) > self.repair_budget:
+            get_metrics().inc("repair_failures_total", agent=self.agent_name)
+            raise original_error
+        
+        prompts = self._format_day_prompts(user_input, nutrition_analysis, preferences_analysis)
+        indices = list(broken)
+        jobs = [
+            partial(self._repair_day, WEEK_DAYS[index], prompts[index], *broken[index])
+            for index in indices
+        ]
+        for position, daily_plan in _run_threaded(jobs):
+            days[indices[position]] = daily_plan
+        return self._finish_salvage(days, summary, nutrition_analysis)
+    
+    async def _aparse_week(
+        self,
+        content: str,
+        user_input: UserInput,
+        nutrition_analysis: NutritionAnalysis,
+        preferences_analysis: PreferencesAnalysis
+    ) -> WeeklyMealPlan:
+        """Асинхронная версия _parse_week."""
+        try:
+            return self._finish_week(self._parse_repaired(self.output_parser.parse, content))
+        except Exception as error:
+            original_error = error
+        try:
+            days, broken, summary = self._salvage_week(content)
+        except ValueError:
+            raise original_error
+        if len(broken) > self.repair_budget:
+            get_metrics().inc("repair_failures_total", agent=self.agent_name)
+            raise original_error
+        
+        prompts = self._format_day_prompts(user_input, nutrition_analysis, preferences_analysis)
+        repaired = await _gather_cancelling(
+            self._arepair_day(WEEK_DAYS[index], prompts[index], fragment, error)
+            for index, (fragment, error) in broken.items()
+        )
+        for index, daily_plan in zip(broken, repaired):
+            days[index] = daily_plan
+        return self._finish_salvage(days, summary, nutrition_analysis)
+    
+    def _repair_day(self, day: str, formatted_prompt, fragment: str, error: Exception) -> DailyPlan:
+        """Перезапрашивает один день; невалидный фрагмент и ошибка прикладываются к промпту."""
+        if not fragment:
+            return self._create_day(day, formatted_prompt)
+        return self._create_day(day, self._with_feedback(formatted_prompt, fragment, error))
+    
+    async def _arepair_day(self, day: str, formatted_prompt, fragment: str, error: Exception) -> DailyPlan:
+        """Асинхронная версия _repair_day."""
+        if not fragment:
+            return await self._acreate_day(day, formatted_prompt)
+        return await self._acreate_day(day, self._with_feedback(formatted_prompt, fragment, error))
+    
+    @staticmethod
+    def _assemble(days: List[DailyPlan], nutrition_analysis: NutritionAnalysis) -> WeeklyMealPlan:
+        """
+        Собирает недельный план и резюме из отдельных дней.
+        
+        Args:
+            days: Планы на дни в порядке недели
+            nutrition_analysis: Анализ физических показателей
+            
+        Returns:
+            WeeklyMealPlan: Недельный план питания
+        """
+        count = len(days)
+        avg_calories = sum(day.total_calories for day in days) / count
+        avg_protein = sum(day.total_protein_g for day in days) / count
+        avg_fats = sum(day.total_fats_g for day in days) / count
+        avg_carbs = sum(day.total_carbs_g for day in days) / count
+        summary = (
+            f"План питания на {count} дней: в среднем {avg_calories:.0f} ккал в день "
+            f"при норме {nutrition_analysis.daily_calories:.0f} ккал "
+            f"(Б: {avg_protein:.0f}г, Ж: {avg_fats:.0f}г, У: {avg_carbs:.0f}г). "
+            f"{nutrition_analysis.recommendations}"
         )
+        return WeeklyMealPlan(week_plan=days, summary=summary)
+    
+    def create_plan(
+        self,
+        user_input: UserInput,
+        nutrition_analysis: NutritionAnalysis,
+        preferences_analysis: PreferencesAnalysis,
+        on_day: Optional[DayCallback] = None,
+        completed_days: Optional[Dict[str, DailyPlan]] = None
+    ) -> WeeklyMealPlan:
+        """
+        Создает недельный план питания.
+        
+        Args:
+            user_input: Входные данные пользователя
+            nutrition_analysis: Анализ физических показателей
+            preferences_analysis: Анализ пищевых предпочтений
+            on_day: Вызывается с каждым днем, как только он готов;
+                если задан, ответ модели читается потоком
+            completed_days: Готовые дни по названиям; дополняется по мере
+                готовности дней. Если передан непустым (повтор после ошибки),
+                генерируются только недостающие дни, готовые входят в план
+                без изменений
+                
+        Returns:
+            WeeklyMealPlan: Недельный план питания
+        """
+        completed = {} if completed_days is None else completed_days
+        if on_day is not None:
+            return _drain(self.stream_plan(user_input, nutrition_analysis, preferences_analysis, completed), on_day)
+        
+        if self.mode == "per_day" or completed:
+            return self._create_plan_per_day(user_input, nutrition_analysis, preferences_analysis, completed)
+        
+        # Нативный структурированный вывод: схема не отправляется в промпте, текст не парсится
+        if self.structured_output:
+            weekly_plan = self._invoke_structured(
+                self.week_schema,
+                self._format_prompt(user_input, nutrition_analysis, preferences_analysis, structured=True)
+            )
+            if weekly_plan is not None:
+                return self._finish_week(weekly_plan)
+        
+        # Подготовка промпта
+        formatted_prompt = self._format_prompt(user_input, nutrition_analysis, preferences_analysis)
         
         # Вызов LLM
-        response = self.llm.invoke(formatted_prompt)
+        response = self._invoke(formatted_prompt)
         
-        # Парсинг ответа
-        weekly_plan = self.output_parser.parse(response.content)
+        # Парсинг ответа; невалидные дни перезапрашиваются по отдельности
+        weekly_plan = self._parse_week(response.content, user_input, nutrition_analysis, preferences_analysis)
         
         return weekly_plan
-
+    
+    async def acreate_plan(
+        self,
+        user_input: UserInput,
+        nutrition_analysis: NutritionAnalysis,
+        preferences_analysis: PreferencesAnalysis,
+        on_day: Optional[DayCallback] = None,
+        completed_days: Optional[Dict[str, DailyPlan]] = None
+    ) -> WeeklyMealPlan:
+        """
+        Асинхронная версия create_plan.
+        
+        Args:
+            user_input: Входные данные пользователя
+            nutrition_analysis: Анализ физических показателей
+            preferences_analysis: Анализ пищевых предпочтений
+            on_day: Вызывается с каждым днем, как только он готов
+            completed_days: Готовые дни по названиям (см. create_plan)
+            
+        Returns:
+            WeeklyMealPlan: Недельный план питания
+        """
+        completed = {} if completed_days is None else completed_days
+        if self.mode == "per_day" or completed:
+            return await self._acreate_plan_per_day(
+                user_input, nutrition_analysis, preferences_analysis, on_day, completed
+            )
+        
+        if self.structured_output and on_day is None:
+            weekly_plan = await self._ainvoke_structured(
+                self.week_schema,
+                self._format_prompt(user_input, nutrition_analysis, preferences_analysis, structured=True)
+            )
+            if weekly_plan is not None:
+                return self._finish_week(weekly_plan)
+        
+        formatted_prompt = self._format_prompt(user_input, nutrition_analysis, preferences_analysis)
+        
+        if on_day is None:
+            content = (await self._ainvoke(formatted_prompt)).content
+            return await self._aparse_week(content, user_input, nutrition_analysis, preferences_analysis)
+        
+        content = await self._astream_weekly(formatted_prompt, on_day, completed)
+        weekly_plan = await self._aparse_week(content, user_input, nutrition_analysis, preferences_analysis)
+        for daily_plan in _missing_days(weekly_plan, set(completed)):
+            on_day(daily_plan)
+        return weekly_plan
+    
+    def _generate_days(
+        self,
+        user_input: UserInput,
+        nutrition_analysis: NutritionAnalysis,
+        preferences_analysis: PreferencesAnalysis,
+        days: List[Optional[DailyPlan]],
+        completed: Dict[str, DailyPlan]
+    ) -> Iterator[DailyPlan]:
+        """
+        Генерирует параллельными запросами дни, которых еще нет в days, и выдает их по мере готовности.
+        
+        Args:
+            user_input: Входные данные пользователя
+            nutrition_analysis: Анализ физических показателей
+            preferences_analysis: Анализ пищевых предпочтений
+            days: Дни в порядке недели, None на месте недостающих (заполняется)
+            completed: Готовые дни по названиям (дополняется)
+            
+        Returns:
+            Iterator: Новые дни в порядке завершения запросов
+        """
+        jobs = self._day_jobs(user_input, nutrition_analysis, preferences_analysis)
+        indices = [index for index, daily_plan in enumerate(days) if daily_plan is None]
+        for position, daily_plan in _run_threaded([jobs[index] for index in indices]):
+            days[indices[position]] = completed[daily_plan.day] = daily_plan
+            yield daily_plan
+    
+    def _create_plan_per_day(
+        self,
+        user_input: UserInput,
+        nutrition_analysis: NutritionAnalysis,
+        preferences_analysis: PreferencesAnalysis,
+        completed: Dict[str, DailyPlan]
+    ) -> WeeklyMealPlan:
+        """Генерирует недостающие дни недели параллельными запросами и собирает план."""
+        days = [completed.get(day) for day in WEEK_DAYS]
+        for _ in self._generate_days(user_input, nutrition_analysis, preferences_analysis, days, completed):
+            pass
+        return self._assemble(days, nutrition_analysis)
+    
+    async def _acreate_plan_per_day(
+        self,
+        user_input: UserInput,
+        nutrition_analysis: NutritionAnalysis,
+        preferences_analysis: PreferencesAnalysis,
+        on_day: Optional[DayCallback],
+        completed: Dict[str, DailyPlan]
+    ) -> WeeklyMealPlan:
+        """Асинхронная версия _create_plan_per_day."""
+        jobs = self._day_jobs(user_input, nutrition_analysis, preferences_analysis, asynchronous=True)
+        days = [completed.get(day) for day in WEEK_DAYS]
+        timer = _FirstDayTimer(self.mode)
+        
+        async def create_day(index: int) -> None:
+            daily_plan = days[index] = completed[WEEK_DAYS[index]] = await jobs[index]()
+            timer.day_ready()
+            if on_day is not None:
+                on_day(_display_day(daily_plan))
+        
+        await _gather_cancelling(create_day(index) for index, daily_plan in enumerate(days) if daily_plan is None)
+        return self._assemble(days, nutrition_analysis)
+    
+    def stream_plan(
+        self,
+        user_input: UserInput,
+        nutrition_analysis: NutritionAnalysis,
+        preferences_analysis: PreferencesAnalysis,
+        completed_days: Optional[Dict[str, DailyPlan]] = None
+    ) -> Generator[DailyPlan, None, WeeklyMealPlan]:
+        """
+        Создает недельный план, выдавая дни по мере готовности.
+        
+        В режиме weekly ответ модели читается потоком, и каждый день
+        выдается, как только в JSON закрывается его объект (в том числе при
+        STRUCTURED_OUTPUT: структурированный ответ приходит только целиком).
+        Дни, которые в потоке не прошли проверку, выдаются после разбора
+        полного ответа и перезапроса. В режиме per_day, а также при повторе
+        с уже готовыми днями (completed_days) недостающие дни генерируются
+        параллельными запросами и выдаются в порядке завершения. Итоги
+        выданных дней пересчитаны по приемам пищи.
+        Итоговый план - возвращаемое значение генератора:
+            
+            plan = yield from agent.stream_plan(...)
+            
+        Args:
+            user_input: Входные данные пользователя
+            nutrition_analysis: Анализ физических показателей
+            preferences_analysis: Анализ пищевых предпочтений
+            completed_days: Готовые дни по названиям (см. create_plan)
+            
+        Returns:
+            Generator: Дни плана; возвращает WeeklyMealPlan
+        """
+        completed = {} if completed_days is None else completed_days
+        timer = _FirstDayTimer(self.mode)
+        
+        if self.mode == "per_day" or completed:
+            days = [completed.get(day) for day in WEEK_DAYS]
+            for daily_plan in self._generate_days(user_input, nutrition_analysis, preferences_analysis, days, completed):
+                timer.day_ready()
+                yield _display_day(daily_plan)
+            return self._assemble(days, nutrition_analysis)
+        
+        formatted_prompt = self._format_prompt(user_input, nutrition_analysis, preferences_analysis)
+        parser = JsonArrayStreamParser("week_plan")
+        for text in self._stream(formatted_prompt):
+            for item in parser.feed(text):
+                daily_plan = self._validate_streamed_day(item)
+                if daily_plan is not None:
+                    completed[daily_plan.day] = daily_plan
+                    timer.day_ready()
+                    yield _display_day(daily_plan)
+        
+        # Полный ответ разбирается как обычно: резюме и проверка всего плана
+        weekly_plan = self._parse_week(parser.buffer, user_input, nutrition_analysis, preferences_analysis)
+        yield from _missing_days(weekly_plan, set(completed))
+        return weekly_plan
+    
+    async def _astream_weekly(self, formatted_prompt, on_day: DayCallback, completed: Dict[str, DailyPlan]) -> str:
+        """
+        Асинхронно читает недельный план потоком и передает готовые дни в on_day.
+        
+        Args:
+            formatted_prompt: Промпт недели
+            on_day: Обработчик готовых дней
+            completed: Готовые дни по названиям (дополняется переданными днями)
+            
+        Returns:
+            str: Полный текст ответа
+        """
+        timer = _FirstDayTimer(self.mode)
+        parser = JsonArrayStreamParser("week_plan")
+        async for text in self._astream(formatted_prompt):
+            for item in parser.feed(text):
+                daily_plan = self._validate_streamed_day(item)
+                if daily_plan is not None:
+                    completed[daily_plan.day] = daily_plan
+                    timer.day_ready()
+                    on_day(_display_day(daily_plan))
+        return parser.buffer
+    
+    def _validate_streamed_day(self, item: Dict[str, Any]) -> Optional[DailyPlan]:
+        """Проверяет день из потока; невалидный день пропускается до разбора полного ответа."""
+        try:
+            daily_plan = self._parse(self.day_schema.model_validate, item)
+        except Exception:
+            return None
+        self._fill_nutrients([daily_plan])
+        return _plan_model(daily_plan, DailyPlan)
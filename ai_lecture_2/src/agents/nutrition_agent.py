@@ -1,50 +1,45 @@
 """
 Агент для анализа физических показателей и расчета макронутриентов.
 """
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
+from typing import Optional
 
+from src.agents.base import BaseAgent
 from src.models.schemas import UserInput, NutritionAnalysis
-from src.utils.config import MODEL_NAME, TEMPERATURE
+from src.utils.config import get_settings
+from src.utils.nutrition_calculator import calculate_nutrition
 
 
-class NutritionAgent:
+class NutritionAgent(BaseAgent):
     """Агент для анализа питания на основе физических показателей."""
     
-    def __init__(self):
-        """Инициализация агента."""
-        self.llm = ChatGoogleGenerativeAI(
-            model=MODEL_NAME,
-            temperature=TEMPERATURE,
-            convert_system_message_to_human=True
-        )
-        self.output_parser = PydanticOutputParser(pydantic_object=NutritionAnalysis)
+    agent_name = "nutrition"
+    
+    def __init__(self, mode: Optional[str] = None):
+        """
+        Инициализация агента.
+        
+        Args:
+            mode: "hybrid" - числа считаются локально, рекомендации пишет LLM;
+                "fast" - LLM не вызывается, рекомендации берутся из шаблона;
+                по умолчанию из настроек
+        """
+        from langchain.prompts import ChatPromptTemplate
+        
+        mode = mode or get_settings().nutrition_mode
+        if mode not in ("hybrid", "fast"):
+            raise ValueError(f"Неизвестный режим NutritionAgent: {mode}")
+        self.mode = mode
+        # Клиент модели создается лениво, поэтому в быстром режиме он не создается вовсе
+        super().__init__()
         
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """Ты эксперт-диетолог с глубокими знаниями в области нутрициологии.
-Твоя задача - проанализировать физические показатели пользователя и рассчитать:
-1. Базальный метаболизм (BMR) по формуле Миффлина-Сан Жеора
-2. Дневную норму калорий с учетом цели
-3. Оптимальное соотношение макронутриентов (белки, жиры, углеводы)
-4. Рекомендации по питанию
-
-Для расчета BMR используй формулы:
-- Мужчины: BMR = 10 × вес(кг) + 6.25 × рост(см) - 5 × возраст + 5
-- Женщины: BMR = 10 × вес(кг) + 6.25 × рост(см) - 5 × возраст - 161
-
-Для расчета дневной нормы калорий:
-- Похудение: BMR × 1.2 - 500 ккал
-- Набор массы: BMR × 1.5 + 300 ккал
-- Поддержание: BMR × 1.4
-
-Соотношение макронутриентов:
-- Похудение: белки 35%, жиры 25%, углеводы 40%
-- Набор массы: белки 30%, жиры 20%, углеводы 50%
-- Поддержание: белки 30%, жиры 25%, углеводы 45%
+Базальный метаболизм, дневная норма калорий и макронутриенты пользователя уже рассчитаны
+по формуле Миффлина-Сан Жеора. Твоя задача - дать краткие практические рекомендации
+по питанию с учетом цели и рассчитанных показателей.
 
-{format_instructions}"""),
-            ("user", """Проанализируй следующие данные пользователя:
+Ответь только текстом рекомендаций (3-5 предложений), без пересчета чисел."""),
+            ("user", """Данные пользователя:
 
 Цель: {goal}
 Пол: {gender}
@@ -52,9 +47,39 @@ class NutritionAgent:
 Рост: {height} см
 Возраст: {age} лет
 
-Рассчитай BMR, дневную норму калорий, макронутриенты и дай рекомендации.""")
+Рассчитанные показатели:
+BMR: {bmr} ккал
+Дневная норма калорий: {daily_calories} ккал
+Белки: {protein_g} г
+Жиры: {fats_g} г
+Углеводы: {carbs_g} г
+
+Дай рекомендации по питанию.""")
         ])
     
+    def _format_prompt(self, user_input: UserInput, nutrition_analysis: NutritionAnalysis):
+        """Подставляет данные пользователя и рассчитанные показатели в промпт."""
+        return self.prompt.format_messages(
+            goal=user_input.goal,
+            gender=user_input.gender,
+            weight=user_input.weight,
+            height=user_input.height,
+            age=user_input.age,
+            bmr=nutrition_analysis.bmr,
+            daily_calories=nutrition_analysis.daily_calories,
+            protein_g=nutrition_analysis.protein_g,
+            fats_g=nutrition_analysis.fats_g,
+            carbs_g=nutrition_analysis.carbs_g
+        )
+    
+    @staticmethod
+    def _apply_recommendations(nutrition_analysis: NutritionAnalysis, response) -> NutritionAnalysis:
+        """Переносит текст рекомендаций из ответа модели в анализ."""
+        recommendations = response.content.strip()
+        if recommendations:
+            nutrition_analysis.recommendations = recommendations
+        return nutrition_analysis
+    
     def analyze(self, user_input: UserInput) -> NutritionAnalysis:
         """
         Анализирует физические показатели пользователя.
@@ -65,21 +90,32 @@ class NutritionAgent:
         Returns:
             NutritionAnalysis: Результат анализа
         """
-        # Подготовка промпта
-        formatted_prompt = self.prompt.format_messages(
-            goal=user_input.goal,
-            gender=user_input.gender,
-            weight=user_input.weight,
-            height=user_input.height,
-            age=user_input.age,
-            format_instructions=self.output_parser.get_format_instructions()
-        )
+        # Числа считаем локально: это быстро и воспроизводимо
+        nutrition_analysis = calculate_nutrition(user_input)
         
-        # Вызов LLM
-        response = self.llm.invoke(formatted_prompt)
+        if self.mode == "fast":
+            return nutrition_analysis
         
-        # Парсинг ответа
-        nutrition_analysis = self.output_parser.parse(response.content)
+        # Вызов LLM только за текстом рекомендаций
+        response = self._invoke(self._format_prompt(user_input, nutrition_analysis))
         
-        return nutrition_analysis
-
+        return self._apply_recommendations(nutrition_analysis, response)
+    
+    async def aanalyze(self, user_input: UserInput) -> NutritionAnalysis:
+        """
+        Асинхронная версия analyze.
+        
+        Args:
+            user_input: Входные данные пользователя
+            
+        Returns:
+            NutritionAnalysis: Результат анализа
+        """
+        nutrition_analysis = calculate_nutrition(user_input)
+        
+        if self.mode == "fast":
+            return nutrition_analysis
+        
+        response = await self._ainvoke(self._format_prompt(user_input, nutrition_analysis))
+        
+        return self._apply_recommendations(nutrition_analysis, response)
@@ -1,24 +1,36 @@
 """
 Агент для анализа пищевых предпочтений и подбора продуктов.
 """
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
+from typing import Optional
 
+from src.agents.base import BaseAgent
 from src.models.schemas import UserInput, PreferencesAnalysis
-from src.utils.config import MODEL_NAME, TEMPERATURE
+from src.utils.cache import PersistentLRUCache, normalize_preferences
+from src.utils.config import get_settings
 
 
-class PreferencesAgent:
+class PreferencesAgent(BaseAgent):
     """Агент для анализа пищевых предпочтений пользователя."""
     
-    def __init__(self):
-        """Инициализация агента."""
-        self.llm = ChatGoogleGenerativeAI(
-            model=MODEL_NAME,
-            temperature=TEMPERATURE,
-            convert_system_message_to_human=True
+    agent_name = "preferences"
+    
+    def __init__(self, cache: Optional[PersistentLRUCache] = None):
+        """
+        Инициализация агента.
+        
+        Args:
+            cache: Кэш результатов анализа; по умолчанию создается из настроек
+        """
+        from langchain.prompts import ChatPromptTemplate
+        from langchain.output_parsers import PydanticOutputParser
+        
+        settings = get_settings()
+        self.cache = cache or PersistentLRUCache(
+            path=settings.preferences_cache_path or None,
+            max_size=settings.preferences_cache_size,
+            ttl=settings.preferences_cache_ttl
         )
+        super().__init__()
         self.output_parser = PydanticOutputParser(pydantic_object=PreferencesAnalysis)
         
         self.prompt = ChatPromptTemplate.from_messages([
@@ -52,6 +64,29 @@ class PreferencesAgent:
 Составь подробный список разрешенных и запрещенных продуктов, а также дай рекомендации.""")
         ])
     
+    @staticmethod
+    def _cache_key(user_input: UserInput) -> str:
+        """Анализ зависит только от предпочтений и цели."""
+        return f"{user_input.goal}|{normalize_preferences(user_input.preferences)}"
+    
+    def _format_prompt(self, user_input: UserInput, structured: bool = False):
+        """Подставляет предпочтения и цель в промпт."""
+        return self.prompt.format_messages(
+            preferences=user_input.preferences,
+            goal=user_input.goal,
+            format_instructions=self._format_instructions(PreferencesAnalysis, structured)
+        )
+    
+    def _from_cache(self, cache_key: str) -> Optional[PreferencesAnalysis]:
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return None
+        return PreferencesAnalysis.model_validate_json(cached)
+    
+    def _store(self, cache_key: str, preferences_analysis: PreferencesAnalysis) -> PreferencesAnalysis:
+        self.cache.set(cache_key, preferences_analysis.model_dump_json())
+        return preferences_analysis
+    
     def analyze(self, user_input: UserInput) -> PreferencesAnalysis:
         """
         Анализирует пищевые предпочтения пользователя.
@@ -62,18 +97,55 @@ class PreferencesAgent:
         Returns:
             PreferencesAnalysis: Результат анализа
         """
-        # Подготовка промпта
-        formatted_prompt = self.prompt.format_messages(
-            preferences=user_input.preferences,
-            goal=user_input.goal,
-            format_instructions=self.output_parser.get_format_instructions()
-        )
+        cache_key = self._cache_key(user_input)
+        cached = self._from_cache(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Нативный структурированный вывод: ни инструкций формата, ни парсинга текста
+        if self.structured_output:
+            preferences_analysis = self._invoke_structured(
+                PreferencesAnalysis, self._format_prompt(user_input, structured=True)
+            )
+            if preferences_analysis is not None:
+                return self._store(cache_key, preferences_analysis)
         
         # Вызов LLM
-        response = self.llm.invoke(formatted_prompt)
+        formatted_prompt = self._format_prompt(user_input)
+        response = self._invoke(formatted_prompt)
         
-        # Парсинг ответа
-        preferences_analysis = self.output_parser.parse(response.content)
+        # Парсинг ответа (с исправлением при ошибке) и сохранение в кэш
+        preferences_analysis = self._parse_or_rerequest(
+            self.output_parser.parse, formatted_prompt, response.content
+        )
+        return self._store(cache_key, preferences_analysis)
+    
+    async def aanalyze(self, user_input: UserInput) -> PreferencesAnalysis:
+        """
+        Асинхронная версия analyze.
         
-        return preferences_analysis
-
+        Args:
+            user_input: Входные данные пользователя
+            
+        Returns:
+            PreferencesAnalysis: Результат анализа
+        """
+        cache_key = self._cache_key(user_input)
+        cached = self._from_cache(cache_key)
+        if cached is not None:
+            return cached
+        
+        if self.structured_output:
+            preferences_analysis = await self._ainvoke_structured(
+                PreferencesAnalysis, self._format_prompt(user_input, structured=True)
+            )
+            if preferences_analysis is not None:
+                return self._store(cache_key, preferences_analysis)
+        
+        formatted_prompt = self._format_prompt(user_input)
+        response = await self._ainvoke(formatted_prompt)
+        
+        preferences_analysis = await self._aparse_or_rerequest(
+            self.output_parser.parse, formatted_prompt, response.content
+        )
+        return self._store(cache_key, preferences_analysis)
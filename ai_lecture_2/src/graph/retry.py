@@ -0,0 +1,265 @@
+"""
+Повторы узлов графа с экспоненциальной задержкой и отмена запуска.
+
+Временные ошибки модели (превышение лимита запросов, недоступность сервиса,
+таймауты) повторяются по RetryPolicy узла, остальные сразу завершают узел.
+CancelToken общий для всех узлов запуска: когда узел окончательно падает,
+токен отменяется, и параллельные узлы прекращают ожидание ответа модели и
+больше не повторяют запросы.
+"""
+import asyncio
+import logging
+import random
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from src.utils.metrics import get_metrics
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Классы ошибок SDK, которые означают временный сбой (ищутся по имени в MRO)
+TRANSIENT_ERRORS = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "InternalServerError",
+    "RateLimitError",
+    "APITimeoutError",
+    "APIConnectionError",
+}
+_TRANSIENT_MESSAGE = re.compile(
+    r"\b(429|500|502|503|504)\b|rate limit|resource exhausted|temporarily|timed? ?out|unavailable",
+    re.IGNORECASE
+)
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Проверяет, имеет ли смысл повторить запрос после ошибки.
+    
+    Ошибки разбора и проверки ответа (ValueError, ValidationError) не
+    повторяются: агенты сами перезапрашивают неразобранные ответы.
+    
+    Args:
+        error: Исключение узла
+        
+    Returns:
+        bool: True для превышения лимита, недоступности сервиса и таймаутов
+    """
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    if any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__):
+        return True
+    if isinstance(error, (ValueError, TypeError, KeyError, AttributeError)):
+        return False
+    return bool(_TRANSIENT_MESSAGE.search(str(error)))
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Сколько раз и с какой задержкой повторять узел."""
+    # Всего попыток, включая первую
+    max_attempts: int = 3
+    # Задержка перед первым повтором, с
+    initial_delay: float = 1.0
+    backoff: float = 2.0
+    max_delay: float = 30.0
+    # Случайное отклонение задержки (доля), чтобы параллельные запуски не повторяли запросы одновременно
+    jitter: float = 0.2
+    
+    def delay(self, attempt: int) -> float:
+        """Задержка перед повтором после попытки attempt (с 1)."""
+        delay = min(self.initial_delay * self.backoff ** (attempt - 1), self.max_delay)
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class RunCancelled(Exception):
+    """Запуск отменен: другой узел упал или отмена запрошена извне."""
+    
+    def __init__(self, reason: str, after_failure: bool):
+        super().__init__(reason)
+        self.after_failure = after_failure
+
+
+class CancelToken:
+    """
+    Флаг отмены запуска, который можно ждать из потоков и корутин.
+    
+    Отменяется один раз; причина первой отмены сохраняется.
+    """
+    
+    def __init__(self):
+        self.reason: Optional[str] = None
+        # Отмена из-за ошибки узла: ошибка уже в состоянии графа
+        self.after_failure = False
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, "asyncio.Future"]] = []
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+    
+    def cancel(self, reason: str, after_failure: bool = False) -> bool:
+        """
+        Отменяет запуск.
+        
+        Args:
+            reason: Причина (попадает в error состояния при отмене извне)
+            after_failure: Отмена из-за ошибки другого узла
+            
+        Returns:
+            bool: False, если запуск уже был отменен
+        """
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self.after_failure = after_failure
+            self._event.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        return True
+    
+    def check(self) -> None:
+        """
+        Raises:
+            RunCancelled: Если запуск отменен
+        """
+        if self._event.is_set():
+            raise RunCancelled(self.reason, self.after_failure)
+    
+    def sleep(self, seconds: float) -> None:
+        """
+        Ждет seconds или отмены.
+        
+        Raises:
+            RunCancelled: Если запуск отменен во время ожидания
+        """
+        self._event.wait(seconds)
+        self.check()
+    
+    async def wait(self) -> None:
+        """Ждет отмены."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._waiters.append((loop, future))
+        await future
+    
+    async def asleep(self, seconds: float) -> None:
+        """Асинхронная версия sleep."""
+        try:
+            await asyncio.wait_for(self.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        self.check()
+
+
+def _resolve(future: "asyncio.Future") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def _retry_or_raise(
+    node: str,
+    policy: RetryPolicy,
+    attempt: int,
+    error: Exception
+) -> float:
+    """Задержка перед повтором или исходное исключение, если повторять нельзя."""
+    if attempt >= policy.max_attempts or not is_transient(error):
+        raise error
+    delay = policy.delay(attempt)
+    get_metrics().inc("node_retries_total", node=node)
+    logger.warning(
+        "\n🔁 %s: временная ошибка (%s), попытка %d/%d через %.1f с",
+        node, error, attempt + 1, policy.max_attempts, delay
+    )
+    return delay
+
+
+def call_with_retry(
+    node: str,
+    func: Callable[..., T],
+    policy: RetryPolicy,
+    token: CancelToken,
+    *args: Any,
+    **kwargs: Any
+) -> T:
+    """
+    Вызывает функцию узла, повторяя временные ошибки.
+    
+    Синхронный вызов модели нельзя прервать: отмена проверяется перед
+    каждой попыткой и прерывает ожидание повтора.
+    
+    Args:
+        node: Имя узла (для метрик и логов)
+        func: Вызов агента
+        policy: Политика повторов узла
+        token: Токен отмены запуска
+        *args: Аргументы func
+        **kwargs: Именованные аргументы func
+        
+    Returns:
+        Результат func
+        
+    Raises:
+        RunCancelled: Если запуск отменен
+        Exception: Последняя ошибка func, если повторять нельзя
+    """
+    attempt = 1
+    while True:
+        token.check()
+        try:
+            return func(*args, **kwargs)
+        except Exception as error:
+            delay = _retry_or_raise(node, policy, attempt, error)
+        token.sleep(delay)
+        attempt += 1
+
+
+async def acall_with_retry(
+    node: str,
+    func: Callable[..., Awaitable[T]],
+    policy: RetryPolicy,
+    token: CancelToken,
+    *args: Any,
+    **kwargs: Any
+) -> T:
+    """
+    Асинхронная версия call_with_retry.
+    
+    Запрос к модели выполняется наперегонки с отменой: при отмене он
+    прерывается сразу, не дожидаясь ответа.
+    """
+    attempt = 1
+    while True:
+        token.check()
+        call = asyncio.ensure_future(func(*args, **kwargs))
+        cancelled = asyncio.ensure_future(token.wait())
+        try:
+            await asyncio.wait({call, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        finally:
+            cancelled.cancel()
+        if not call.done():
+            call.cancel()
+            token.check()
+        try:
+            return call.result()
+        except Exception as error:
+            delay = _retry_or_raise(node, policy, attempt, error)
+        await token.asleep(delay)
+        attempt += 1
@@ -1,56 +1,371 @@
 """
 LangGraph workflow для агентной системы составления рациона.
 """
-from typing import Dict, Any
-from langgraph.graph import StateGraph, END
+import asyncio
+import contextlib
+import inspect
+import logging
+import time
+import uuid
+from typing import TYPE_CHECKING, Callable, Dict, Any, Iterator, List, Optional, Set, Tuple
 
-from src.models.schemas import GraphState, UserInput
+from src.models.schemas import (
+    DailyPlan,
+    GraphState,
+    PreferencesAnalysis,
+    UserInput,
+    WeeklyMealPlan,
+    keep_first_error,
+    merge_timings
+)
 from src.agents.nutrition_agent import NutritionAgent
 from src.agents.preferences_agent import PreferencesAgent
-from src.agents.final_agent import FinalAgent
+from src.agents.final_agent import DayCallback, FinalAgent
+from src.graph.retry import CancelToken, RetryPolicy, RunCancelled, acall_with_retry, call_with_retry
+from src.utils.cache import normalize_preferences
+from src.utils.checkpoints import CheckpointStore
+from src.utils.config import get_settings
+from src.utils.metrics import get_metrics, run_context
+from src.utils.nutrition_calculator import calculate_nutrition
+from src.utils.plan_reuse import PlanReuseIndex
+from src.utils.portion_scaling import retarget_plan
+from src.utils.validation import recompute_totals, validate_plan
+from src.utils.visualizer import print_timings
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.graph import StateGraph
+
+
+logger = logging.getLogger(__name__)
+
+# Узлы графа в порядке выполнения и поле состояния с результатом каждого
+NODE_OUTPUTS = {
+    "analyze_nutrition": "nutrition_analysis",
+    "analyze_preferences": "preferences_analysis",
+    "create_plan": "final_plan",
+    "validate_plan": "validation",
+}
+# Поля UserInput, которые читает узел (для инкрементального перезапуска)
+NODE_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    "analyze_nutrition": ("goal", "gender", "weight", "height", "age"),
+    "analyze_preferences": ("goal", "preferences"),
+    "create_plan": ("goal", "gender", "weight", "height", "age", "preferences"),
+    "validate_plan": (),
+}
+# Узлы, результаты которых читает узел
+NODE_INPUTS: Dict[str, Tuple[str, ...]] = {
+    "analyze_nutrition": (),
+    "analyze_preferences": (),
+    "create_plan": ("analyze_nutrition", "analyze_preferences"),
+    "validate_plan": ("analyze_nutrition", "analyze_preferences", "create_plan"),
+}
+# Если изменились только эти поля, порции плана пересчитываются без модели
+RETARGET_FIELDS = ("weight", "height", "age")
+# Узлы, которые обращаются к модели и повторяются при временных ошибках
+LLM_NODES = ("analyze_nutrition", "analyze_preferences", "create_plan")
+
+
+def _record_node(node: str, state: Dict[str, Any], update: Dict[str, Any], started: float) -> Dict[str, Any]:
+    """
+    Записывает длительность и исход узла и добавляет замер в поле timings.
+    
+    Args:
+        node: Имя узла графа
+        state: Состояние, с которым был вызван узел
+        update: Обновление состояния, которое вернул узел
+        started: Момент старта по time.perf_counter()
+        
+    Returns:
+        Dict: Обновление состояния с замером времени
+    """
+    duration = time.perf_counter() - started
+    status = "error" if update.get("error") else "ok"
+    metrics = get_metrics()
+    metrics.observe("node_duration_seconds", duration, node=node)
+    if status == "error":
+        metrics.inc("node_failures_total", node=node)
+    metrics.event(
+        kind="node",
+        run_id=state.get("run_id"),
+        node=node,
+        duration_s=round(duration, 4),
+        status=status
+    )
+    return {**update, "timings": {node: duration}}
+
+
+def changed_fields(previous: UserInput, current: UserInput) -> Set[str]:
+    """
+    Поля UserInput, которые изменились с прошлого запуска.
+    
+    Предпочтения сравниваются в нормализованном виде: регистр, пробелы и
+    порядок пунктов изменением не считаются.
+    
+    Args:
+        previous: Входные данные прошлого запуска
+        current: Новые входные данные
+        
+    Returns:
+        Set: Названия изменившихся полей
+    """
+    changed = {
+        field for field in UserInput.model_fields
+        if field != "preferences" and getattr(previous, field) != getattr(current, field)
+    }
+    if normalize_preferences(previous.preferences) != normalize_preferences(current.preferences):
+        changed.add("preferences")
+    return changed
+
+
+def stale_nodes(previous_state: Dict[str, Any], changed: Set[str]) -> List[str]:
+    """
+    Узлы, которые нужно перезапустить после изменения полей.
+    
+    Узел устарел, если он читает изменившееся поле, если устарел узел, чей
+    результат он читает, или если в прошлом состоянии нет его результата.
+    Проверка плана локальная и выполняется всегда.
+    
+    Args:
+        previous_state: Финальное состояние прошлого запуска
+        changed: Изменившиеся поля UserInput
+        
+    Returns:
+        List: Устаревшие узлы в порядке выполнения
+    """
+    stale: List[str] = []
+    for node, output in NODE_OUTPUTS.items():
+        if (
+            node == "validate_plan"
+            or changed.intersection(NODE_DEPENDENCIES[node])
+            or any(upstream in stale for upstream in NODE_INPUTS[node])
+            or previous_state.get(output) is None
+        ):
+            stale.append(node)
+    return stale
+
+
+def _cancelled(e: RunCancelled) -> Dict[str, Any]:
+    """Обновление узла, прерванного отменой запуска."""
+    # Если отмена вызвана ошибкой другого узла, она уже в состоянии
+    return {} if e.after_failure else {"error": str(e)}
+
+
+def _route(state: Dict[str, Any]) -> str:
+    """Условное ребро: после ошибки граф сразу завершается."""
+    return "stop" if state.get("error") else "continue"
+
+
+def _merge_update(state: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """Применяет обновление узла к состоянию с теми же редьюсерами, что у графа."""
+    merged = {**state, **update}
+    merged["error"] = keep_first_error(state.get("error"), update.get("error"))
+    merged["timings"] = merge_timings(state.get("timings"), update.get("timings"))
+    return merged
+
+
+def _on_day(config: Optional[Dict[str, Any]]) -> Optional[DayCallback]:
+    """Обработчик готовых дней из конфига запуска графа."""
+    return ((config or {}).get("configurable") or {}).get("on_day")
+
+
+def _run_config(on_day: Optional[DayCallback]) -> Optional[Dict[str, Any]]:
+    return {"configurable": {"on_day": on_day}} if on_day is not None else None
 
 
 class MealPlannerWorkflow:
     """Workflow для создания плана питания."""
     
-    def __init__(self):
-        """Инициализация workflow."""
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        plan_index: Optional[PlanReuseIndex] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+        retry_policies: Optional[Dict[str, RetryPolicy]] = None
+    ):
+        """
+        Инициализация workflow.
+        
+        Args:
+            max_concurrency: Максимум одновременных запусков через arun;
+                по умолчанию из настроек
+            plan_index: Индекс готовых планов похожих профилей; по умолчанию
+                создается из настроек при PLAN_REUSE=1
+            checkpoints: Хранилище чекпоинтов узлов для resume; по умолчанию
+                создается из настроек при CHECKPOINTS=1
+            retry_policies: Политики повторов по именам узлов; для остальных
+                узлов из LLM_NODES - NODE_ATTEMPTS и RETRY_DELAY из настроек
+        """
+        settings = get_settings()
+        self.max_concurrency = max_concurrency or settings.max_concurrency
+        if plan_index is None and settings.plan_reuse:
+            plan_index = PlanReuseIndex(settings.plan_reuse_path or None, settings.plan_reuse_distance)
+        self.plan_index = plan_index
+        if checkpoints is None and settings.checkpoints:
+            checkpoints = CheckpointStore(settings.checkpoint_path or None, settings.checkpoint_ttl)
+        self.checkpoints = checkpoints
+        default_policy = RetryPolicy(max_attempts=settings.node_attempts, initial_delay=settings.retry_delay)
+        self.retry_policies = {node: default_policy for node in LLM_NODES}
+        self.retry_policies.update(retry_policies or {})
+        # Токены отмены выполняющихся запусков по run_id
+        self._tokens: Dict[str, CancelToken] = {}
+        self._semaphore = None
+        self._semaphore_loop = None
         self.nutrition_agent = NutritionAgent()
         self.preferences_agent = PreferencesAgent()
         self.final_agent = FinalAgent()
         self.graph = self._build_graph()
     
-    def _build_graph(self) -> StateGraph:
+    def _build_graph(self) -> "StateGraph":
         """
         Строит граф workflow.
         
         Returns:
             StateGraph: Граф состояний
         """
+        from langgraph.graph import StateGraph, END
+        
         # Создаем граф
         workflow = StateGraph(GraphState)
         
         # Добавляем узлы
-        workflow.add_node("analyze_nutrition", self._analyze_nutrition)
-        workflow.add_node("analyze_preferences", self._analyze_preferences)
-        workflow.add_node("create_plan", self._create_plan)
+        workflow.add_node("start", self._start)
+        # Каждый узел имеет синхронную и асинхронную реализацию (для invoke и ainvoke)
+        for node, (func, afunc) in self._nodes().items():
+            workflow.add_node(node, self._traced(node, func, afunc))
         
         # Устанавливаем точку входа
-        workflow.set_entry_point("analyze_nutrition")
+        workflow.set_entry_point("start")
+        
+        workflow.add_node("join", self._join)
         
         # Добавляем ребра (связи между узлами)
-        # После анализа питания идем к анализу предпочтений
-        workflow.add_edge("analyze_nutrition", "analyze_preferences")
+        # Анализы не зависят друг от друга, поэтому запускаются параллельно
+        workflow.add_edge("start", "analyze_nutrition")
+        workflow.add_edge("start", "analyze_preferences")
         
-        # После анализа предпочтений создаем план
-        workflow.add_edge("analyze_preferences", "create_plan")
+        # План создается только после успешного завершения обоих анализов
+        workflow.add_edge(["analyze_nutrition", "analyze_preferences"], "join")
+        workflow.add_conditional_edges("join", _route, {"continue": "create_plan", "stop": END})
         
-        # После создания плана завершаем
-        workflow.add_edge("create_plan", END)
+        # Готовый план проверяется локально, без обращения к модели
+        workflow.add_conditional_edges("create_plan", _route, {"continue": "validate_plan", "stop": END})
+        workflow.add_edge("validate_plan", END)
         
         # Компилируем граф
         return workflow.compile()
     
+    def _nodes(self) -> Dict[str, Tuple[Callable, Callable]]:
+        """Синхронная и асинхронная реализации узлов графа (порядок NODE_OUTPUTS)."""
+        return {
+            "analyze_nutrition": (self._analyze_nutrition, self._aanalyze_nutrition),
+            "analyze_preferences": (self._analyze_preferences, self._aanalyze_preferences),
+            "create_plan": (self._create_plan, self._acreate_plan),
+            "validate_plan": (self._validate_plan, self._avalidate_plan),
+        }
+    
+    def _traced(self, node: str, func: Callable, afunc: Callable) -> "RunnableLambda":
+        """
+        Оборачивает узел: run_id состояния становится текущим для событий агентов,
+        длительность и исход узла записываются в метрики и поле timings, а
+        успешный результат - в чекпоинты.
+        
+        Args:
+            node: Имя узла графа
+            func: Синхронная реализация узла
+            afunc: Асинхронная реализация узла
+            
+        Returns:
+            RunnableLambda: Узел с синхронной и асинхронной реализацией
+        """
+        from langchain_core.runnables import RunnableLambda
+        from langchain_core.runnables.utils import accepts_config
+        
+        # Конфиг запуска (например, обработчик on_day) нужен не всем узлам
+        pass_config = accepts_config(func)
+        
+        def run(state: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+            started = time.perf_counter()
+            with run_context(state.get("run_id")):
+                update = func(state, config=config) if pass_config else func(state)
+            return self._finish_node(node, state, update, started)
+        
+        async def arun(state: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+            started = time.perf_counter()
+            with run_context(state.get("run_id")):
+                update = await afunc(state, config=config) if pass_config else await afunc(state)
+            return self._finish_node(node, state, update, started)
+        
+        return RunnableLambda(run, afunc=arun)
+    
+    def _finish_node(self, node: str, state: Dict[str, Any], update: Dict[str, Any], started: float) -> Dict[str, Any]:
+        """
+        Записывает замеры узла, сохраняет успешный результат в чекпоинты, а
+        при ошибке отменяет параллельные узлы запуска.
+        
+        Returns:
+            Dict: Обновление состояния с замером времени
+        """
+        update = _record_node(node, state, update, started)
+        if update.get("error"):
+            self._token(state).cancel(update["error"], after_failure=True)
+        elif self.checkpoints is not None:
+            self.checkpoints.save(state["run_id"], node, update, update["timings"][node])
+        return update
+    
+    def _token(self, state: Dict[str, Any]) -> CancelToken:
+        """Токен отмены запуска (создается при первом обращении)."""
+        return self._tokens.setdefault(state["run_id"], CancelToken())
+    
+    def _call(self, node: str, state: Dict[str, Any], func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Вызывает агента с политикой повторов узла и токеном отмены запуска."""
+        return call_with_retry(node, func, self.retry_policies[node], self._token(state), *args, **kwargs)
+    
+    async def _acall(self, node: str, state: Dict[str, Any], func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Асинхронная версия _call."""
+        return await acall_with_retry(node, func, self.retry_policies[node], self._token(state), *args, **kwargs)
+    
+    def cancel(self, run_id: str, reason: str = "Запуск отменен") -> bool:
+        """
+        Отменяет выполняющийся запуск.
+        
+        Асинхронные узлы прерываются сразу, синхронные - перед следующим
+        обращением к модели. Запуск завершается с ошибкой reason.
+        
+        Args:
+            run_id: Идентификатор запуска
+            reason: Причина отмены для поля error
+            
+        Returns:
+            bool: False, если запуск не выполняется или уже отменен
+        """
+        token = self._tokens.get(run_id)
+        return token is not None and token.cancel(reason)
+    
+    def _start(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Входной узел, из которого расходятся параллельные ветки анализа.
+        
+        Args:
+            state: Текущее состояние графа
+            
+        Returns:
+            Dict: Пустое обновление состояния
+        """
+        return {}
+    
+    def _join(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Узел, дожидающийся обоих анализов; дальше граф идет по условному ребру.
+        
+        Args:
+            state: Текущее состояние графа
+            
+        Returns:
+            Dict: Пустое обновление состояния
+        """
+        return {}
+    
     def _analyze_nutrition(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
         Узел для анализа физических показателей.
@@ -62,25 +377,44 @@ class MealPlannerWorkflow:
             Dict: Обновленное состояние
         """
         try:
-            user_input = state["user_input"]
-            
             # Анализируем физические показатели
-            nutrition_analysis = self.nutrition_agent.analyze(user_input)
-            
-            print(f"\n✓ Анализ питания завершен:")
-            print(f"  - Дневная норма калорий: {nutrition_analysis.daily_calories} ккал")
-            print(f"  - Белки: {nutrition_analysis.protein_g} г")
-            print(f"  - Жиры: {nutrition_analysis.fats_g} г")
-            print(f"  - Углеводы: {nutrition_analysis.carbs_g} г")
-            
-            return {
-                "nutrition_analysis": nutrition_analysis
-            }
+            nutrition_analysis = self._call(
+                "analyze_nutrition", state, self.nutrition_agent.analyze, state["user_input"]
+            )
+            return self._nutrition_done(nutrition_analysis)
         except Exception as e:
-            print(f"\n✗ Ошибка при анализе питания: {e}")
-            return {
-                "error": f"Ошибка анализа питания: {str(e)}"
-            }
+            return self._nutrition_failed(e)
+    
+    async def _aanalyze_nutrition(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Асинхронная версия узла analyze_nutrition."""
+        try:
+            nutrition_analysis = await self._acall(
+                "analyze_nutrition", state, self.nutrition_agent.aanalyze, state["user_input"]
+            )
+            return self._nutrition_done(nutrition_analysis)
+        except Exception as e:
+            return self._nutrition_failed(e)
+    
+    def _nutrition_done(self, nutrition_analysis) -> Dict[str, Any]:
+        logger.info(
+            "\n✓ Анализ питания завершен:\n"
+            "  - Дневная норма калорий: %s ккал\n"
+            "  - Белки: %s г\n"
+            "  - Жиры: %s г\n"
+            "  - Углеводы: %s г",
+            nutrition_analysis.daily_calories,
+            nutrition_analysis.protein_g,
+            nutrition_analysis.fats_g,
+            nutrition_analysis.carbs_g
+        )
+        
+        return {"nutrition_analysis": nutrition_analysis}
+    
+    def _nutrition_failed(self, e: Exception) -> Dict[str, Any]:
+        if isinstance(e, RunCancelled):
+            return _cancelled(e)
+        logger.warning("\n✗ Ошибка при анализе питания: %s", e)
+        return {"error": f"Ошибка анализа питания: {str(e)}"}
     
     def _analyze_preferences(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -93,83 +427,580 @@ class MealPlannerWorkflow:
             Dict: Обновленное состояние
         """
         try:
-            user_input = state["user_input"]
-            
             # Анализируем предпочтения
-            preferences_analysis = self.preferences_agent.analyze(user_input)
-            
-            print(f"\n✓ Анализ предпочтений завершен:")
-            print(f"  - Разрешенных продуктов: {len(preferences_analysis.allowed_foods)}")
-            print(f"  - Запрещенных продуктов: {len(preferences_analysis.restricted_foods)}")
-            
-            return {
-                "preferences_analysis": preferences_analysis
-            }
+            preferences_analysis = self._call(
+                "analyze_preferences", state, self.preferences_agent.analyze, state["user_input"]
+            )
+            return self._preferences_done(preferences_analysis)
+        except Exception as e:
+            return self._preferences_failed(e)
+    
+    async def _aanalyze_preferences(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Асинхронная версия узла analyze_preferences."""
+        try:
+            preferences_analysis = await self._acall(
+                "analyze_preferences", state, self.preferences_agent.aanalyze, state["user_input"]
+            )
+            return self._preferences_done(preferences_analysis)
         except Exception as e:
-            print(f"\n✗ Ошибка при анализе предпочтений: {e}")
-            return {
-                "error": f"Ошибка анализа предпочтений: {str(e)}"
-            }
+            return self._preferences_failed(e)
     
-    def _create_plan(self, state: Dict[str, Any]) -> Dict[str, Any]:
+    def _preferences_done(self, preferences_analysis) -> Dict[str, Any]:
+        logger.info(
+            "\n✓ Анализ предпочтений завершен:\n"
+            "  - Разрешенных продуктов: %d\n"
+            "  - Запрещенных продуктов: %d",
+            len(preferences_analysis.allowed_foods),
+            len(preferences_analysis.restricted_foods)
+        )
+        
+        return {"preferences_analysis": preferences_analysis}
+    
+    def _preferences_failed(self, e: Exception) -> Dict[str, Any]:
+        if isinstance(e, RunCancelled):
+            return _cancelled(e)
+        logger.warning("\n✗ Ошибка при анализе предпочтений: %s", e)
+        return {"error": f"Ошибка анализа предпочтений: {str(e)}"}
+    
+    def _create_plan(self, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Узел для создания финального плана питания.
         
         Args:
             state: Текущее состояние графа
+            config: Конфиг запуска; configurable.on_day получает дни по мере готовности
             
         Returns:
             Dict: Обновленное состояние
         """
+        # Готовые дни переживают повторы узла: повтор генерирует только недостающие дни
+        completed_days: Dict[str, DailyPlan] = {}
         try:
-            user_input = state["user_input"]
-            nutrition_analysis = state["nutrition_analysis"]
-            preferences_analysis = state["preferences_analysis"]
-            
             # Создаем план питания
-            weekly_plan = self.final_agent.create_plan(
-                user_input,
-                nutrition_analysis,
-                preferences_analysis
+            weekly_plan = self._call(
+                "create_plan",
+                state,
+                self.final_agent.create_plan,
+                state["user_input"],
+                state["nutrition_analysis"],
+                state["preferences_analysis"],
+                on_day=_on_day(config),
+                completed_days=completed_days
             )
-            
-            print(f"\n✓ Недельный план питания создан:")
-            print(f"  - Дней в плане: {len(weekly_plan.week_plan)}")
-            
-            return {
-                "final_plan": weekly_plan
-            }
+            return self._plan_done(weekly_plan)
+        except Exception as e:
+            return self._plan_failed(e)
+    
+    async def _acreate_plan(self, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Асинхронная версия узла create_plan."""
+        completed_days: Dict[str, DailyPlan] = {}
+        try:
+            weekly_plan = await self._acall(
+                "create_plan",
+                state,
+                self.final_agent.acreate_plan,
+                state["user_input"],
+                state["nutrition_analysis"],
+                state["preferences_analysis"],
+                on_day=_on_day(config),
+                completed_days=completed_days
+            )
+            return self._plan_done(weekly_plan)
         except Exception as e:
-            print(f"\n✗ Ошибка при создании плана: {e}")
-            return {
-                "error": f"Ошибка создания плана: {str(e)}"
-            }
+            return self._plan_failed(e)
+    
+    def _plan_done(self, weekly_plan) -> Dict[str, Any]:
+        logger.info(
+            "\n✓ Недельный план питания создан:\n"
+            "  - Дней в плане: %d",
+            len(weekly_plan.week_plan)
+        )
+        
+        return {"final_plan": weekly_plan}
+    
+    def _plan_failed(self, e: Exception) -> Dict[str, Any]:
+        if isinstance(e, RunCancelled):
+            return _cancelled(e)
+        logger.warning("\n✗ Ошибка при создании плана: %s", e)
+        return {"error": f"Ошибка создания плана: {str(e)}"}
     
-    def run(self, user_input: UserInput) -> Dict[str, Any]:
+    def _validate_plan(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Запускает workflow.
+        Узел локальной проверки плана.
+        
+        Сверяет калорийность и макронутриенты дней с нормой и заменяет итоги
+        дней суммой приемов пищи.
+        
+        Args:
+            state: Текущее состояние графа
+            
+        Returns:
+            Dict: Обновленное состояние
+        """
+        weekly_plan = state.get("final_plan")
+        if state.get("error") or weekly_plan is None:
+            return {}
+        
+        report = validate_plan(weekly_plan, state["nutrition_analysis"], state.get("preferences_analysis"))
+        get_metrics().inc("plan_violations_total", len(report.violations))
+        if report.valid:
+            logger.info("\n✓ План прошел проверку")
+        else:
+            logger.warning("\n⚠️  Нарушений в плане: %d", len(report.violations))
+        
+        return {"final_plan": recompute_totals(weekly_plan), "validation": report}
+    
+    async def _avalidate_plan(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Асинхронная версия узла validate_plan (проверка локальная и быстрая)."""
+        return self._validate_plan(state)
+    
+    def _reuse(self, user_input: UserInput, run_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Ищет готовый план похожего профиля в индексе повторного использования.
+        
+        План соседа отдается, только если проходит проверку по норме
+        текущего пользователя - как есть или после пересчета порций.
         
         Args:
             user_input: Входные данные пользователя
+            run_id: Идентификатор запуска
+            
+        Returns:
+            Optional[Dict]: Финальное состояние без обращения к модели или None
+        """
+        if self.plan_index is None:
+            return None
+        started = time.perf_counter()
+        metrics = get_metrics()
+        nutrition_analysis = calculate_nutrition(user_input)
+        match = self.plan_index.lookup(user_input, nutrition_analysis)
+        if match is None:
+            metrics.inc("plan_reuse_total", result="miss")
+            return None
+        
+        nutrition_analysis = nutrition_analysis.model_copy(update={"recommendations": match.recommendations})
+        weekly_plan = match.plan
+        report = validate_plan(weekly_plan, nutrition_analysis, match.preferences_analysis)
+        if not report.valid:
+            # Блюда соседа подходят, порции пересчитываются под норму (lookup вернул копию)
+            weekly_plan = retarget_plan(weekly_plan, nutrition_analysis)
+            report = validate_plan(weekly_plan, nutrition_analysis, match.preferences_analysis)
+        if not report.valid:
+            self.plan_index.reject()
+            metrics.inc("plan_reuse_total", result="rejected")
+            return None
+        
+        state = self._initial_state(user_input, run_id)
+        metrics.inc("plan_reuse_total", result="hit")
+        metrics.event(
+            kind="plan_reuse",
+            run_id=state["run_id"],
+            source_run_id=match.run_id,
+            distance=round(match.distance, 3)
+        )
+        logger.info("\n♻️  План взят у похожего профиля (расстояние %.2f)", match.distance)
+        return {
+            **state,
+            "nutrition_analysis": nutrition_analysis,
+            "preferences_analysis": match.preferences_analysis,
+            "final_plan": recompute_totals(weekly_plan),
+            "validation": report,
+            "reused_from": match.run_id,
+            "timings": {"plan_reuse": time.perf_counter() - started}
+        }
+    
+    def _remember(self, final_state: Dict[str, Any]) -> None:
+        """Добавляет новый план, прошедший проверку, в индекс повторного использования."""
+        if self.plan_index is None or final_state.get("error") or final_state.get("reused_from"):
+            return
+        weekly_plan = final_state.get("final_plan")
+        validation = final_state.get("validation")
+        if weekly_plan is None or (validation is not None and not validation.valid):
+            return
+        self.plan_index.add(
+            final_state["user_input"],
+            weekly_plan,
+            final_state["preferences_analysis"],
+            final_state.get("nutrition_analysis"),
+            final_state.get("run_id")
+        )
+    
+    def retarget(
+        self,
+        weekly_plan: WeeklyMealPlan,
+        user_input: UserInput,
+        preferences_analysis: Optional[PreferencesAnalysis] = None,
+        run_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Пересчитывает порции готового плана под новые данные пользователя без модели.
+        
+        Подходит, когда изменился вес или цель, а блюда можно оставить: норма
+        считается локально, количества в строках продуктов масштабируются.
+        
+        Args:
+            weekly_plan: Готовый план (не изменяется)
+            user_input: Новые входные данные пользователя
+            preferences_analysis: Анализ предпочтений для проверки запрещенных продуктов
+            run_id: Идентификатор запуска; по умолчанию генерируется
+            
+        Returns:
+            GraphState: Финальное состояние с пересчитанным планом и отчетом проверки
+        """
+        started = time.perf_counter()
+        state = self._initial_state(user_input, run_id)
+        nutrition_analysis = calculate_nutrition(user_input)
+        with run_context(state["run_id"]):
+            weekly_plan = retarget_plan(weekly_plan.model_copy(deep=True), nutrition_analysis)
+            report = validate_plan(weekly_plan, nutrition_analysis, preferences_analysis)
+        duration = time.perf_counter() - started
+        get_metrics().observe("retarget_duration_seconds", duration)
+        logger.info("\n✓ Порции пересчитаны под %s ккал", nutrition_analysis.daily_calories)
+        final_state = {
+            **state,
+            "nutrition_analysis": nutrition_analysis,
+            "preferences_analysis": preferences_analysis,
+            "final_plan": weekly_plan,
+            "validation": report,
+            "timings": {"retarget": duration}
+        }
+        self._record_run(final_state, duration)
+        return final_state
+    
+    def _prepare_rerun(
+        self,
+        previous_state: Dict[str, Any],
+        user_input: UserInput,
+        run_id: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], List[str], Set[str]]:
+        """
+        Начальное состояние повторного запуска с результатами неустаревших узлов.
+        
+        Returns:
+            Tuple: (состояние, устаревшие узлы, изменившиеся поля)
+        """
+        changed = changed_fields(previous_state["user_input"], user_input)
+        stale = stale_nodes(previous_state, changed)
+        state = self._initial_state(user_input, run_id)
+        self._tokens[state["run_id"]] = CancelToken()
+        metrics = get_metrics()
+        for node, output in NODE_OUTPUTS.items():
+            if node not in stale:
+                # Проверка плана изменяет итоги дней на месте: прошлое состояние не трогаем
+                state[output] = previous_state[output].model_copy(deep=True)
+                metrics.inc("nodes_reused_total", node=node)
+        if self.checkpoints is not None:
+            # Взятые результаты тоже сохраняются: новый запуск продолжается без прошлого состояния
+            self.checkpoints.start(state["run_id"], user_input)
+            for node, output in NODE_OUTPUTS.items():
+                if node not in stale:
+                    self.checkpoints.save(state["run_id"], node, {output: state[output]})
+        return state, stale, changed
+    
+    def _retarget_stale(
+        self,
+        state: Dict[str, Any],
+        previous_state: Dict[str, Any],
+        stale: List[str],
+        changed: Set[str]
+    ) -> Dict[str, Any]:
+        """
+        Пересчитывает порции прошлого плана вместо нового обращения к модели.
+        
+        Срабатывает, если изменились только RETARGET_FIELDS: блюда остаются
+        прежними, меняется норма. План отдается, только если проходит проверку.
+        
+        Args:
+            state: Состояние после анализов
+            previous_state: Финальное состояние прошлого запуска
+            stale: Устаревшие узлы; create_plan убирается, если план пересчитан
+            changed: Изменившиеся поля UserInput
+            
+        Returns:
+            Dict: Состояние с пересчитанным планом или без изменений
+        """
+        if (
+            "create_plan" not in stale
+            or "analyze_preferences" in stale
+            or not changed.issubset(RETARGET_FIELDS)
+            or previous_state.get("final_plan") is None
+            or state.get("error")
+        ):
+            return state
+        started = time.perf_counter()
+        with run_context(state["run_id"]):
+            weekly_plan = retarget_plan(previous_state["final_plan"].model_copy(deep=True), state["nutrition_analysis"])
+            report = validate_plan(weekly_plan, state["nutrition_analysis"], state["preferences_analysis"])
+        if not report.valid:
+            return state
+        stale.remove("create_plan")
+        get_metrics().inc("nodes_reused_total", node="create_plan")
+        logger.info("\n✓ Порции прошлого плана пересчитаны под %s ккал", state["nutrition_analysis"].daily_calories)
+        return _merge_update(state, {"final_plan": weekly_plan, "timings": {"retarget": time.perf_counter() - started}})
+    
+    def _run_node(self, node: str, state: Dict[str, Any], on_day: Optional[DayCallback]) -> Dict[str, Any]:
+        """Выполняет узел вне графа с теми же замерами, что и в графе."""
+        func, _ = self._nodes()[node]
+        started = time.perf_counter()
+        with run_context(state["run_id"]):
+            if "config" in inspect.signature(func).parameters:
+                update = func(state, config=_run_config(on_day))
+            else:
+                update = func(state)
+        return self._finish_node(node, state, update, started)
+    
+    async def _arun_node(self, node: str, state: Dict[str, Any], on_day: Optional[DayCallback]) -> Dict[str, Any]:
+        """Асинхронная версия _run_node."""
+        _, afunc = self._nodes()[node]
+        started = time.perf_counter()
+        with run_context(state["run_id"]):
+            if "config" in inspect.signature(afunc).parameters:
+                update = await afunc(state, config=_run_config(on_day))
+            else:
+                update = await afunc(state)
+        return self._finish_node(node, state, update, started)
+    
+    def _finish_rerun(
+        self,
+        final_state: Dict[str, Any],
+        stale: List[str],
+        on_day: Optional[DayCallback],
+        total: float
+    ) -> Dict[str, Any]:
+        """Отдает дни плана, построенного без модели, и записывает метрики запуска."""
+        if "create_plan" not in stale and final_state.get("final_plan") is not None:
+            self._emit_days(final_state, on_day)
+        get_metrics().event(
+            kind="incremental",
+            run_id=final_state["run_id"],
+            rerun=[node for node in stale if node != "validate_plan"],
+            duration_s=round(total, 4)
+        )
+        self._record_run(final_state, total)
+        self._remember(final_state)
+        return final_state
+    
+    def rerun(
+        self,
+        previous_state: Dict[str, Any],
+        user_input: UserInput,
+        run_id: Optional[str] = None,
+        on_day: Optional[DayCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Перестраивает план после изменения входных данных, повторяя только устаревшие узлы.
+        
+        Узел перезапускается, если изменилось поле из NODE_DEPENDENCIES или
+        перезапущен узел, результат которого он читает; остальные результаты
+        берутся из прошлого состояния. Если изменились только вес, рост или
+        возраст, порции прошлого плана пересчитываются под новую норму без
+        обращения к модели.
+        
+        Args:
+            previous_state: Финальное состояние прошлого запуска
+            user_input: Новые входные данные пользователя
+            run_id: Идентификатор запуска; по умолчанию генерируется
+            on_day: Вызывается с каждым днем плана, как только он готов
             
         Returns:
             GraphState: Финальное состояние с планом питания
         """
-        print("\n" + "="*60)
-        print("🚀 Запуск агентной системы составления рациона")
-        print("="*60)
+        started = time.perf_counter()
+        state, stale, changed = self._prepare_rerun(previous_state, user_input, run_id)
+        logger.info("\n🔁 Изменены поля: %s; узлы к перезапуску: %s",
+                    ", ".join(sorted(changed)) or "нет", ", ".join(stale))
+        with self._closing_run(state["run_id"]):
+            for node in list(stale):
+                if node == "create_plan":
+                    state = self._retarget_stale(state, previous_state, stale, changed)
+                    if node not in stale:
+                        continue
+                if state.get("error"):
+                    break
+                state = _merge_update(state, self._run_node(node, state, on_day))
+            return self._finish_rerun(state, stale, on_day, time.perf_counter() - started)
+    
+    async def arerun(
+        self,
+        previous_state: Dict[str, Any],
+        user_input: UserInput,
+        run_id: Optional[str] = None,
+        on_day: Optional[DayCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Асинхронная версия rerun.
+        
+        Устаревшие анализы выполняются параллельно. Место в max_concurrency
+        занимается, только если нужно обращаться к модели.
+        
+        Args:
+            previous_state: Финальное состояние прошлого запуска
+            user_input: Новые входные данные пользователя
+            run_id: Идентификатор запуска; по умолчанию генерируется
+            on_day: Вызывается с каждым днем плана, как только он готов
+            
+        Returns:
+            GraphState: Финальное состояние с планом питания
+        """
+        started = time.perf_counter()
+        state, stale, changed = self._prepare_rerun(previous_state, user_input, run_id)
+        with self._closing_run(state["run_id"]):
+            if stale == ["validate_plan"]:
+                state = _merge_update(state, await self._arun_node("validate_plan", state, on_day))
+                return self._finish_rerun(state, stale, on_day, time.perf_counter() - started)
+            
+            async with self._get_semaphore():
+                analyses = [node for node in ("analyze_nutrition", "analyze_preferences") if node in stale]
+                updates = await asyncio.gather(*(self._arun_node(node, state, on_day) for node in analyses))
+                for update in updates:
+                    state = _merge_update(state, update)
+                state = self._retarget_stale(state, previous_state, stale, changed)
+                for node in ("create_plan", "validate_plan"):
+                    if node in stale and not state.get("error"):
+                        state = _merge_update(state, await self._arun_node(node, state, on_day))
+            return self._finish_rerun(state, stale, on_day, time.perf_counter() - started)
+    
+    def _load_checkpoint(self, run_id: str) -> Dict[str, Any]:
+        """
+        Состояние запуска из чекпоинтов.
         
-        # Создаем начальное состояние
-        initial_state = {
+        Raises:
+            ValueError: Если чекпоинты не включены
+            KeyError: Если запуска нет в хранилище (или он удален по ttl)
+        """
+        if self.checkpoints is None:
+            raise ValueError("Чекпоинты не включены: передайте checkpoints или задайте CHECKPOINTS=1")
+        state = self.checkpoints.load(run_id)
+        if state is None:
+            raise KeyError(f"Нет чекпоинтов запуска {run_id}")
+        done = [node for node in NODE_OUTPUTS if node in state["timings"]]
+        logger.info("\n⏯️  Продолжение запуска %s, готовые узлы: %s", run_id, ", ".join(done) or "нет")
+        get_metrics().inc("runs_resumed_total")
+        return state
+    
+    def resume(self, run_id: str, on_day: Optional[DayCallback] = None) -> Dict[str, Any]:
+        """
+        Продолжает запуск с последнего завершенного узла.
+        
+        Результаты узлов берутся из чекпоинтов, повторяются только узлы без
+        результата (например, упавший create_plan и проверка плана).
+        
+        Args:
+            run_id: Идентификатор упавшего или прерванного запуска
+            on_day: Вызывается с каждым днем плана, как только он готов
+            
+        Returns:
+            GraphState: Финальное состояние с планом питания
+            
+        Raises:
+            ValueError: Если чекпоинты не включены
+            KeyError: Если запуска нет в хранилище
+        """
+        state = self._load_checkpoint(run_id)
+        return self.rerun(state, state["user_input"], run_id=run_id, on_day=on_day)
+    
+    async def aresume(self, run_id: str, on_day: Optional[DayCallback] = None) -> Dict[str, Any]:
+        """Асинхронная версия resume."""
+        state = self._load_checkpoint(run_id)
+        return await self.arerun(state, state["user_input"], run_id=run_id, on_day=on_day)
+    
+    @staticmethod
+    def _emit_days(final_state: Dict[str, Any], on_day: Optional[DayCallback]) -> None:
+        """Передает обработчику дни плана, взятого из индекса целиком."""
+        if on_day is not None:
+            for daily_plan in final_state["final_plan"].week_plan:
+                on_day(daily_plan)
+    
+    @staticmethod
+    def _initial_state(user_input: UserInput, run_id: Optional[str] = None) -> Dict[str, Any]:
+        """Создает начальное состояние графа с идентификатором запуска."""
+        return {
+            "run_id": run_id or uuid.uuid4().hex,
             "user_input": user_input,
             "nutrition_analysis": None,
             "preferences_analysis": None,
             "final_plan": None,
-            "error": None
+            "validation": None,
+            "reused_from": None,
+            "error": None,
+            "timings": {}
         }
+    
+    def _begin(self, user_input: UserInput, run_id: Optional[str] = None) -> Dict[str, Any]:
+        """Начальное состояние запуска графа; запуск регистрируется в чекпоинтах."""
+        state = self._initial_state(user_input, run_id)
+        self._tokens[state["run_id"]] = CancelToken()
+        if self.checkpoints is not None:
+            self.checkpoints.start(state["run_id"], user_input)
+        return state
+    
+    @contextlib.contextmanager
+    def _closing_run(self, run_id: str) -> Iterator[None]:
+        """
+        Закрывает запуск, прерванный исключением.
+        
+        Обычное завершение записывает _record_run. Если граф или узел
+        выбрасывает исключение (в том числе asyncio.CancelledError при отмене
+        задачи), токен отмены удаляется, а запуск в чекпоинтах получает статус
+        "error" и остается доступным для resume.
+        
+        Args:
+            run_id: Идентификатор запуска
+        """
+        try:
+            yield
+        except BaseException:
+            self._tokens.pop(run_id, None)
+            if self.checkpoints is not None:
+                self.checkpoints.finish(run_id, "error")
+            raise
+    
+    def run(
+        self,
+        user_input: UserInput,
+        run_id: Optional[str] = None,
+        on_day: Optional[DayCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Запускает workflow.
+        
+        Args:
+            user_input: Входные данные пользователя
+            run_id: Идентификатор запуска для метрик и трассировки;
+                по умолчанию генерируется
+            on_day: Вызывается с каждым днем плана, как только он готов
+            
+        Returns:
+            GraphState: Финальное состояние с планом питания
+        """
+        print("\n" + "="*60)
+        print("🚀 Запуск агентной системы составления рациона")
+        print("="*60)
         
         # Запускаем граф
-        final_state = self.graph.invoke(initial_state)
+        started = time.perf_counter()
+        first_day: List[float] = []
+        
+        def on_day_timed(daily_plan) -> None:
+            if not first_day:
+                first_day.append(time.perf_counter() - started)
+            on_day(daily_plan)
+        
+        final_state = self._reuse(user_input, run_id)
+        if final_state is None:
+            state = self._begin(user_input, run_id)
+            with self._closing_run(state["run_id"]):
+                final_state = self.graph.invoke(
+                    state,
+                    config=_run_config(on_day_timed if on_day is not None else None)
+                )
+            self._remember(final_state)
+        else:
+            self._emit_days(final_state, on_day_timed if on_day is not None else None)
+        total = time.perf_counter() - started
+        self._record_run(final_state, total)
+        
+        print_timings(final_state.get("timings", {}), total, first_day[0] if first_day else None)
         
         print("\n" + "="*60)
         print("✅ Работа системы завершена")
@@ -177,4 +1008,71 @@ class MealPlannerWorkflow:
         
         # Возвращаем состояние как есть (уже GraphState типа)
         return final_state
-
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Семафор ограничения параллельных запусков для текущего event loop."""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+    
+    def _record_run(self, final_state: Dict[str, Any], total: float) -> None:
+        """Записывает длительность и исход всего запуска."""
+        status = "error" if final_state.get("error") else "ok"
+        metrics = get_metrics()
+        metrics.observe("run_duration_seconds", total, status=status)
+        metrics.inc("runs_total", status=status)
+        metrics.event(kind="run", run_id=final_state.get("run_id"), duration_s=round(total, 4), status=status)
+        if self.checkpoints is not None:
+            self.checkpoints.finish(final_state["run_id"], status)
+        self._tokens.pop(final_state["run_id"], None)
+    
+    async def arun(
+        self,
+        user_input: UserInput,
+        run_id: Optional[str] = None,
+        on_day: Optional[DayCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Асинхронно запускает workflow.
+        
+        Одновременно выполняется не более max_concurrency запусков,
+        остальные ждут своей очереди. План из индекса повторного
+        использования отдается без ожидания.
+        
+        Args:
+            user_input: Входные данные пользователя
+            run_id: Идентификатор запуска; по умолчанию генерируется
+            on_day: Вызывается с каждым днем плана, как только он готов
+            
+        Returns:
+            GraphState: Финальное состояние с планом питания
+        """
+        started = time.perf_counter()
+        final_state = self._reuse(user_input, run_id)
+        if final_state is not None:
+            self._emit_days(final_state, on_day)
+            self._record_run(final_state, time.perf_counter() - started)
+            return final_state
+        
+        async with self._get_semaphore():
+            started = time.perf_counter()
+            state = self._begin(user_input, run_id)
+            with self._closing_run(state["run_id"]):
+                final_state = await self.graph.ainvoke(state, config=_run_config(on_day))
+            self._record_run(final_state, time.perf_counter() - started)
+            self._remember(final_state)
+            return final_state
+    
+    async def arun_many(self, user_inputs: List[UserInput]) -> List[Dict[str, Any]]:
+        """
+        Асинхронно строит планы для нескольких пользователей.
+        
+        Args:
+            user_inputs: Список входных данных
+            
+        Returns:
+            List: Финальные состояния в порядке входных данных
+        """
+        return await asyncio.gather(*(self.arun(user_input) for user_input in user_inputs))
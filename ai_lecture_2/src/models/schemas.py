@@ -1,7 +1,7 @@
 """
 Pydantic модели для данных системы.
 """
-from typing import Literal, Optional, Dict, List, TypedDict
+from typing import Annotated, Literal, Optional, Dict, List, TypedDict
 from pydantic import BaseModel, Field
 
 
@@ -63,11 +63,90 @@ class WeeklyMealPlan(BaseModel):
     summary: str = Field(description="Общее резюме плана")
 
 
+# Схемы ответа модели при LOCAL_NUTRIENTS: модель не пишет числа, они считаются по таблице продуктов.
+# После расчета ответ приводится к DailyPlan/WeeklyMealPlan, где числа обязательны.
+class LocalDayMeal(DayMeal):
+    """Прием пищи без обязательных чисел."""
+    calories: float = Field(default=0.0, description="Калорийность")
+    protein_g: float = Field(default=0.0, description="Белки в граммах")
+    carbs_g: float = Field(default=0.0, description="Углеводы в граммах")
+    fats_g: float = Field(default=0.0, description="Жиры в граммах")
+
+
+class LocalDailyPlan(DailyPlan):
+    """План на день без обязательных итогов."""
+    meals: List[LocalDayMeal] = Field(description="Приемы пищи")
+    total_calories: float = Field(default=0.0, description="Общая калорийность")
+    total_protein_g: float = Field(default=0.0, description="Общее количество белков")
+    total_carbs_g: float = Field(default=0.0, description="Общее количество углеводов")
+    total_fats_g: float = Field(default=0.0, description="Общее количество жиров")
+
+
+class LocalWeeklyMealPlan(WeeklyMealPlan):
+    """Недельный план без обязательных чисел."""
+    week_plan: List[LocalDailyPlan] = Field(description="План на неделю")
+
+
+class PlanViolation(BaseModel):
+    """Нарушение требований к плану, найденное локальной проверкой."""
+    day: Optional[str] = Field(default=None, description="День недели (None - план целиком)")
+    kind: Literal["days", "totals_mismatch", "calories", "protein", "fats", "carbs", "restricted_food"] = Field(
+        description="Вид нарушения"
+    )
+    expected: Optional[float] = Field(default=None, description="Ожидаемое значение")
+    actual: Optional[float] = Field(default=None, description="Фактическое значение")
+    message: str = Field(description="Описание нарушения")
+
+
+class PlanValidationReport(BaseModel):
+    """Результат локальной проверки плана."""
+    valid: bool = Field(description="План прошел все проверки")
+    violations: List[PlanViolation] = Field(default_factory=list, description="Найденные нарушения")
+
+
+def keep_first_error(left: Optional[str], right: Optional[str]) -> Optional[str]:
+    """
+    Объединяет ошибки параллельных узлов графа: сохраняется первая.
+    
+    Args:
+        left: Текущее значение
+        right: Новое значение
+        
+    Returns:
+        Optional[str]: Первая непустая ошибка
+    """
+    return left or right
+
+
+def merge_timings(
+    left: Optional[Dict[str, float]],
+    right: Optional[Dict[str, float]]
+) -> Dict[str, float]:
+    """
+    Объединяет замеры времени, которые узлы графа пишут параллельно.
+    
+    Args:
+        left: Текущие замеры
+        right: Новые замеры
+        
+    Returns:
+        Dict: Объединенные замеры
+    """
+    return {**(left or {}), **(right or {})}
+
+
 class GraphState(TypedDict, total=False):
     """Состояние графа LangGraph."""
+    # Идентификатор запуска для метрик и трассировки
+    run_id: str
     user_input: UserInput
     nutrition_analysis: NutritionAnalysis
     preferences_analysis: PreferencesAnalysis
     final_plan: WeeklyMealPlan
-    error: str
+    validation: PlanValidationReport
+    # run_id запуска, план которого отдан повторно (см. src/utils/plan_reuse.py)
+    reused_from: Optional[str]
+    # Анализы выполняются параллельно, поэтому общие поля объединяются редьюсерами
+    error: Annotated[Optional[str], keep_first_error]
+    timings: Annotated[Dict[str, float], merge_timings]
 
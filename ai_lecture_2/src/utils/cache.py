@@ -0,0 +1,166 @@
+"""
+Кэш с ограниченным LRU в памяти и постоянным хранилищем на диске.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+_WHITESPACE = re.compile(r"\s+")
+_SEPARATORS = re.compile(r"[,;]")
+
+
+def normalize_preferences(preferences: str) -> str:
+    """
+    Приводит текст предпочтений к канонической форме.
+    
+    Регистр, лишние пробелы и порядок перечисленных через запятую
+    пунктов не влияют на результат: "Веган,  без глютена" и
+    "без глютена, веган" дают одну и ту же строку.
+    
+    Args:
+        preferences: Пищевые предпочтения в свободной форме
+        
+    Returns:
+        str: Нормализованная строка
+    """
+    text = preferences.lower().replace("ё", "е")
+    tokens = {
+        _WHITESPACE.sub(" ", token).strip(" .")
+        for token in _SEPARATORS.split(text)
+    }
+    return ", ".join(sorted(token for token in tokens if token))
+
+
+class PersistentLRUCache:
+    """
+    Кэш строковых значений: LRU в памяти поверх таблицы SQLite.
+    
+    Запись попадает в оба уровня, поэтому переживает перезапуск процесса.
+    Безопасен для использования из нескольких потоков.
+    """
+    
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_size: int = 256,
+        ttl: Optional[float] = None
+    ):
+        """
+        Инициализация кэша.
+        
+        Args:
+            path: Путь к файлу SQLite; None - только память
+            max_size: Максимальное число записей в памяти
+            ttl: Время жизни записи в секундах; None - без ограничения
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+    
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+    
+    def _remember(self, key: str, value: str, created_at: float) -> None:
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Возвращает значение по ключу.
+        
+        Args:
+            key: Ключ записи
+            
+        Returns:
+            Optional[str]: Значение или None, если записи нет или она устарела
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+            
+            if entry is None or self._expired(entry[1]):
+                if entry is not None:
+                    self._delete(key)
+                self.misses += 1
+                return None
+            
+            self._remember(key, entry[0], entry[1])
+            self.hits += 1
+            return entry[0]
+    
+    def set(self, key: str, value: str) -> None:
+        """
+        Сохраняет значение в память и на диск.
+        
+        Args:
+            key: Ключ записи
+            value: Значение
+        """
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, value, created_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, value, created_at)
+                )
+                self._db.commit()
+    
+    def _delete(self, key: str) -> None:
+        self._memory.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._db.commit()
+    
+    def clear(self) -> None:
+        """Удаляет все записи и сбрасывает счетчики."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> Dict[str, float]:
+        """
+        Возвращает счетчики попаданий и промахов.
+        
+        Returns:
+            Dict: hits, misses, hit_rate и число записей в памяти
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_size": len(self._memory)
+            }
@@ -0,0 +1,225 @@
+"""
+Постоянные чекпоинты запусков workflow в SQLite.
+
+После каждого успешного узла его результат сохраняется под run_id запуска.
+Если create_plan упал или процесс был остановлен, MealPlannerWorkflow.resume
+восстанавливает состояние из чекпоинтов и повторяет только узлы без
+результата: анализы питания и предпочтений не оплачиваются повторно.
+Чекпоинты старше ttl удаляются при открытии хранилища и методом gc.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from src.models.schemas import (
+    NutritionAnalysis,
+    PlanValidationReport,
+    PreferencesAnalysis,
+    UserInput,
+    WeeklyMealPlan
+)
+
+
+# Поля состояния графа, которые сохраняются в чекпоинтах
+STATE_MODELS = {
+    "nutrition_analysis": NutritionAnalysis,
+    "preferences_analysis": PreferencesAnalysis,
+    "final_plan": WeeklyMealPlan,
+    "validation": PlanValidationReport,
+}
+RUNNING = "running"
+
+
+class CheckpointStore:
+    """
+    Результаты узлов по run_id в таблице SQLite.
+    
+    Безопасен для использования из нескольких потоков (параллельные узлы
+    графа сохраняются независимо).
+    """
+    
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None):
+        """
+        Инициализация хранилища.
+        
+        Args:
+            path: Путь к файлу SQLite; None - только память
+            ttl: Сколько секунд хранить запуск после последнего изменения;
+                None - без ограничения
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "run_id TEXT PRIMARY KEY, user_input TEXT NOT NULL, status TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "run_id TEXT NOT NULL, node TEXT NOT NULL, state TEXT NOT NULL, duration REAL NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (run_id, node))"
+        )
+        self._db.commit()
+        self.gc()
+    
+    def start(self, run_id: str, user_input: UserInput) -> None:
+        """
+        Регистрирует запуск.
+        
+        Чекпоинты прошлого запуска с тем же run_id сохраняются, если входные
+        данные не изменились (продолжение), и удаляются иначе.
+        
+        Args:
+            run_id: Идентификатор запуска
+            user_input: Входные данные пользователя
+        """
+        user_json = user_input.model_dump_json()
+        with self._lock:
+            row = self._db.execute("SELECT user_input FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is not None and row[0] != user_json:
+                self._db.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO runs (run_id, user_input, status, updated_at) VALUES (?, ?, ?, ?)",
+                (run_id, user_json, RUNNING, time.time())
+            )
+            self._db.commit()
+    
+    def save(self, run_id: str, node: str, values: Dict[str, Any], duration: float = 0.0) -> None:
+        """
+        Сохраняет результат узла.
+        
+        Args:
+            run_id: Идентификатор запуска
+            node: Имя узла графа
+            values: Поля состояния, которые вернул узел (сохраняются поля STATE_MODELS)
+            duration: Длительность узла в секундах
+        """
+        state = {
+            field: value.model_dump(mode="json")
+            for field, value in values.items()
+            if field in STATE_MODELS and isinstance(value, BaseModel)
+        }
+        if not state:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints (run_id, node, state, duration, created_at) VALUES (?, ?, ?, ?, ?)",
+                (run_id, node, json.dumps(state, ensure_ascii=False), duration, now)
+            )
+            self._db.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (now, run_id))
+            self._db.commit()
+    
+    def finish(self, run_id: str, status: str) -> None:
+        """
+        Отмечает исход запуска.
+        
+        Args:
+            run_id: Идентификатор запуска
+            status: "ok" или "error"
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?",
+                (status, time.time(), run_id)
+            )
+            self._db.commit()
+    
+    def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Восстанавливает состояние запуска из чекпоинтов.
+        
+        Args:
+            run_id: Идентификатор запуска
+            
+        Returns:
+            Optional[Dict]: Состояние графа с результатами сохраненных узлов
+            и их длительностями в timings или None, если запуска нет
+        """
+        with self._lock:
+            row = self._db.execute("SELECT user_input FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            checkpoints = self._db.execute(
+                "SELECT node, state, duration FROM checkpoints WHERE run_id = ? ORDER BY created_at",
+                (run_id,)
+            ).fetchall()
+        
+        state: Dict[str, Any] = {
+            "run_id": run_id,
+            "user_input": UserInput.model_validate_json(row[0]),
+            "error": None,
+            "timings": {}
+        }
+        for node, values, duration in checkpoints:
+            for field, value in json.loads(values).items():
+                state[field] = STATE_MODELS[field].model_validate(value)
+            state["timings"][node] = duration
+        return state
+    
+    def status(self, run_id: str) -> Optional[str]:
+        """Исход запуска: "running", "ok", "error" или None, если запуска нет."""
+        with self._lock:
+            row = self._db.execute("SELECT status FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return row[0] if row else None
+    
+    def pending(self) -> List[str]:
+        """
+        Запуски, которые можно продолжить.
+        
+        Returns:
+            List: run_id незавершенных и упавших запусков, сначала новые
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT run_id FROM runs WHERE status != 'ok' ORDER BY updated_at DESC"
+            ).fetchall()
+        return [row[0] for row in rows]
+    
+    def delete(self, run_id: str) -> None:
+        """Удаляет запуск и его чекпоинты."""
+        with self._lock:
+            self._db.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+            self._db.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+            self._db.commit()
+    
+    def gc(self, max_age: Optional[float] = None) -> int:
+        """
+        Удаляет запуски, которые не менялись дольше max_age.
+        
+        Args:
+            max_age: Возраст в секундах; по умолчанию ttl хранилища
+            
+        Returns:
+            int: Число удаленных запусков
+        """
+        max_age = self.ttl if max_age is None else max_age
+        if max_age is None:
+            return 0
+        cutoff = time.time() - max_age
+        with self._lock:
+            removed = self._db.execute("DELETE FROM runs WHERE updated_at < ?", (cutoff,)).rowcount
+            self._db.execute("DELETE FROM checkpoints WHERE run_id NOT IN (SELECT run_id FROM runs)")
+            self._db.commit()
+        return removed
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Возвращает число запусков по исходам.
+        
+        Returns:
+            Dict: Число запусков с каждым статусом и общее число чекпоинтов
+        """
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM runs GROUP BY status").fetchall())
+            counts["checkpoints"] = self._db.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        return counts
@@ -1,23 +1,189 @@
 """
 Конфигурация приложения.
+
+Настройки читаются из переменных окружения (и файла .env) при первом
+обращении к get_settings(), а не при импорте модуля. Поэтому импорт схем
+и утилит не требует API ключа и не тянет за собой LLM стек.
 """
 import os
-from dotenv import load_dotenv
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+
+# Значения по умолчанию
+DEFAULT_MODEL_NAME = "gemini-flash-latest"
+DEFAULT_TEMPERATURE = 0.7
+
 
-# Загружаем переменные окружения
-load_dotenv()
+@dataclass(frozen=True)
+class AgentSettings:
+    """Параметры модели для конкретного агента."""
+    model: str
+    temperature: float
 
-# API ключи
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-# Настройки модели
-MODEL_NAME = "gemini-flash-latest"
-TEMPERATURE = 0.7
+@dataclass(frozen=True)
+class Settings:
+    """Настройки приложения."""
+    # API ключи
+    google_api_key: Optional[str]
+    
+    # Настройки модели
+    model_name: str = DEFAULT_MODEL_NAME
+    temperature: float = DEFAULT_TEMPERATURE
+    
+    # Режим NutritionAgent: "hybrid" (LLM пишет только рекомендации) или "fast" (без LLM)
+    nutrition_mode: str = "hybrid"
+    
+    # Режим FinalAgent: "weekly" (вся неделя одним запросом) или "per_day" (дни параллельно)
+    final_agent_mode: str = "weekly"
+    day_retries: int = 2
+    # Сколько фрагментов ответа (дней плана) можно перезапросить, если локальное исправление не помогло
+    repair_budget: int = 3
+    
+    # Нативный структурированный вывод модели вместо инструкций формата и парсинга текста
+    structured_output: bool = False
+    
+    # Калорийность и БЖУ приемов пищи считаются по таблице продуктов, модель пишет только граммовки
+    local_nutrients: bool = False
+    
+    # Максимум одновременных запусков MealPlannerWorkflow.arun в одном процессе
+    max_concurrency: int = 16
+    
+    # Повторы узлов графа при временных ошибках модели (всего попыток и первая задержка, с)
+    node_attempts: int = 3
+    retry_delay: float = 1.0
+    
+    # Кэш анализа предпочтений (пустой путь - только в памяти)
+    preferences_cache_path: str = ".cache/preferences.sqlite"
+    preferences_cache_size: int = 256
+    preferences_cache_ttl: float = 7 * 24 * 3600
+    
+    # Бэкенд LLM: "gemini" или "replay" (записанные ответы, без сети)
+    llm_backend: str = "gemini"
+    replay_plan_path: str = "meal_plan.json"
+    replay_latency: float = 0.0
+    # Квоты бэкенда throttled (имитация 429 провайдера)
+    throttle_rpm: int = 60
+    throttle_concurrency: int = 0
+    
+    # Планировщик запросов к модели: квоты в минуту (0 - без ограничения) и адаптивный лимит параллельных запросов
+    llm_rpm: float = 0
+    llm_tpm: float = 0
+    llm_max_concurrency: int = 32
+    llm_min_concurrency: int = 1
+    llm_latency_target: float = 0
+    
+    # Кэш ответов модели по хэшу промпта
+    llm_cache: bool = False
+    llm_cache_path: str = ".cache/llm_responses.sqlite"
+    llm_cache_size: int = 1024
+    
+    # Готовые планы похожих профилей отдаются без обращения к модели (пустой путь - только в памяти)
+    plan_reuse: bool = False
+    plan_reuse_path: str = ".cache/plan_reuse"
+    plan_reuse_distance: float = 5.0
+    
+    # Чекпоинты узлов для продолжения упавших запусков (пустой путь - только в памяти)
+    checkpoints: bool = False
+    checkpoint_path: str = ".cache/checkpoints.sqlite"
+    checkpoint_ttl: float = 7 * 24 * 3600
+    
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """
+        Читает настройки из переменных окружения.
+        
+        Returns:
+            Settings: Настройки приложения
+        """
+        return cls(
+            google_api_key=os.getenv("GOOGLE_API_KEY"),
+            model_name=os.getenv("MODEL_NAME", DEFAULT_MODEL_NAME),
+            temperature=float(os.getenv("TEMPERATURE", str(DEFAULT_TEMPERATURE))),
+            nutrition_mode=os.getenv("NUTRITION_MODE", "hybrid"),
+            final_agent_mode=os.getenv("FINAL_AGENT_MODE", "weekly"),
+            day_retries=int(os.getenv("DAY_RETRIES", "2")),
+            repair_budget=int(os.getenv("REPAIR_BUDGET", "3")),
+            structured_output=os.getenv("STRUCTURED_OUTPUT", "0").lower() in ("1", "true", "yes"),
+            local_nutrients=os.getenv("LOCAL_NUTRIENTS", "0").lower() in ("1", "true", "yes"),
+            max_concurrency=int(os.getenv("MAX_CONCURRENCY", "16")),
+            node_attempts=int(os.getenv("NODE_ATTEMPTS", "3")),
+            retry_delay=float(os.getenv("RETRY_DELAY", "1")),
+            preferences_cache_path=os.getenv("PREFERENCES_CACHE_PATH", ".cache/preferences.sqlite"),
+            preferences_cache_size=int(os.getenv("PREFERENCES_CACHE_SIZE", "256")),
+            preferences_cache_ttl=float(os.getenv("PREFERENCES_CACHE_TTL", str(7 * 24 * 3600))),
+            llm_backend=os.getenv("LLM_BACKEND", "gemini"),
+            replay_plan_path=os.getenv("REPLAY_PLAN_PATH", "meal_plan.json"),
+            replay_latency=float(os.getenv("REPLAY_LATENCY", "0")),
+            throttle_rpm=int(os.getenv("THROTTLE_RPM", "60")),
+            throttle_concurrency=int(os.getenv("THROTTLE_CONCURRENCY", "0")),
+            llm_rpm=float(os.getenv("LLM_RPM", "0")),
+            llm_tpm=float(os.getenv("LLM_TPM", "0")),
+            llm_max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+            llm_min_concurrency=int(os.getenv("LLM_MIN_CONCURRENCY", "1")),
+            llm_latency_target=float(os.getenv("LLM_LATENCY_TARGET", "0")),
+            llm_cache=os.getenv("LLM_CACHE", "0").lower() in ("1", "true", "yes"),
+            llm_cache_path=os.getenv("LLM_CACHE_PATH", ".cache/llm_responses.sqlite"),
+            llm_cache_size=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+            plan_reuse=os.getenv("PLAN_REUSE", "0").lower() in ("1", "true", "yes"),
+            plan_reuse_path=os.getenv("PLAN_REUSE_PATH", ".cache/plan_reuse"),
+            plan_reuse_distance=float(os.getenv("PLAN_REUSE_DISTANCE", "5")),
+            checkpoints=os.getenv("CHECKPOINTS", "0").lower() in ("1", "true", "yes"),
+            checkpoint_path=os.getenv("CHECKPOINT_PATH", ".cache/checkpoints.sqlite"),
+            checkpoint_ttl=float(os.getenv("CHECKPOINT_TTL", str(7 * 24 * 3600)))
+        )
+    
+    def agent(self, name: str) -> AgentSettings:
+        """
+        Возвращает модель и температуру для агента.
+        
+        Переменные <NAME>_MODEL и <NAME>_TEMPERATURE (например,
+        FINAL_MODEL=gemini-pro-latest) переопределяют общие настройки.
+        
+        Args:
+            name: Имя агента: nutrition, preferences или final
+            
+        Returns:
+            AgentSettings: Параметры модели агента
+        """
+        prefix = name.upper()
+        temperature = os.getenv(f"{prefix}_TEMPERATURE")
+        return AgentSettings(
+            model=os.getenv(f"{prefix}_MODEL", self.model_name),
+            temperature=float(temperature) if temperature is not None else self.temperature
+        )
+    
+    def require_google_api_key(self) -> str:
+        """
+        Возвращает API ключ или сообщает, что его нет.
+        
+        Returns:
+            str: GOOGLE_API_KEY
+            
+        Raises:
+            ValueError: Если ключ не задан
+        """
+        # Проверка наличия API ключа
+        if not self.google_api_key:
+            raise ValueError(
+                "GOOGLE_API_KEY не найден в переменных окружения. "
+                "Пожалуйста, создайте файл .env и добавьте GOOGLE_API_KEY=ваш_ключ"
+            )
+        return self.google_api_key
 
-# Проверка наличия API ключа
-if not GOOGLE_API_KEY:
-    raise ValueError(
-        "GOOGLE_API_KEY не найден в переменных окружения. "
-        "Пожалуйста, создайте файл .env и добавьте GOOGLE_API_KEY=ваш_ключ"
-    )
 
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """
+    Загружает настройки один раз за процесс.
+    
+    Returns:
+        Settings: Настройки приложения
+    """
+    from dotenv import load_dotenv
+    
+    # Загружаем переменные окружения
+    load_dotenv()
+    return Settings.from_env()
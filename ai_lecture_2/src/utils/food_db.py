@@ -0,0 +1,377 @@
+"""
+Локальная база пищевой ценности продуктов.
+
+Таблица src/data/foods.csv (калории и БЖУ на 100 г) загружается в массивы
+numpy, а названия и синонимы на русском и английском - в индекс по основам
+слов. Разбор строк вида «Овсянка (60г)» или «2 яйца» позволяет считать
+калорийность и макронутриенты приемов пищи без модели.
+"""
+import csv
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.models.schemas import DailyPlan, DayMeal, WeeklyMealPlan
+from src.utils.validation import MEAL_FIELDS, recompute_day_totals
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+FOODS_PATH = Path(__file__).resolve().parent.parent / "data" / "foods.csv"
+
+# Слова сравниваются по первым буквам, чтобы «грудка» и «грудки» совпадали
+STEM_LENGTH = 5
+PARSE_CACHE_SIZE = 4096
+
+# Базовые единицы: масса, объем и штуки (порции)
+GRAMS = "г"
+MILLILITERS = "мл"
+PIECES = "шт"
+
+# Единица измерения -> (базовая единица, множитель)
+UNITS = {
+    "кг": (GRAMS, 1000.0), "kg": (GRAMS, 1000.0),
+    "г": (GRAMS, 1.0), "гр": (GRAMS, 1.0), "грамм": (GRAMS, 1.0),
+    "g": (GRAMS, 1.0), "gr": (GRAMS, 1.0), "gram": (GRAMS, 1.0),
+    "мл": (MILLILITERS, 1.0), "ml": (MILLILITERS, 1.0), "л": (MILLILITERS, 1000.0), "l": (MILLILITERS, 1000.0),
+    "ст.л": (MILLILITERS, 15.0), "tbsp": (MILLILITERS, 15.0),
+    "ч.л": (MILLILITERS, 5.0), "tsp": (MILLILITERS, 5.0),
+    "стакан": (MILLILITERS, 200.0), "cup": (MILLILITERS, 200.0),
+}
+
+_NUMBER = r"(?<![\d.,])(?P<number>\d+(?:[.,]\d+)?(?:/\d+)?|½|¼)(?!\d)(?:-?(?:х|ти|ми))?"
+_UNIT = (
+    r"(?P<unit>кг|г(?:рамм\w*|р)?|мл|л|ст\.?\s?л\.?|ч\.?\s?л\.?|стакан\w*|шт\.?|штук\w*"
+    r"|ломтик\w*|кусоч?к\w*|порци\w*|kg|grams?|gr|g|ml|l|tbsp|tsp|cups?|pcs|pieces?|slices?|servings?)"
+    r"(?![а-яёa-z])"
+)
+# Количество с необязательной единицей: группы number и unit (см. parse_number, parse_unit)
+QUANTITY = re.compile(_NUMBER + r"(?![.,]?\d*\s*%)(?:\s*" + _UNIT + r")?", re.IGNORECASE)
+_ALTERNATIVES = re.compile(r"\s+(?:или|or)\s+", re.IGNORECASE)
+_COMPONENTS = re.compile(r"\s+(?:и|and)\s+|\s*\+\s*", re.IGNORECASE)
+# «Салат из огурцов», «Омлет из 2 яиц»: продукт - то, из чего приготовлено блюдо
+_MADE_OF = re.compile(r"\s+(?:из|of)\s+", re.IGNORECASE)
+_TOKEN = re.compile(r"\d+(?:[.,]\d+)?%|[a-zа-я]+")
+_PERCENT_SPACE = re.compile(r"\s+%")
+# Формы «сухой» сводятся к одной основе: «Рис (70г сухого веса)» находит «Рис сухой»
+_STEM_FORMS = {"сухог": "сухой", "сухая": "сухой", "сухое": "сухой", "сухие": "сухой", "сухих": "сухой", "сухом": "сухой"}
+
+
+def _stems(text: str) -> Tuple[str, ...]:
+    """Основы слов названия (проценты жирности сохраняются как отдельное слово)."""
+    text = _PERCENT_SPACE.sub("%", text.lower().replace("ё", "е"))
+    stems = (token[:STEM_LENGTH] for token in _TOKEN.findall(text))
+    return tuple(_STEM_FORMS.get(stem, stem) for stem in stems)
+
+
+def _key(stems: Sequence[str]) -> Tuple[str, ...]:
+    """Ключ индекса: порядок слов не важен («Орехи грецкие» и «Грецкие орехи»)."""
+    return tuple(sorted(stems))
+
+
+def parse_number(text: str) -> float:
+    """Число из группы number шаблона QUANTITY: «1,5», «1/2», «½»."""
+    if text == "½":
+        return 0.5
+    if text == "¼":
+        return 0.25
+    if "/" in text:
+        numerator, denominator = text.split("/")
+        return float(numerator) / float(denominator) if float(denominator) else 0.0
+    return float(text.replace(",", "."))
+
+
+def parse_unit(unit: Optional[str]) -> Tuple[str, float]:
+    """Базовая единица и множитель; без единицы и для штук, ломтиков, порций - штуки."""
+    if not unit:
+        return PIECES, 1.0
+    key = re.sub(r"\s", "", unit.lower()).rstrip(".")
+    for prefix in ("грамм", "стакан", "gram", "cup"):
+        if key.startswith(prefix):
+            key = prefix
+    return UNITS.get(key, (PIECES, 1.0))
+
+
+def parse_quantity(text: str) -> Tuple[Optional[float], Optional[str], str]:
+    """
+    Извлекает количество из строки продукта.
+    
+    Args:
+        text: Строка продукта, например «Куриная грудка (150г)» или «2 яйца»
+        
+    Returns:
+        Tuple: (количество в базовой единице или None, если не указано;
+            базовая единица: г, мл или шт (None, если количества нет);
+            строка без количества)
+    """
+    match = QUANTITY.search(text)
+    if match is None:
+        return None, None, text
+    unit, factor = parse_unit(match.group("unit"))
+    rest = text[:match.start()] + " " + text[match.end():]
+    return parse_number(match.group("number")) * factor, unit, rest
+
+
+@dataclass(frozen=True)
+class FoodPortion:
+    """Продукт из строки плана, его количество и вес."""
+    text: str
+    food: Optional[str]
+    grams: float
+    row: Optional[int]
+    amount: Optional[float] = None
+    unit: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class MealNutrients:
+    """Калорийность и макронутриенты, посчитанные по таблице продуктов."""
+    calories: float
+    protein_g: float
+    fats_g: float
+    carbs_g: float
+    unresolved: Tuple[str, ...] = ()
+
+
+class FoodDatabase:
+    """
+    Таблица пищевой ценности продуктов с индексом названий.
+    
+    Значения хранятся в одном массиве [продукт, 4] (калории, белки, жиры,
+    углеводы на 100 г в порядке MEAL_FIELDS), вес порции - в отдельном
+    массиве. Индекс сопоставляет основы слов названий и синонимов (без учета
+    порядка слов) номеру строки; при совпадении синонимов у разных продуктов
+    побеждает первый. Крупы, макароны и бобовые без уточнения считаются
+    отварными, сухой вес задается строками «... сухой».
+    """
+    
+    def __init__(
+        self,
+        names: Sequence[str],
+        aliases: Sequence[Sequence[str]],
+        values: "np.ndarray",
+        portions: "np.ndarray"
+    ):
+        """
+        Инициализация базы.
+        
+        Args:
+            names: Названия продуктов
+            aliases: Синонимы для каждого продукта
+            values: Калории и БЖУ на 100 г, массив [продукт, 4]
+            portions: Вес одной штуки или стандартной порции, г
+        """
+        self.names = list(names)
+        self.values = values
+        self.portions = portions
+        self._index: Dict[Tuple[str, ...], int] = {}
+        for row, (name, synonyms) in enumerate(zip(self.names, aliases)):
+            for alias in (name, *synonyms):
+                stems = _stems(alias)
+                if stems:
+                    self._index.setdefault(_key(stems), row)
+        self._max_alias = max((len(stems) for stems in self._index), default=0)
+        # Строки продуктов в планах часто повторяются
+        self.parse = lru_cache(maxsize=PARSE_CACHE_SIZE)(self._parse)
+    
+    @classmethod
+    def from_csv(cls, path: Path = FOODS_PATH) -> "FoodDatabase":
+        """
+        Загружает таблицу продуктов.
+        
+        Args:
+            path: CSV с колонками name, aliases (через |), calories,
+                protein_g, fats_g, carbs_g, portion_g
+                
+        Returns:
+            FoodDatabase: База продуктов
+        """
+        import numpy as np
+        
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        return cls(
+            names=[row["name"] for row in rows],
+            aliases=[[alias for alias in row["aliases"].split("|") if alias] for row in rows],
+            values=np.array([[float(row[field]) for field in MEAL_FIELDS] for row in rows], dtype=np.float32),
+            portions=np.array([float(row["portion_g"]) for row in rows], dtype=np.float32)
+        )
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def lookup(self, name: str) -> Optional[int]:
+        """
+        Находит продукт по названию.
+        
+        Ищется самый длинный синоним, входящий в название целиком, а среди
+        равных по длине - самый левый: «Филе индейки запеченное» найдет
+        «филе индейки», а не «индейка». В названии вида «Салат из огурцов»
+        сначала ищется то, из чего приготовлено блюдо.
+        
+        Args:
+            name: Название продукта на русском или английском
+            
+        Returns:
+            Optional[int]: Номер строки в таблице или None
+        """
+        parts = _MADE_OF.split(name, maxsplit=1)
+        if len(parts) == 2:
+            row = self._lookup_stems(_stems(parts[1]))
+            if row is not None:
+                return row
+        return self._lookup_stems(_stems(name))
+    
+    def _lookup_stems(self, stems: Tuple[str, ...]) -> Optional[int]:
+        for length in range(min(self._max_alias, len(stems)), 0, -1):
+            for start in range(len(stems) - length + 1):
+                row = self._index.get(_key(stems[start:start + length]))
+                if row is not None:
+                    return row
+        return None
+    
+    def _portion(self, text: str, amount: Optional[float], unit: Optional[str], rest: str) -> FoodPortion:
+        row = self.lookup(rest)
+        if row is None:
+            return FoodPortion(text=text, food=None, grams=0.0, row=None, amount=amount, unit=unit)
+        if unit is None or unit == PIECES:
+            # Без количества - одна штука или стандартная порция; мл считаются как граммы
+            grams = (amount if amount is not None else 1.0) * float(self.portions[row])
+        else:
+            grams = amount
+        return FoodPortion(text=text, food=self.names[row], grams=grams, row=row, amount=amount, unit=unit)
+    
+    def _parse(self, text: str) -> Tuple[FoodPortion, ...]:
+        """
+        Разбирает строку продукта на продукты таблицы с весом.
+        
+        Из вариантов через «или» берется первый найденный в таблице; вариант
+        без количества получает количество последнего варианта («Батончик
+        или порция протеина (30г)»). Части через «и» складываются; вес,
+        указанный только у последней части, относится ко всему блюду и
+        делится поровну («Салат из огурцов и помидоров (200г)»).
+        
+        Args:
+            text: Строка продукта из плана
+            
+        Returns:
+            Tuple: Продукты; row = None у нераспознанных
+        """
+        alternatives = _ALTERNATIVES.split(text)
+        shared = parse_quantity(alternatives[-1])[:2] if len(alternatives) > 1 else (None, None)
+        portions: Tuple[FoodPortion, ...] = ()
+        for alternative in alternatives:
+            portions = ()
+            components = _COMPONENTS.split(alternative)
+            quantities = [parse_quantity(component) for component in components]
+            last_amount, last_unit = quantities[-1][:2]
+            if (
+                len(quantities) > 1
+                and last_unit in (GRAMS, MILLILITERS)
+                and all(amount is None for amount, _, _ in quantities[:-1])
+            ):
+                quantities = [(last_amount / len(quantities), last_unit, rest) for _, _, rest in quantities]
+            for component, (amount, unit, rest) in zip(components, quantities):
+                if amount is None:
+                    amount, unit = shared
+                portions += (self._portion(component, amount, unit, rest),)
+            if all(portion.row is not None for portion in portions):
+                return portions
+        return portions
+    
+    def _totals(self, meals: Sequence[Sequence[str]]) -> Tuple["np.ndarray", List[List[str]]]:
+        """
+        Считает калории и БЖУ для нескольких приемов пищи одной операцией.
+        
+        Returns:
+            Tuple: (массив [прием пищи, 4], нераспознанные строки по приемам пищи)
+        """
+        import numpy as np
+        
+        rows: List[int] = []
+        grams: List[float] = []
+        owners: List[int] = []
+        unresolved: List[List[str]] = [[] for _ in meals]
+        for index, foods in enumerate(meals):
+            for text in foods:
+                for portion in self.parse(text):
+                    if portion.row is None:
+                        unresolved[index].append(portion.text)
+                        continue
+                    rows.append(portion.row)
+                    grams.append(portion.grams)
+                    owners.append(index)
+        
+        totals = np.zeros((len(meals), len(MEAL_FIELDS)))
+        if rows:
+            contributions = self.values[rows] * (np.asarray(grams)[:, None] / 100.0)
+            np.add.at(totals, np.asarray(owners), contributions)
+        return totals, unresolved
+    
+    def meal_nutrients(self, foods: Sequence[str]) -> MealNutrients:
+        """
+        Считает калорийность и макронутриенты приема пищи.
+        
+        Args:
+            foods: Строки продуктов с количеством
+            
+        Returns:
+            MealNutrients: Результат расчета и нераспознанные строки
+        """
+        totals, unresolved = self._totals([foods])
+        calories, protein, fats, carbs = (round(value, 1) for value in totals[0].tolist())
+        return MealNutrients(calories, protein, fats, carbs, tuple(unresolved[0]))
+    
+    def fill_days(self, days: Iterable[DailyPlan]) -> List[str]:
+        """
+        Заменяет калорийность и БЖУ приемов пищи расчетом по таблице (на месте).
+        
+        Если часть продуктов приема пищи не распознана, а модель указала
+        свои значения, они остаются; иначе берется сумма распознанных.
+        Итоги дней пересчитываются из приемов пищи.
+        
+        Args:
+            days: Планы на дни
+            
+        Returns:
+            List: Нераспознанные строки продуктов
+        """
+        days = list(days)
+        meals: List[DayMeal] = [meal for day in days for meal in day.meals]
+        totals, unresolved = self._totals([meal.foods for meal in meals])
+        for meal, values, missing in zip(meals, totals.tolist(), unresolved):
+            if missing and meal.calories > 0:
+                continue
+            for field, value in zip(MEAL_FIELDS, values):
+                setattr(meal, field, round(value, 1))
+        for day in days:
+            recompute_day_totals(day)
+        return [text for missing in unresolved for text in missing]
+
+
+@lru_cache(maxsize=None)
+def get_food_db() -> FoodDatabase:
+    """
+    Загружает встроенную таблицу продуктов один раз за процесс.
+    
+    Returns:
+        FoodDatabase: База продуктов
+    """
+    return FoodDatabase.from_csv()
+
+
+def fill_plan_nutrients(plan: WeeklyMealPlan, db: Optional[FoodDatabase] = None) -> List[str]:
+    """
+    Считает калорийность и БЖУ всего плана по таблице продуктов (на месте).
+    
+    Args:
+        plan: Недельный план
+        db: База продуктов; по умолчанию встроенная
+        
+    Returns:
+        List: Нераспознанные строки продуктов
+    """
+    return (db or get_food_db()).fill_days(plan.week_plan)
@@ -0,0 +1,88 @@
+"""
+Инкрементальный разбор JSON ответа модели по мере поступления токенов.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+
+class JsonArrayStreamParser:
+    """
+    Выделяет объекты массива по ключу (например, "week_plan") из потока текста.
+    
+    Текст подается кусками через feed; как только очередной объект массива
+    закрывается, он разбирается и возвращается, не дожидаясь конца ответа.
+    Текст до массива (код-блоки, пояснения модели) пропускается.
+    """
+    
+    def __init__(self, key: str):
+        """
+        Инициализация парсера.
+        
+        Args:
+            key: Ключ JSON объекта, значение которого - массив объектов
+        """
+        self._key_pattern = re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[')
+        self.buffer = ""
+        self.done = False
+        self._pos: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start = 0
+    
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Добавляет кусок текста и возвращает закрывшиеся в нем объекты.
+        
+        Args:
+            chunk: Очередной кусок ответа модели
+            
+        Returns:
+            List: Разобранные объекты массива в порядке следования
+        """
+        search_from = max(0, len(self.buffer) - len(self._key_pattern.pattern))
+        self.buffer += chunk
+        if self.done:
+            return []
+        
+        if self._pos is None:
+            match = self._key_pattern.search(self.buffer, search_from)
+            if match is None:
+                return []
+            self._pos = match.end()
+        
+        items = []
+        buffer = self.buffer
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._item_start = i
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # Закрылся сам массив
+                    self.done = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        items.append(json.loads(buffer[self._item_start:i + 1]))
+                    except json.JSONDecodeError:
+                        # Битый элемент пропускается; ошибку покажет разбор полного ответа
+                        pass
+            i += 1
+        self._pos = i
+        return items
@@ -0,0 +1,129 @@
+"""
+Общий пул LLM клиентов для всех агентов процесса.
+
+Какой клиент создается, определяется настройками:
+- LLM_BACKEND=gemini (по умолчанию) - ChatGoogleGenerativeAI;
+- LLM_BACKEND=replay - ReplayLLM, работает без сети на записанных ответах;
+- LLM_BACKEND=throttled - ReplayLLM за ThrottlingLLM: отвечает 429 сверх
+  THROTTLE_RPM запросов в минуту (проверка планировщика запросов без сети);
+- LLM_CACHE=1 - ответы Gemini кэшируются по хэшу промпта (память + диск),
+  и эти же записи затем использует replay бэкенд.
+
+Бэкенд под кэшем оборачивается в ScheduledLLM: разрешение общего
+планировщика запросов ждут только запросы, которые действительно уходят к
+провайдеру.
+"""
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from src.utils.cache import PersistentLRUCache
+from src.utils.config import Settings, get_settings
+from src.utils.llm_backends import CachedLLM, ReplayLLM, ScheduledLLM, ThrottlingLLM
+
+
+_clients: Dict[Tuple, Any] = {}
+# Реентерабельная: создание клиента внутри блокировки может запросить хранилище ответов
+_lock = threading.RLock()
+_response_store: Optional[PersistentLRUCache] = None
+
+
+def get_response_store() -> PersistentLRUCache:
+    """
+    Возвращает общее хранилище записанных ответов модели.
+    
+    Returns:
+        PersistentLRUCache: Хранилище ответов по хэшу промпта
+    """
+    global _response_store
+    if _response_store is None:
+        with _lock:
+            if _response_store is None:
+                settings = get_settings()
+                _response_store = PersistentLRUCache(
+                    path=settings.llm_cache_path or None,
+                    max_size=settings.llm_cache_size
+                )
+    return _response_store
+
+
+def _create_client(
+    settings: Settings,
+    model: str,
+    temperature: float,
+    options: Dict[str, Any]
+) -> Any:
+    """Создает клиент выбранного в настройках бэкенда."""
+    params = {"model": model, "temperature": temperature, "options": options}
+    
+    if settings.llm_backend in ("replay", "throttled"):
+        client = ReplayLLM.from_plan_file(
+            settings.replay_plan_path,
+            recordings=get_response_store(),
+            params=params,
+            latency_s=settings.replay_latency
+        )
+        if settings.llm_backend == "throttled":
+            client = ThrottlingLLM(
+                client,
+                requests_per_window=settings.throttle_rpm,
+                max_concurrency=settings.throttle_concurrency
+            )
+        return ScheduledLLM(client)
+    
+    if settings.llm_backend != "gemini":
+        raise ValueError(f"Неизвестный LLM_BACKEND: {settings.llm_backend}")
+    
+    # LLM стек импортируется только когда клиент действительно нужен
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    
+    client = ScheduledLLM(ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        google_api_key=settings.require_google_api_key(),
+        **options
+    ))
+    if settings.llm_cache:
+        client = CachedLLM(client, get_response_store(), params)
+    return client
+
+
+def get_llm(model: Optional[str] = None, temperature: Optional[float] = None, **options: Any) -> Any:
+    """
+    Возвращает общий клиент модели для заданных параметров.
+    
+    Клиент создается при первом обращении и дальше переиспользуется всеми
+    агентами и workflow процесса, поэтому соединения (и TLS рукопожатия)
+    не создаются заново для каждого MealPlannerWorkflow. Клиент безопасно
+    использовать из нескольких потоков и асинхронных задач.
+    
+    Args:
+        model: Название модели; по умолчанию из настроек
+        temperature: Температура генерации; по умолчанию из настроек
+        **options: Дополнительные параметры ChatGoogleGenerativeAI
+        
+    Returns:
+        Клиент с методами invoke/ainvoke (ChatGoogleGenerativeAI или бэкенд из llm_backends
+        за ScheduledLLM)
+        
+    Raises:
+        ValueError: Если не задан GOOGLE_API_KEY или неизвестен LLM_BACKEND
+    """
+    settings = get_settings()
+    model = model or settings.model_name
+    temperature = settings.temperature if temperature is None else temperature
+    key = (settings.llm_backend, model, temperature, tuple(sorted(options.items())))
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            # Повторная проверка: другой поток мог создать клиент, пока мы ждали
+            client = _clients.get(key)
+            if client is None:
+                client = _create_client(settings, model, temperature, options)
+                _clients[key] = client
+    return client
+
+
+def clear_llm_clients() -> None:
+    """Удаляет все клиенты из пула (например, после смены API ключа)."""
+    with _lock:
+        _clients.clear()
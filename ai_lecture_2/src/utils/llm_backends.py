@@ -0,0 +1,674 @@
+"""
+Бэкенды LLM: кэш ответов, очередь общего планировщика запросов,
+воспроизведение записанных ответов без сети и локальная имитация квот
+провайдера.
+
+Агенты используют у клиента модели только invoke/ainvoke, stream/astream,
+with_structured_output и поле content ответа, поэтому бэкенды реализуют тот
+же минимальный интерфейс.
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.utils.cache import PersistentLRUCache
+from src.utils.metrics import estimate_tokens
+from src.utils.scheduler import RequestScheduler, current_response_tokens, get_scheduler
+
+
+@dataclass
+class LLMResponse:
+    """Ответ модели в том виде, в котором его читают агенты."""
+    content: str
+
+
+# Размер куска ответа при воспроизведении потока, в символах
+STREAM_CHUNK_SIZE = 64
+
+
+def _chunks(content: str) -> List[str]:
+    return [content[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(content), STREAM_CHUNK_SIZE)] or [""]
+
+
+def _message_parts(messages: Any) -> List[List[str]]:
+    """Приводит сообщения (список BaseMessage или строку) к [[тип, текст], ...]."""
+    if isinstance(messages, str):
+        return [["human", messages]]
+    return [[getattr(m, "type", "human"), str(getattr(m, "content", m))] for m in messages]
+
+
+def token_usage(messages: Any, response: Any) -> Tuple[int, int]:
+    """
+    Число токенов промпта и ответа.
+    
+    Берется из usage_metadata ответа, если провайдер его вернул,
+    иначе оценивается по длине текста.
+    
+    Args:
+        messages: Отправленные сообщения
+        response: Ответ модели (или объект схемы в структурированном режиме)
+        
+    Returns:
+        Tuple: (токены промпта, токены ответа)
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        usage = (getattr(response, "response_metadata", None) or {}).get("usage_metadata")
+    if usage:
+        prompt = usage.get("input_tokens", usage.get("prompt_token_count", 0))
+        completion = usage.get("output_tokens", usage.get("candidates_token_count", 0))
+        return int(prompt), int(completion)
+    prompt_text = "".join(content for _, content in _message_parts(messages))
+    return estimate_tokens(prompt_text), estimate_tokens(str(getattr(response, "content", response)))
+
+
+def prompt_hash(messages: Any, params: Dict[str, Any]) -> str:
+    """
+    Вычисляет ключ ответа по содержимому промпта и параметрам модели.
+    
+    Args:
+        messages: Отформатированные сообщения
+        params: Параметры модели (модель, температура, опции)
+        
+    Returns:
+        str: SHA-256 в шестнадцатеричном виде
+    """
+    payload = json.dumps(
+        {"params": params, "messages": _message_parts(messages)},
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _structured_params(params: Dict[str, Any], schema: type) -> Dict[str, Any]:
+    """Параметры ключа кэша для структурированного ответа: схема входит в ключ."""
+    return {**params, "schema": schema.__name__}
+
+
+class StructuredClient:
+    """Клиент в режиме with_structured_output: invoke/ainvoke возвращают объект схемы."""
+    
+    def __init__(
+        self,
+        schema: type,
+        respond: Callable[[Any], str],
+        arespond: Callable[[Any], Awaitable[str]]
+    ):
+        """
+        Инициализация клиента.
+        
+        Args:
+            schema: Pydantic модель ответа
+            respond: Возвращает JSON ответа для сообщений
+            arespond: Асинхронная версия respond
+        """
+        self.schema = schema
+        self.respond = respond
+        self.arespond = arespond
+    
+    def invoke(self, messages: Any, **kwargs: Any) -> Any:
+        return self.schema.model_validate_json(self.respond(messages))
+    
+    async def ainvoke(self, messages: Any, **kwargs: Any) -> Any:
+        return self.schema.model_validate_json(await self.arespond(messages))
+
+
+class CachedLLM:
+    """
+    Обертка над клиентом модели, кэширующая ответы по хэшу промпта.
+    
+    Одинаковые промпты (повторы в тестах, ретраи в продакшене) не
+    отправляются в модель повторно.
+    """
+    
+    def __init__(self, llm: Any, store: PersistentLRUCache, params: Dict[str, Any]):
+        """
+        Инициализация обертки.
+        
+        Args:
+            llm: Клиент модели
+            store: Хранилище ответов
+            params: Параметры модели, входящие в ключ кэша
+        """
+        self.llm = llm
+        self.store = store
+        self.params = params
+    
+    def invoke(self, messages: Any, **kwargs: Any) -> LLMResponse:
+        """Возвращает ответ из кэша или запрашивает модель и сохраняет ответ."""
+        key = prompt_hash(messages, self.params)
+        cached = self.store.get(key)
+        if cached is not None:
+            return LLMResponse(content=cached)
+        response = self.llm.invoke(messages, **kwargs)
+        self.store.set(key, response.content)
+        return response
+    
+    async def ainvoke(self, messages: Any, **kwargs: Any) -> LLMResponse:
+        """Асинхронная версия invoke."""
+        key = prompt_hash(messages, self.params)
+        cached = self.store.get(key)
+        if cached is not None:
+            return LLMResponse(content=cached)
+        response = await self.llm.ainvoke(messages, **kwargs)
+        self.store.set(key, response.content)
+        return response
+    
+    def with_structured_output(self, schema: type) -> StructuredClient:
+        """Структурированный режим модели с кэшированием JSON ответа."""
+        structured = self.llm.with_structured_output(schema)
+        params = _structured_params(self.params, schema)
+        
+        def dump(result: Any) -> str:
+            if isinstance(result, dict):
+                result = schema.model_validate(result)
+            return result.model_dump_json()
+        
+        def respond(messages: Any) -> str:
+            key = prompt_hash(messages, params)
+            cached = self.store.get(key)
+            if cached is None:
+                cached = dump(structured.invoke(messages))
+                self.store.set(key, cached)
+            return cached
+        
+        async def arespond(messages: Any) -> str:
+            key = prompt_hash(messages, params)
+            cached = self.store.get(key)
+            if cached is None:
+                cached = dump(await structured.ainvoke(messages))
+                self.store.set(key, cached)
+            return cached
+        
+        return StructuredClient(schema, respond, arespond)
+    
+    def stream(self, messages: Any, **kwargs: Any) -> Iterator[LLMResponse]:
+        """
+        Отдает ответ из кэша одним куском или транслирует поток модели и сохраняет ответ.
+        
+        Поток модели открывается сразу при вызове, а не при первом чтении:
+        ScheduledLLM под кэшем берет оценку ответа из контекста вызывающего.
+        """
+        key = prompt_hash(messages, self.params)
+        cached = self.store.get(key)
+        if cached is not None:
+            return iter([LLMResponse(content=cached)])
+        return self._store_stream(key, self.llm.stream(messages, **kwargs))
+    
+    def _store_stream(self, key: str, chunks: Iterable[Any]) -> Iterator[Any]:
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk.content)
+            yield chunk
+        self.store.set(key, "".join(parts))
+    
+    def astream(self, messages: Any, **kwargs: Any) -> AsyncIterator[LLMResponse]:
+        """Асинхронная версия stream."""
+        key = prompt_hash(messages, self.params)
+        cached = self.store.get(key)
+        if cached is not None:
+            return _aiter_one(LLMResponse(content=cached))
+        return self._astore_stream(key, self.llm.astream(messages, **kwargs))
+    
+    async def _astore_stream(self, key: str, chunks: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk.content)
+            yield chunk
+        self.store.set(key, "".join(parts))
+
+
+async def _aiter_one(item: Any) -> AsyncIterator[Any]:
+    yield item
+
+
+# Маркеры очереди, через которую поток ответа провайдера передается потребителю
+_CHUNK, _ERROR, _END = "chunk", "error", "end"
+
+
+class ScheduledLLM:
+    """
+    Клиент провайдера, каждый запрос которого ждет разрешения общего
+    планировщика (src/utils/scheduler.py).
+    
+    Стоит под CachedLLM: ответы из кэша не занимают места в очереди и не
+    расходуют квоту. Поток ответа читается из провайдера независимо от
+    потребителя, поэтому разрешение возвращается сразу после последнего куска
+    (задержка для AIMD - тоже до последнего куска), а не после того, как
+    потребитель обработает ответ.
+    """
+    
+    def __init__(self, llm: Any, scheduler: Optional[RequestScheduler] = None):
+        """
+        Инициализация обертки.
+        
+        Args:
+            llm: Клиент провайдера (или его структурированный режим)
+            scheduler: Планировщик; по умолчанию общий планировщик процесса
+        """
+        self.llm = llm
+        self.scheduler = scheduler
+    
+    def _scheduler(self) -> RequestScheduler:
+        # Общий планировщик берется при каждом запросе: его можно заменить через configure_scheduler
+        return self.scheduler or get_scheduler()
+    
+    @staticmethod
+    def _expected_tokens(messages: Any) -> int:
+        """Оценка токенов запроса до ответа: промпт и ожидаемый ответ из контекста (llm_response_tokens)."""
+        return token_usage(messages, LLMResponse(content=""))[0] + current_response_tokens.get()
+    
+    def invoke(self, messages: Any, **kwargs: Any) -> Any:
+        """Ждет разрешения планировщика и запрашивает модель."""
+        with self._scheduler().slot(self._expected_tokens(messages)) as slot:
+            response = self.llm.invoke(messages, **kwargs)
+            slot.tokens = sum(token_usage(messages, response))
+        return response
+    
+    async def ainvoke(self, messages: Any, **kwargs: Any) -> Any:
+        """Асинхронная версия invoke."""
+        async with self._scheduler().aslot(self._expected_tokens(messages)) as slot:
+            response = await self.llm.ainvoke(messages, **kwargs)
+            slot.tokens = sum(token_usage(messages, response))
+        return response
+    
+    def with_structured_output(self, schema: type) -> "ScheduledLLM":
+        """Структурированный режим модели за тем же планировщиком."""
+        return ScheduledLLM(self.llm.with_structured_output(schema), self.scheduler)
+    
+    def stream(self, messages: Any, **kwargs: Any) -> Iterator[Any]:
+        """
+        Транслирует поток модели, полученный по разрешению планировщика.
+        
+        Поток читается в отдельном потоке выполнения и передается через
+        очередь; если потребитель прекратил чтение, поток модели закрывается.
+        """
+        tokens = self._expected_tokens(messages)
+        context = contextvars.copy_context()
+        chunks: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+        stop = threading.Event()
+        
+        def pump() -> None:
+            try:
+                with self._scheduler().slot(tokens) as slot:
+                    stream = self.llm.stream(messages, **kwargs)
+                    parts = []
+                    for chunk in stream:
+                        if stop.is_set():
+                            getattr(stream, "close", lambda: None)()
+                            break
+                        parts.append(chunk.content)
+                        chunks.put((_CHUNK, chunk))
+                    slot.tokens = sum(token_usage(messages, LLMResponse(content="".join(parts))))
+            except BaseException as error:
+                chunks.put((_ERROR, error))
+                return
+            chunks.put((_END, None))
+        
+        def read() -> Iterator[Any]:
+            threading.Thread(target=context.run, args=(pump,), daemon=True).start()
+            try:
+                while True:
+                    kind, item = chunks.get()
+                    if kind == _END:
+                        return
+                    if kind == _ERROR:
+                        raise item
+                    yield item
+            finally:
+                stop.set()
+        
+        return read()
+    
+    def astream(self, messages: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        """Асинхронная версия stream: поток модели читает отдельная задача."""
+        tokens = self._expected_tokens(messages)
+        
+        async def pump(chunks: "asyncio.Queue[Tuple[str, Any]]") -> None:
+            try:
+                async with self._scheduler().aslot(tokens) as slot:
+                    parts = []
+                    async for chunk in self.llm.astream(messages, **kwargs):
+                        parts.append(chunk.content)
+                        chunks.put_nowait((_CHUNK, chunk))
+                    slot.tokens = sum(token_usage(messages, LLMResponse(content="".join(parts))))
+            except Exception as error:
+                chunks.put_nowait((_ERROR, error))
+                return
+            chunks.put_nowait((_END, None))
+        
+        async def read() -> AsyncIterator[Any]:
+            chunks: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue()
+            task = asyncio.ensure_future(pump(chunks))
+            try:
+                while True:
+                    kind, item = await chunks.get()
+                    if kind == _END:
+                        return
+                    if kind == _ERROR:
+                        raise item
+                    yield item
+            finally:
+                # Потребитель прекратил чтение: запрос к модели больше не нужен
+                task.cancel()
+        
+        return read()
+
+
+_DAY_REQUEST = re.compile(r'на день "([^"]+)"')
+
+# Поля схем, по которым выбирается вид синтетического ответа
+_SCHEMA_MARKERS = ("week_plan", "total_calories", "allowed_foods")
+
+
+class ReplayLLM:
+    """
+    Офлайн бэкенд: отдает записанные ответы вместо обращения к модели.
+    
+    Сначала ищет точный ответ в записях (их наполняет CachedLLM), затем
+    собирает правдоподобный ответ из сохраненного плана (например,
+    meal_plan.json) по тому, какую схему запрашивает промпт.
+    """
+    
+    def __init__(
+        self,
+        plan: Dict[str, Any],
+        recordings: Optional[PersistentLRUCache] = None,
+        params: Optional[Dict[str, Any]] = None,
+        latency_s: float = 0.0
+    ):
+        """
+        Инициализация бэкенда.
+        
+        Args:
+            plan: Записанный недельный план (словарь WeeklyMealPlan)
+            recordings: Записанные ответы по хэшу промпта
+            params: Параметры модели, входящие в ключ записи
+            latency_s: Искусственная задержка ответа в секундах
+        """
+        self.plan = plan
+        self.recordings = recordings
+        self.params = params or {}
+        self.latency_s = latency_s
+    
+    @classmethod
+    def from_plan_file(cls, path: str, **kwargs: Any) -> "ReplayLLM":
+        """
+        Создает бэкенд из JSON файла с недельным планом.
+        
+        Args:
+            path: Путь к файлу плана
+            **kwargs: Остальные параметры конструктора
+            
+        Returns:
+            ReplayLLM: Бэкенд воспроизведения
+            
+        Raises:
+            FileNotFoundError: Если файла плана нет
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"Файл с записанным планом не найден: {path}. "
+                "Сгенерируйте план (python main.py) или укажите REPLAY_PLAN_PATH"
+            )
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+    
+    def _synthesize(self, messages: Any, marker: Optional[str] = None) -> str:
+        """
+        Собирает ответ из плана по запрашиваемой схеме.
+        
+        Args:
+            messages: Сообщения промпта
+            marker: Поле запрашиваемой схемы; по умолчанию ищется в тексте промпта
+                (в инструкциях формата)
+                
+        Returns:
+            str: Текст ответа
+        """
+        text = "\n".join(content for _, content in _message_parts(messages))
+        if marker is None:
+            marker = next((m for m in _SCHEMA_MARKERS if m in text), None)
+        
+        if marker == "week_plan":
+            return json.dumps(self.plan, ensure_ascii=False)
+        
+        if marker == "total_calories":
+            days = self.plan["week_plan"]
+            requested = _DAY_REQUEST.search(text)
+            day_name = requested.group(1) if requested else days[0]["day"]
+            day = next((d for d in days if d["day"] == day_name), days[0])
+            return json.dumps({**day, "day": day_name}, ensure_ascii=False)
+        
+        if marker == "allowed_foods":
+            foods = []
+            for day in self.plan["week_plan"]:
+                for meal in day["meals"]:
+                    for food in meal["foods"]:
+                        name = food.split("(")[0].strip()
+                        if name and name not in foods:
+                            foods.append(name)
+            return json.dumps({
+                "allowed_foods": foods,
+                "restricted_foods": [],
+                "recommendations": self.plan["summary"]
+            }, ensure_ascii=False)
+        
+        # Текстовые ответы (например, рекомендации NutritionAgent)
+        return self.plan["summary"]
+    
+    def _respond(self, messages: Any, schema: Optional[type] = None) -> LLMResponse:
+        params = self.params if schema is None else _structured_params(self.params, schema)
+        if self.recordings is not None:
+            recorded = self.recordings.get(prompt_hash(messages, params))
+            if recorded is not None:
+                return LLMResponse(content=recorded)
+        marker = None
+        if schema is not None:
+            marker = next((m for m in _SCHEMA_MARKERS if m in schema.model_fields), None)
+        return LLMResponse(content=self._synthesize(messages, marker))
+    
+    def invoke(self, messages: Any, **kwargs: Any) -> LLMResponse:
+        """Возвращает записанный ответ после искусственной задержки."""
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return self._respond(messages)
+    
+    async def ainvoke(self, messages: Any, **kwargs: Any) -> LLMResponse:
+        """Асинхронная версия invoke."""
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return self._respond(messages)
+    
+    def with_structured_output(self, schema: type) -> StructuredClient:
+        """Структурированный режим: ответ собирается по полям схемы, а не по тексту промпта."""
+        def respond(messages: Any) -> str:
+            if self.latency_s:
+                time.sleep(self.latency_s)
+            return self._respond(messages, schema).content
+        
+        async def arespond(messages: Any) -> str:
+            if self.latency_s:
+                await asyncio.sleep(self.latency_s)
+            return self._respond(messages, schema).content
+        
+        return StructuredClient(schema, respond, arespond)
+    
+    def stream(self, messages: Any, **kwargs: Any) -> Iterator[LLMResponse]:
+        """Отдает записанный ответ кусками, распределяя задержку между ними."""
+        chunks = _chunks(self._respond(messages).content)
+        delay = self.latency_s / len(chunks)
+        for chunk in chunks:
+            if delay:
+                time.sleep(delay)
+            yield LLMResponse(content=chunk)
+    
+    async def astream(self, messages: Any, **kwargs: Any) -> AsyncIterator[LLMResponse]:
+        """Асинхронная версия stream."""
+        chunks = _chunks(self._respond(messages).content)
+        delay = self.latency_s / len(chunks)
+        for chunk in chunks:
+            if delay:
+                await asyncio.sleep(delay)
+            yield LLMResponse(content=chunk)
+
+
+class RateLimitError(Exception):
+    """Ответ 429 локального ограничивающего бэкенда."""
+
+
+class ThrottlingLLM:
+    """
+    Локальная имитация квот провайдера поверх другого бэкенда (обычно ReplayLLM).
+    
+    Отвечает ошибкой 429, если за последние window_s секунд уже принято
+    requests_per_window запросов или одновременно выполняется больше
+    max_concurrency; каждый запрос сверх soft_concurrency замедляет ответ на
+    overload_latency. Нужен, чтобы проверять планировщик запросов без сети.
+    """
+    
+    def __init__(
+        self,
+        llm: Any,
+        requests_per_window: int = 60,
+        window_s: float = 60.0,
+        max_concurrency: int = 0,
+        soft_concurrency: int = 0,
+        overload_latency: float = 0.0
+    ):
+        """
+        Инициализация бэкенда.
+        
+        Args:
+            llm: Бэкенд, который отвечает на принятые запросы
+            requests_per_window: Квота запросов в окне; 0 - без ограничения
+            window_s: Длина скользящего окна квоты, с
+            max_concurrency: Максимум одновременных запросов; 0 - без ограничения
+            soft_concurrency: Число одновременных запросов без замедления; 0 - без замедления
+            overload_latency: Дополнительная задержка за каждый запрос сверх soft_concurrency, с
+        """
+        self.llm = llm
+        self.requests_per_window = requests_per_window
+        self.window_s = window_s
+        self.max_concurrency = max_concurrency
+        self.soft_concurrency = soft_concurrency
+        self.overload_latency = overload_latency
+        self.accepted = 0
+        self.rejected = 0
+        self.peak_concurrency = 0
+        self._active = 0
+        self._window: "deque[float]" = deque()
+        self._lock = threading.Lock()
+    
+    def _admit(self) -> float:
+        """
+        Принимает запрос или отвечает 429.
+        
+        Returns:
+            float: Дополнительная задержка ответа из-за перегрузки, с
+            
+        Raises:
+            RateLimitError: Если квота или лимит одновременных запросов исчерпаны
+        """
+        now = time.monotonic()
+        with self._lock:
+            while self._window and now - self._window[0] >= self.window_s:
+                self._window.popleft()
+            if self.requests_per_window and len(self._window) >= self.requests_per_window:
+                self.rejected += 1
+                raise RateLimitError("429 Resource exhausted: превышена квота запросов")
+            if self.max_concurrency and self._active >= self.max_concurrency:
+                self.rejected += 1
+                raise RateLimitError("429 Resource exhausted: слишком много одновременных запросов")
+            self._window.append(now)
+            self._active += 1
+            self.accepted += 1
+            self.peak_concurrency = max(self.peak_concurrency, self._active)
+            if not self.soft_concurrency:
+                return 0.0
+            return self.overload_latency * max(0, self._active - self.soft_concurrency)
+    
+    def _done(self) -> None:
+        with self._lock:
+            self._active -= 1
+    
+    def invoke(self, messages: Any, **kwargs: Any) -> Any:
+        """Отвечает через обернутый бэкенд, если запрос укладывается в квоты."""
+        delay = self._admit()
+        try:
+            if delay:
+                time.sleep(delay)
+            return self.llm.invoke(messages, **kwargs)
+        finally:
+            self._done()
+    
+    async def ainvoke(self, messages: Any, **kwargs: Any) -> Any:
+        """Асинхронная версия invoke."""
+        delay = self._admit()
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            return await self.llm.ainvoke(messages, **kwargs)
+        finally:
+            self._done()
+    
+    def with_structured_output(self, schema: type) -> StructuredClient:
+        """Структурированный режим с теми же квотами."""
+        structured = self.llm.with_structured_output(schema)
+        
+        def respond(messages: Any) -> str:
+            delay = self._admit()
+            try:
+                if delay:
+                    time.sleep(delay)
+                return structured.invoke(messages).model_dump_json()
+            finally:
+                self._done()
+        
+        async def arespond(messages: Any) -> str:
+            delay = self._admit()
+            try:
+                if delay:
+                    await asyncio.sleep(delay)
+                return (await structured.ainvoke(messages)).model_dump_json()
+            finally:
+                self._done()
+        
+        return StructuredClient(schema, respond, arespond)
+    
+    def stream(self, messages: Any, **kwargs: Any) -> Iterator[Any]:
+        """Транслирует ответ обернутого бэкенда, если запрос укладывается в квоты."""
+        delay = self._admit()
+        try:
+            if delay:
+                time.sleep(delay)
+            yield from self.llm.stream(messages, **kwargs)
+        finally:
+            self._done()
+    
+    async def astream(self, messages: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        """Асинхронная версия stream."""
+        delay = self._admit()
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            async for chunk in self.llm.astream(messages, **kwargs):
+                yield chunk
+        finally:
+            self._done()
+    
+    def stats(self) -> Dict[str, int]:
+        """Принятые и отклоненные (429) запросы и пик одновременных запросов."""
+        with self._lock:
+            return {"accepted": self.accepted, "rejected": self.rejected, "peak_concurrency": self.peak_concurrency}
@@ -0,0 +1,384 @@
+"""
+Метрики и трассировка: гистограммы задержек, счетчики, текущие значения
+(например, глубина очереди запросов к модели) и события по run_id.
+
+Узлы графа и агенты пишут замеры в общий реестр get_metrics(). Реестр
+передает события (завершение узла, вызов модели) подключенным приемникам
+и по запросу экспортирует накопленные метрики в их формате: строки лога,
+текст Prometheus или JSON.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import sys
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Идентификатор текущего запуска workflow; попадает в события агентов
+current_run_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_run_id", default=None)
+
+
+@contextlib.contextmanager
+def run_context(run_id: Optional[str]):
+    """Делает run_id текущим для событий, записанных внутри блока."""
+    token = current_run_id.set(run_id)
+    try:
+        yield
+    finally:
+        current_run_id.reset(token)
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами."""
+    
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Инициализация гистограммы.
+        
+        Args:
+            buckets: Верхние границы корзин по возрастанию
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, value: float) -> None:
+        """Добавляет наблюдение."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+    
+    def quantile(self, q: float) -> float:
+        """
+        Оценивает квантиль по верхней границе корзины.
+        
+        Args:
+            q: Квантиль от 0 до 1
+            
+        Returns:
+            float: Оценка квантиля (inf для значений за последней границей)
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Возвращает состояние гистограммы в виде словаря."""
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99)
+        }
+
+
+class MetricsSink:
+    """Приемник метрик. Подклассы переопределяют нужные методы."""
+    
+    def on_event(self, event: Dict[str, Any]) -> None:
+        """Обрабатывает событие трассировки (завершение узла, вызов модели)."""
+    
+    def export(self, snapshot: Dict[str, Any]) -> str:
+        """
+        Экспортирует накопленные метрики.
+        
+        Args:
+            snapshot: Результат MetricsRegistry.snapshot()
+            
+        Returns:
+            str: Метрики в формате приемника
+        """
+        return ""
+
+
+class LogSink(MetricsSink):
+    """Пишет события и сводку метрик строками лога key=value."""
+    
+    def __init__(self, log: logging.Logger = logger, level: int = logging.DEBUG):
+        self.log = log
+        self.level = level
+    
+    def on_event(self, event: Dict[str, Any]) -> None:
+        self.log.log(self.level, " ".join(f"{k}={v}" for k, v in event.items()))
+    
+    def export(self, snapshot: Dict[str, Any]) -> str:
+        """Пишет сводку метрик в лог; возвращает пустую строку."""
+        lines = []
+        for name, series in snapshot["counters"].items():
+            for item in series:
+                lines.append(" ".join(filter(None, [name, _format_labels(item["labels"]), f"value={item['value']:g}"])))
+        for name, series in snapshot["gauges"].items():
+            for item in series:
+                lines.append(" ".join(filter(None, [name, _format_labels(item["labels"]), f"value={item['value']:g}"])))
+        for name, series in snapshot["histograms"].items():
+            for item in series:
+                lines.append(" ".join(filter(None, [
+                    name,
+                    _format_labels(item["labels"]),
+                    f"count={item['count']} sum={item['sum']:.3f} "
+                    f"p50={item['p50']:g} p95={item['p95']:g} p99={item['p99']:g}"
+                ])))
+        for line in lines:
+            self.log.info(line)
+        return ""
+
+
+class JsonSink(MetricsSink):
+    """Пишет события как JSON строки и экспортирует метрики одним JSON документом."""
+    
+    def __init__(self, stream: Optional[TextIO] = None):
+        """
+        Инициализация приемника.
+        
+        Args:
+            stream: Поток для событий; None - события не пишутся
+        """
+        self.stream = stream
+        self._lock = threading.Lock()
+    
+    def on_event(self, event: Dict[str, Any]) -> None:
+        if self.stream is None:
+            return
+        with self._lock:
+            self.stream.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self.stream.flush()
+    
+    def export(self, snapshot: Dict[str, Any]) -> str:
+        return json.dumps(snapshot, ensure_ascii=False, indent=2)
+
+
+class PrometheusSink(MetricsSink):
+    """Экспортирует метрики в текстовом формате Prometheus."""
+    
+    def export(self, snapshot: Dict[str, Any]) -> str:
+        """Возвращает счетчики, gauge и гистограммы (с накопительными бакетами) в формате экспозиции Prometheus."""
+        lines = []
+        for name, series in snapshot["counters"].items():
+            lines.append(f"# TYPE {name} counter")
+            for item in series:
+                lines.append(f"{name}{_prometheus_labels(item['labels'])} {item['value']:g}")
+        for name, series in snapshot["gauges"].items():
+            lines.append(f"# TYPE {name} gauge")
+            for item in series:
+                lines.append(f"{name}{_prometheus_labels(item['labels'])} {item['value']:g}")
+        for name, series in snapshot["histograms"].items():
+            lines.append(f"# TYPE {name} histogram")
+            for item in series:
+                cumulative = 0
+                for bound, count in item["buckets"].items():
+                    cumulative += count
+                    labels = {**item["labels"], "le": bound}
+                    lines.append(f"{name}_bucket{_prometheus_labels(labels)} {cumulative}")
+                lines.append(f"{name}_sum{_prometheus_labels(item['labels'])} {item['sum']:g}")
+                lines.append(f"{name}_count{_prometheus_labels(item['labels'])} {item['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    return " ".join(f"{k}={v}" for k, v in labels.items())
+
+
+def _prometheus_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = ",".join(
+        f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for k, v in labels.items()
+    )
+    return "{" + escaped + "}"
+
+
+class MetricsRegistry:
+    """Потокобезопасный реестр счетчиков, текущих значений и гистограмм."""
+    
+    def __init__(self, sinks: Optional[List[MetricsSink]] = None):
+        """
+        Инициализация реестра.
+        
+        Args:
+            sinks: Приемники событий и экспорта; по умолчанию LogSink
+        """
+        self.sinks = sinks if sinks is not None else [LogSink()]
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        """
+        Увеличивает счетчик.
+        
+        Args:
+            name: Имя метрики
+            value: Приращение
+            **labels: Метки серии
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+    
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        """
+        Задает текущее значение (gauge).
+        
+        Args:
+            name: Имя метрики
+            value: Значение
+            **labels: Метки серии
+        """
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+    
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """
+        Добавляет наблюдение в гистограмму.
+        
+        Args:
+            name: Имя метрики
+            value: Значение (для длительностей - секунды)
+            **labels: Метки серии
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+    
+    def event(self, **fields: Any) -> None:
+        """Передает событие трассировки всем приемникам."""
+        for sink in self.sinks:
+            try:
+                sink.on_event(fields)
+            except Exception:
+                logger.exception("Приемник метрик не смог обработать событие")
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Возвращает копию всех метрик.
+        
+        Returns:
+            Dict: {"counters": {...}, "gauges": {...}, "histograms": {...}}
+        """
+        with self._lock:
+            return {
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+                "gauges": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self._gauges.items()
+                },
+                "histograms": {
+                    name: [{"labels": dict(key), **histogram.snapshot()} for key, histogram in series.items()]
+                    for name, series in self._histograms.items()
+                }
+            }
+    
+    def export(self) -> List[str]:
+        """
+        Экспортирует метрики через все приемники.
+        
+        Returns:
+            List: Результат export каждого приемника
+        """
+        snapshot = self.snapshot()
+        return [sink.export(snapshot) for sink in self.sinks]
+    
+    def reset(self) -> None:
+        """Сбрасывает все накопленные метрики."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Возвращает общий реестр метрик процесса."""
+    return _registry
+
+
+def configure_metrics(sinks: List[MetricsSink]) -> MetricsRegistry:
+    """
+    Задает приемники общего реестра.
+    
+    Args:
+        sinks: Новый список приемников
+        
+    Returns:
+        MetricsRegistry: Общий реестр
+    """
+    _registry.sinks = sinks
+    return _registry
+
+
+SINKS = {
+    "log": LogSink,
+    "json": lambda: JsonSink(),
+    "prometheus": PrometheusSink
+}
+
+
+def make_sink(name: str) -> MetricsSink:
+    """
+    Создает приемник по имени формата.
+    
+    Args:
+        name: log, json или prometheus
+        
+    Returns:
+        MetricsSink: Приемник
+    """
+    if name not in SINKS:
+        raise ValueError(f"Неизвестный формат метрик: {name}. Доступны: {', '.join(SINKS)}")
+    return SINKS[name]()
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов, когда провайдер не сообщил точное значение."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def write_metrics(fmt: str, stream: TextIO = sys.stderr) -> None:
+    """
+    Выводит накопленные метрики общего реестра в заданном формате.
+    
+    Формат log пишет строки через logging, а не в stream.
+    
+    Args:
+        fmt: log, json или prometheus
+        stream: Поток для вывода
+    """
+    text = make_sink(fmt).export(_registry.snapshot())
+    if text:
+        stream.write(text.rstrip("\n") + "\n")
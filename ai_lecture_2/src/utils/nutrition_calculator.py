@@ -0,0 +1,137 @@
+"""
+Локальный расчет BMR, дневной нормы калорий и макронутриентов.
+
+Формулы совпадают с теми, что раньше передавались модели в промпте
+NutritionAgent, поэтому результат воспроизводим и не требует вызова LLM.
+"""
+from typing import TYPE_CHECKING, Dict, Sequence
+
+from src.models.schemas import UserInput, NutritionAnalysis
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# Дневная норма: BMR × множитель + поправка (ккал)
+GOAL_MULTIPLIERS = {"lose_weight": 1.2, "gain_weight": 1.5, "maintain": 1.4}
+GOAL_OFFSETS = {"lose_weight": -500.0, "gain_weight": 300.0, "maintain": 0.0}
+
+# Доли калорий: белки, жиры, углеводы
+MACRO_SPLITS = {
+    "lose_weight": (0.35, 0.25, 0.40),
+    "gain_weight": (0.30, 0.20, 0.50),
+    "maintain": (0.30, 0.25, 0.45),
+}
+
+# Поправка формулы Миффлина-Сан Жеора по полу
+GENDER_OFFSETS = {"male": 5.0, "female": -161.0}
+
+# Калорийность одного грамма макронутриента
+KCAL_PER_G_PROTEIN = 4.0
+KCAL_PER_G_FAT = 9.0
+KCAL_PER_G_CARBS = 4.0
+
+FAST_RECOMMENDATIONS = {
+    "lose_weight": (
+        "Придерживайтесь умеренного дефицита калорий, делайте упор на белок "
+        "и овощи, пейте достаточно воды и не пропускайте приемы пищи."
+    ),
+    "gain_weight": (
+        "Поддерживайте профицит калорий за счет сложных углеводов и белка, "
+        "питайтесь регулярно и сочетайте рацион с силовыми тренировками."
+    ),
+    "maintain": (
+        "Сохраняйте баланс калорий, питайтесь разнообразно и регулярно, "
+        "следите за достаточным потреблением белка, овощей и воды."
+    ),
+}
+
+
+def calculate_bmr(gender: str, weight: float, height: float, age: float) -> float:
+    """
+    Рассчитывает базальный метаболизм по формуле Миффлина-Сан Жеора.
+    
+    Args:
+        gender: Пол ("male" или "female")
+        weight: Вес в кг
+        height: Рост в см
+        age: Возраст в годах
+        
+    Returns:
+        float: BMR в ккал
+    """
+    return 10.0 * weight + 6.25 * height - 5.0 * age + GENDER_OFFSETS[gender]
+
+
+def calculate_nutrition(user_input: UserInput, recommendations: str = "") -> NutritionAnalysis:
+    """
+    Рассчитывает анализ питания без обращения к LLM.
+    
+    Args:
+        user_input: Входные данные пользователя
+        recommendations: Текст рекомендаций; по умолчанию - шаблон для цели
+        
+    Returns:
+        NutritionAnalysis: Результат анализа
+    """
+    goal = user_input.goal
+    bmr = calculate_bmr(user_input.gender, user_input.weight, user_input.height, user_input.age)
+    daily_calories = bmr * GOAL_MULTIPLIERS[goal] + GOAL_OFFSETS[goal]
+    protein_share, fat_share, carbs_share = MACRO_SPLITS[goal]
+    
+    return NutritionAnalysis(
+        bmr=round(bmr, 1),
+        daily_calories=round(daily_calories, 1),
+        protein_g=round(daily_calories * protein_share / KCAL_PER_G_PROTEIN, 1),
+        carbs_g=round(daily_calories * carbs_share / KCAL_PER_G_CARBS, 1),
+        fats_g=round(daily_calories * fat_share / KCAL_PER_G_FAT, 1),
+        recommendations=recommendations or FAST_RECOMMENDATIONS[goal]
+    )
+
+
+def calculate_nutrition_batch(
+    goals: Sequence[str],
+    genders: Sequence[str],
+    weights: Sequence[float],
+    heights: Sequence[float],
+    ages: Sequence[float]
+) -> Dict[str, "np.ndarray"]:
+    """
+    Векторизованный расчет для большого числа профилей сразу.
+    
+    Args:
+        goals: Цели пользователей
+        genders: Пол пользователей
+        weights: Вес в кг
+        heights: Рост в см
+        ages: Возраст в годах
+        
+    Returns:
+        Dict: Массивы bmr, daily_calories, protein_g, carbs_g, fats_g
+    """
+    import numpy as np
+    
+    weights = np.asarray(weights, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+    ages = np.asarray(ages, dtype=np.float64)
+    
+    # Строки переводим в индексы таблиц один раз на уникальное значение
+    goal_values, goal_idx = np.unique(np.asarray(goals), return_inverse=True)
+    gender_values, gender_idx = np.unique(np.asarray(genders), return_inverse=True)
+    
+    gender_offsets = np.array([GENDER_OFFSETS[str(g)] for g in gender_values])
+    multipliers = np.array([GOAL_MULTIPLIERS[str(g)] for g in goal_values])
+    offsets = np.array([GOAL_OFFSETS[str(g)] for g in goal_values])
+    splits = np.array([MACRO_SPLITS[str(g)] for g in goal_values])
+    
+    bmr = 10.0 * weights + 6.25 * heights - 5.0 * ages + gender_offsets[gender_idx]
+    daily_calories = bmr * multipliers[goal_idx] + offsets[goal_idx]
+    shares = splits[goal_idx]
+    
+    return {
+        "bmr": bmr,
+        "daily_calories": daily_calories,
+        "protein_g": daily_calories * shares[:, 0] / KCAL_PER_G_PROTEIN,
+        "carbs_g": daily_calories * shares[:, 2] / KCAL_PER_G_CARBS,
+        "fats_g": daily_calories * shares[:, 1] / KCAL_PER_G_FAT,
+    }
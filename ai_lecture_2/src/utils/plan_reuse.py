@@ -0,0 +1,256 @@
+"""
+Повторное использование готовых планов для похожих профилей.
+
+Профили делятся на разделы по точному совпадению цели, пола и
+нормализованных предпочтений; внутри раздела ищется ближайший сосед по весу,
+росту, возрасту и рассчитанной норме калорий. Если он ближе заданного
+расстояния, его план отдается без обращения к модели.
+
+Расстояние евклидово в единицах FEATURE_SCALES: 1 кг, 1 см, 1 год или 10 ккал
+нормы дают расстояние 1. Планы на диске лежат в колоночном хранилище
+(src/utils/plan_store.py), профили - в profiles.jsonl рядом с ним.
+"""
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from src.models.schemas import NutritionAnalysis, PreferencesAnalysis, UserInput, WeeklyMealPlan
+from src.utils.cache import normalize_preferences
+from src.utils.nutrition_calculator import calculate_nutrition
+from src.utils.plan_store import PlanStore
+
+
+PROFILE_FEATURES = ("weight", "height", "age", "daily_calories")
+# Изменение признака, которое дает расстояние 1
+FEATURE_SCALES = (1.0, 1.0, 1.0, 10.0)
+DEFAULT_MAX_DISTANCE = 5.0
+PROFILES_FILE = "profiles.jsonl"
+PLANS_DIRECTORY = "plans"
+
+
+def partition_key(user_input: UserInput) -> str:
+    """Раздел индекса: планы переиспользуются только при совпадении этих полей."""
+    return f"{user_input.goal}|{user_input.gender}|{normalize_preferences(user_input.preferences)}"
+
+
+def profile_features(user_input: UserInput, nutrition: Optional[NutritionAnalysis] = None) -> Tuple[float, ...]:
+    """
+    Признаки профиля для поиска соседей.
+    
+    Args:
+        user_input: Входные данные пользователя
+        nutrition: Анализ питания; по умолчанию рассчитывается локально
+        
+    Returns:
+        Tuple: Вес, рост, возраст и дневная норма калорий
+    """
+    nutrition = nutrition or calculate_nutrition(user_input)
+    return (float(user_input.weight), float(user_input.height), float(user_input.age), nutrition.daily_calories)
+
+
+@dataclass
+class ReuseMatch:
+    """Найденный план соседнего профиля."""
+    plan: WeeklyMealPlan
+    preferences_analysis: PreferencesAnalysis
+    recommendations: str
+    distance: float
+    run_id: Optional[str] = None
+
+
+@dataclass
+class _Entry:
+    """Сохраненный план: объект в памяти или номер в хранилище."""
+    plan: Union[WeeklyMealPlan, int]
+    preferences_json: str
+    recommendations: str
+    run_id: Optional[str]
+
+
+class _Partition:
+    """Признаки профилей раздела в массиве с запасом под дописывание."""
+    
+    def __init__(self):
+        import numpy as np
+        
+        self.features = np.empty((16, len(PROFILE_FEATURES)))
+        self.entries: List[_Entry] = []
+    
+    def add(self, features: Tuple[float, ...], entry: _Entry) -> None:
+        import numpy as np
+        
+        size = len(self.entries)
+        if size == len(self.features):
+            grown = np.empty((size * 2, len(PROFILE_FEATURES)))
+            grown[:size] = self.features
+            self.features = grown
+        self.features[size] = features
+        self.entries.append(entry)
+    
+    def nearest(self, features: Tuple[float, ...]) -> Tuple[int, float]:
+        """Номер и расстояние ближайшего профиля раздела."""
+        import numpy as np
+        
+        diff = (self.features[:len(self.entries)] - np.asarray(features)) / np.asarray(FEATURE_SCALES)
+        distances = np.einsum("ij,ij->i", diff, diff)
+        index = int(distances.argmin())
+        return index, float(np.sqrt(distances[index]))
+
+
+class PlanReuseIndex:
+    """
+    Индекс ближайших соседей по профилям с готовыми планами.
+    
+    Безопасен для использования из нескольких потоков. На диск пишет один
+    процесс: хранилище планов рассчитано на одного писателя.
+    """
+    
+    def __init__(self, path: Optional[str] = None, max_distance: float = DEFAULT_MAX_DISTANCE):
+        """
+        Инициализация индекса.
+        
+        Args:
+            path: Каталог индекса; None - только память
+            max_distance: Максимальное расстояние до соседа, план которого отдается
+        """
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self._partitions: Dict[str, _Partition] = {}
+        self._lock = threading.Lock()
+        self._store: Optional[PlanStore] = None
+        self._profiles_path: Optional[Path] = None
+        if path:
+            directory = Path(path)
+            self._store = PlanStore(directory / PLANS_DIRECTORY)
+            self._profiles_path = directory / PROFILES_FILE
+            self._load()
+    
+    def _load(self) -> None:
+        """Восстанавливает разделы из profiles.jsonl."""
+        if not self._profiles_path.exists():
+            return
+        with open(self._profiles_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Недописанная строка после сбоя
+                    break
+                if record["plan"] >= len(self._store):
+                    continue
+                self._partition(record["key"]).add(tuple(record["features"]), _Entry(
+                    record["plan"], record["preferences"], record["recommendations"], record.get("run_id")
+                ))
+    
+    def _partition(self, key: str) -> _Partition:
+        partition = self._partitions.get(key)
+        if partition is None:
+            partition = self._partitions[key] = _Partition()
+        return partition
+    
+    def __len__(self) -> int:
+        return sum(len(partition.entries) for partition in self._partitions.values())
+    
+    def lookup(self, user_input: UserInput, nutrition: Optional[NutritionAnalysis] = None) -> Optional[ReuseMatch]:
+        """
+        Ищет план ближайшего профиля того же раздела.
+        
+        Args:
+            user_input: Входные данные пользователя
+            nutrition: Анализ питания; по умолчанию рассчитывается локально
+            
+        Returns:
+            Optional[ReuseMatch]: Копия плана соседа или None, если соседа
+            ближе max_distance нет
+        """
+        features = profile_features(user_input, nutrition)
+        with self._lock:
+            partition = self._partitions.get(partition_key(user_input))
+            if partition is None or not partition.entries:
+                self.misses += 1
+                return None
+            index, distance = partition.nearest(features)
+            if distance > self.max_distance:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry = partition.entries[index]
+            plan = self._store.get(entry.plan) if isinstance(entry.plan, int) else entry.plan.model_copy(deep=True)
+        return ReuseMatch(
+            plan=plan,
+            preferences_analysis=PreferencesAnalysis.model_validate_json(entry.preferences_json),
+            recommendations=entry.recommendations,
+            distance=distance,
+            run_id=entry.run_id
+        )
+    
+    def add(
+        self,
+        user_input: UserInput,
+        plan: WeeklyMealPlan,
+        preferences_analysis: PreferencesAnalysis,
+        nutrition: Optional[NutritionAnalysis] = None,
+        run_id: Optional[str] = None
+    ) -> None:
+        """
+        Добавляет готовый план в индекс (и на диск, если задан путь).
+        
+        Args:
+            user_input: Входные данные, для которых построен план
+            plan: Недельный план
+            preferences_analysis: Анализ предпочтений, с которым построен план
+            nutrition: Анализ питания запуска (рекомендации переиспользуются вместе с планом)
+            run_id: Идентификатор запуска, построившего план
+        """
+        nutrition = nutrition or calculate_nutrition(user_input)
+        key = partition_key(user_input)
+        features = profile_features(user_input, nutrition)
+        preferences_json = preferences_analysis.model_dump_json()
+        with self._lock:
+            if self._store is None:
+                stored: Union[WeeklyMealPlan, int] = plan.model_copy(deep=True)
+            else:
+                # Профиль пишется после плана: ссылка на недописанный план невозможна
+                stored = self._store.append([plan])[0]
+                record = {
+                    "key": key,
+                    "features": features,
+                    "plan": stored,
+                    "preferences": preferences_json,
+                    "recommendations": nutrition.recommendations,
+                    "run_id": run_id
+                }
+                with open(self._profiles_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._partition(key).add(
+                features, _Entry(stored, preferences_json, nutrition.recommendations, run_id)
+            )
+    
+    def reject(self) -> None:
+        """Учитывает найденный план, который не подошел (например, не прошел проверку), как промах."""
+        with self._lock:
+            self.hits -= 1
+            self.misses += 1
+            self.rejected += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Возвращает счетчики попаданий и промахов.
+        
+        Returns:
+            Dict: hits, misses (включая rejected), hit_rate, число планов и разделов
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected": self.rejected,
+                "hit_rate": self.hits / total if total else 0.0,
+                "plans": len(self),
+                "partitions": len(self._partitions)
+            }
@@ -0,0 +1,424 @@
+"""
+Колоночное хранилище планов питания.
+
+Планы раскладываются по четырем таблицам: планы, дни, приемы пищи и продукты.
+Каждая колонка таблицы - отдельный двоичный файл фиксированного типа, который
+читается через np.memmap без разбора JSON, а строки (названия дней и приемов
+пищи, время, продукты, резюме) хранятся один раз в словаре строк и
+заменяются в колонках номерами. Строки таблицы-потомка идут подряд, поэтому
+приемы пищи дня или дни плана находятся по накопленной сумме колонки
+количества.
+
+Хранилище только дописывается. Число строк каждой таблицы фиксируется в
+meta.json после записи колонок, поэтому прерванное дописывание не портит
+хранилище: лишние байты отбрасываются при следующей записи.
+
+Пример:
+    with PlanStore("plans.store") as store:
+        store.append(plans)
+    
+    store = PlanStore("plans.store")
+    calories = store.column("meals", "calories")
+    per_plan = np.bincount(store.plan_ids("meals"), weights=calories)
+    plan = store.get(42)
+"""
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from src.models.schemas import DailyPlan, DayMeal, WeeklyMealPlan
+from src.utils.validation import PlanLike
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+STORE_VERSION = 1
+META_FILE = "meta.json"
+STRINGS_FILE = "strings.jsonl"
+# Планов в буфере до записи на диск при добавлении по одному
+FLUSH_SIZE = 1024
+# Значения хранятся в float32; при восстановлении плана округляются до этих знаков
+FLOAT_DIGITS = 3
+
+# Таблица -> колонки (название, тип numpy). Колонка количества связывает
+# строку с подряд идущими строками следующей таблицы.
+TABLES: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "plans": (("summary", "<u4"), ("days", "<u2")),
+    "days": (
+        ("day", "<u4"), ("meals", "<u2"),
+        ("total_calories", "<f4"), ("total_protein_g", "<f4"),
+        ("total_fats_g", "<f4"), ("total_carbs_g", "<f4")
+    ),
+    "meals": (
+        ("name", "<u4"), ("time", "<u4"), ("foods", "<u2"),
+        ("calories", "<f4"), ("protein_g", "<f4"), ("fats_g", "<f4"), ("carbs_g", "<f4")
+    ),
+    "foods": (("food", "<u4"),),
+}
+# Таблица -> (таблица-потомок, колонка количества)
+CHILDREN = {"plans": ("days", "days"), "days": ("meals", "meals"), "meals": ("foods", "foods")}
+# Таблица -> таблица-родитель
+PARENTS = {child: parent for parent, (child, _) in CHILDREN.items()}
+
+
+def _plan_rows(plan: PlanLike) -> Tuple[str, List[Tuple[Any, ...]]]:
+    """Резюме и дни плана как кортежи (день, итоги, приемы пищи)."""
+    if isinstance(plan, WeeklyMealPlan):
+        plan = plan.model_dump()
+    days = [
+        (
+            day["day"],
+            (day["total_calories"], day["total_protein_g"], day["total_fats_g"], day["total_carbs_g"]),
+            [
+                (
+                    meal["name"], meal["time"], meal["foods"],
+                    (meal["calories"], meal["protein_g"], meal["fats_g"], meal["carbs_g"])
+                )
+                for meal in day["meals"]
+            ]
+        )
+        for day in plan["week_plan"]
+    ]
+    return plan["summary"], days
+
+
+class PlanStore:
+    """
+    Колоночное хранилище недельных планов с дописыванием.
+    
+    Чтение колонок не создает объектов pydantic; план целиком собирается
+    только по запросу (get, iter_plans). Запись рассчитана на одного писателя.
+    """
+    
+    def __init__(self, directory: Union[str, "os.PathLike[str]"]):
+        """
+        Открывает хранилище (каталог создается при первой записи).
+        
+        Args:
+            directory: Каталог хранилища
+            
+        Raises:
+            ValueError: Если версия хранилища не поддерживается
+        """
+        self.directory = Path(directory)
+        self._meta = self._read_meta()
+        self._pending: List[Tuple[str, List[Tuple[Any, ...]]]] = []
+        self._strings: Optional[List[str]] = None
+        self._string_ids: Optional[Dict[str, int]] = None
+        self._columns: Dict[Tuple[str, str], "np.ndarray"] = {}
+        self._offsets: Dict[str, "np.ndarray"] = {}
+        self._plan_ids: Dict[str, "np.ndarray"] = {}
+    
+    def _read_meta(self) -> Dict[str, Any]:
+        path = self.directory / META_FILE
+        if not path.exists():
+            return {"version": STORE_VERSION, "rows": {table: 0 for table in TABLES}, "strings": 0, "strings_bytes": 0}
+        with open(path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Неподдерживаемая версия хранилища планов: {meta.get('version')}")
+        return meta
+    
+    def _write_meta(self, meta: Dict[str, Any]) -> None:
+        """Фиксирует число строк: временный файл атомарно подменяет meta.json."""
+        path = self.directory / META_FILE
+        temporary = path.with_name(f"{META_FILE}.{os.getpid()}.tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(temporary, path)
+    
+    def _column_path(self, table: str, name: str) -> Path:
+        return self.directory / f"{table}.{name}.bin"
+    
+    def __len__(self) -> int:
+        return self._meta["rows"]["plans"]
+    
+    def rows(self, table: str) -> int:
+        """Число строк таблицы (plans, days, meals или foods)."""
+        return self._meta["rows"][table]
+    
+    @property
+    def strings(self) -> List[str]:
+        """Словарь строк: номер строки в колонках -> текст."""
+        if self._strings is None:
+            self._strings = []
+            path = self.directory / STRINGS_FILE
+            if self._meta["strings"]:
+                with open(path, "rb") as f:
+                    data = f.read(self._meta["strings_bytes"])
+                self._strings = [json.loads(line) for line in data.splitlines()]
+        return self._strings
+    
+    def _interner(self, added: List[str]) -> Callable[[str], int]:
+        """Функция, возвращающая номер строки; новые строки попадают в added."""
+        strings = self.strings
+        if self._string_ids is None:
+            self._string_ids = {text: i for i, text in enumerate(strings)}
+        string_ids = self._string_ids
+        
+        def intern(text: str) -> int:
+            string_id = string_ids.get(text)
+            if string_id is None:
+                string_id = string_ids[text] = len(strings)
+                strings.append(text)
+                added.append(text)
+            return string_id
+        
+        return intern
+    
+    def add(self, plan: PlanLike) -> None:
+        """
+        Добавляет план в буфер; на диск буфер пишется каждые FLUSH_SIZE планов
+        и при flush/закрытии.
+        
+        Args:
+            plan: План (модель или словарь, например из JSONL пакетного запуска)
+        """
+        self._pending.append(_plan_rows(plan))
+        if len(self._pending) >= FLUSH_SIZE:
+            self.flush()
+    
+    def append(self, plans: Iterable[PlanLike]) -> range:
+        """
+        Дописывает планы и сразу сохраняет их на диск.
+        
+        Args:
+            plans: Планы (модели или словари)
+            
+        Returns:
+            range: Номера добавленных планов
+        """
+        first = len(self) + len(self._pending)
+        for plan in plans:
+            self.add(plan)
+        self.flush()
+        return range(first, len(self))
+    
+    def flush(self) -> None:
+        """Записывает буфер: по одной операции записи на колонку."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        added: List[str] = []
+        try:
+            self._write(pending, added)
+        except BaseException:
+            # Словарь строк в памяти мог опередить файл: перечитывается при следующем обращении
+            self._strings = self._string_ids = None
+            raise
+        finally:
+            # Отображения файлов устарели
+            self._columns.clear()
+            self._offsets.clear()
+            self._plan_ids.clear()
+    
+    def _write(self, pending: List[Tuple[str, List[Tuple[Any, ...]]]], added: List[str]) -> None:
+        import numpy as np
+        
+        intern = self._interner(added)
+        values: Dict[str, List[Any]] = {table: [] for table in TABLES}
+        plans, days_table, meals_table, foods_table = (values[table] for table in TABLES)
+        for summary, days in pending:
+            plans.append((intern(summary), len(days)))
+            for day, totals, meals in days:
+                days_table.append((intern(day), len(meals), *totals))
+                for name, time, foods, nutrients in meals:
+                    meals_table.append((intern(name), intern(time), len(foods), *nutrients))
+                    foods_table.extend(map(intern, foods))
+        
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Новые счетчики собираются в копии и попадают в self._meta только после записи meta.json:
+        # при сбое следующая запись обрежет колонки по прежнему числу строк
+        meta = {**self._meta, "rows": dict(self._meta["rows"])}
+        # Сначала строки и колонки (хвост после сбоя обрезается), затем meta.json
+        encoded = "".join(json.dumps(text, ensure_ascii=False) + "\n" for text in added).encode("utf-8")
+        with open(self.directory / STRINGS_FILE, "ab") as f:
+            f.truncate(self._meta["strings_bytes"])
+            f.write(encoded)
+        for table, columns in TABLES.items():
+            if len(columns) == 1:
+                rows = {columns[0][0]: np.array(values[table], dtype=columns[0][1])}
+            else:
+                rows = np.array(values[table], dtype=[(name, dtype) for name, dtype in columns])
+            for name, dtype in columns:
+                with open(self._column_path(table, name), "ab") as f:
+                    f.truncate(self.rows(table) * np.dtype(dtype).itemsize)
+                    f.write(np.ascontiguousarray(rows[name]).tobytes())
+            meta["rows"][table] += len(values[table])
+        meta["strings"] += len(added)
+        meta["strings_bytes"] += len(encoded)
+        self._write_meta(meta)
+        self._meta = meta
+    
+    def close(self) -> None:
+        """Сохраняет буфер."""
+        self.flush()
+    
+    def __enter__(self) -> "PlanStore":
+        return self
+    
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+    
+    def column(self, table: str, name: str) -> "np.ndarray":
+        """
+        Колонка таблицы без копирования (только чтение).
+        
+        Args:
+            table: plans, days, meals или foods
+            name: Название колонки (см. TABLES), например "calories"
+            
+        Returns:
+            np.ndarray: Значения по строкам таблицы; строки в колонках
+            строковых полей заменены номерами в strings
+            
+        Raises:
+            KeyError: Если таблицы или колонки нет
+        """
+        import numpy as np
+        
+        key = (table, name)
+        cached = self._columns.get(key)
+        if cached is None:
+            dtype = dict(TABLES[table])[name]
+            count = self.rows(table)
+            if count:
+                cached = np.memmap(self._column_path(table, name), dtype=dtype, mode="r", shape=(count,))
+            else:
+                cached = np.empty(0, dtype=dtype)
+            self._columns[key] = cached
+        return cached
+    
+    def offsets(self, table: str) -> "np.ndarray":
+        """
+        Границы строк таблицы-потомка для каждой строки таблицы.
+        
+        Args:
+            table: plans, days или meals
+            
+        Returns:
+            np.ndarray: Массив длины rows(table) + 1; строки потомка для строки i
+            лежат в [offsets[i], offsets[i + 1])
+        """
+        import numpy as np
+        
+        cached = self._offsets.get(table)
+        if cached is None:
+            counts = self.column(table, CHILDREN[table][1])
+            cached = np.zeros(len(counts) + 1, dtype=np.int64)
+            np.cumsum(counts, out=cached[1:])
+            self._offsets[table] = cached
+        return cached
+    
+    def plan_ids(self, table: str) -> "np.ndarray":
+        """
+        Номер плана для каждой строки таблицы (для группировки через np.bincount).
+        
+        Args:
+            table: plans, days, meals или foods
+            
+        Returns:
+            np.ndarray: Номера планов по строкам таблицы
+        """
+        import numpy as np
+        
+        cached = self._plan_ids.get(table)
+        if cached is None:
+            if table == "plans":
+                cached = np.arange(len(self), dtype=np.int64)
+            else:
+                parent = PARENTS[table]
+                counts = self.column(parent, CHILDREN[parent][1])
+                cached = np.repeat(self.plan_ids(parent), counts)
+            self._plan_ids[table] = cached
+        return cached
+    
+    def decode(self, ids: Iterable[int]) -> List[str]:
+        """Тексты по номерам строк."""
+        strings = self.strings
+        return [strings[i] for i in ids]
+    
+    def _values(self, table: str, name: str, start: int, stop: int) -> List[Any]:
+        column = self.column(table, name)[start:stop]
+        if column.dtype.kind == "f":
+            return column.astype("f8").round(FLOAT_DIGITS).tolist()
+        return column.tolist()
+    
+    def get(self, index: int) -> WeeklyMealPlan:
+        """
+        Собирает план целиком.
+        
+        Args:
+            index: Номер плана (отрицательные - с конца)
+            
+        Returns:
+            WeeklyMealPlan: План (значения с точностью float32)
+            
+        Raises:
+            IndexError: Если плана с таким номером нет
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Нет плана с номером {index} (всего {len(self)})")
+        strings = self.strings
+        day_start, day_stop = self.offsets("plans")[index:index + 2].tolist()
+        meal_offsets = self.offsets("days")[day_start:day_stop + 1].tolist()
+        food_offsets = self.offsets("meals")[meal_offsets[0]:meal_offsets[-1] + 1].tolist()
+        
+        day_columns = {name: self._values("days", name, day_start, day_stop) for name, _ in TABLES["days"]}
+        meal_columns = {
+            name: self._values("meals", name, meal_offsets[0], meal_offsets[-1]) for name, _ in TABLES["meals"]
+        }
+        foods = self.decode(self._values("foods", "food", food_offsets[0], food_offsets[-1]))
+        
+        days = []
+        for d in range(day_stop - day_start):
+            meals = []
+            for m in range(meal_offsets[d] - meal_offsets[0], meal_offsets[d + 1] - meal_offsets[0]):
+                meals.append(DayMeal(
+                    name=strings[meal_columns["name"][m]],
+                    time=strings[meal_columns["time"][m]],
+                    foods=foods[food_offsets[m] - food_offsets[0]:food_offsets[m + 1] - food_offsets[0]],
+                    calories=meal_columns["calories"][m],
+                    protein_g=meal_columns["protein_g"][m],
+                    fats_g=meal_columns["fats_g"][m],
+                    carbs_g=meal_columns["carbs_g"][m]
+                ))
+            days.append(DailyPlan(
+                day=strings[day_columns["day"][d]],
+                meals=meals,
+                total_calories=day_columns["total_calories"][d],
+                total_protein_g=day_columns["total_protein_g"][d],
+                total_fats_g=day_columns["total_fats_g"][d],
+                total_carbs_g=day_columns["total_carbs_g"][d]
+            ))
+        summary = strings[int(self.column("plans", "summary")[index])]
+        return WeeklyMealPlan(week_plan=days, summary=summary)
+    
+    def __getitem__(self, index: int) -> WeeklyMealPlan:
+        return self.get(index)
+    
+    def iter_plans(self, indices: Optional[Iterable[int]] = None) -> Iterator[WeeklyMealPlan]:
+        """
+        Собирает планы по одному.
+        
+        Args:
+            indices: Номера планов; по умолчанию все
+            
+        Returns:
+            Iterator: Планы
+        """
+        for index in range(len(self)) if indices is None else indices:
+            yield self.get(index)
+    
+    def __iter__(self) -> Iterator[WeeklyMealPlan]:
+        return self.iter_plans()
+    
+    def size_bytes(self) -> int:
+        """Размер файлов хранилища на диске."""
+        if not self.directory.exists():
+            return 0
+        return sum(path.stat().st_size for path in self.directory.iterdir() if path.is_file())
@@ -0,0 +1,247 @@
+"""
+Пересчет порций готового плана под новую норму калорий и БЖУ.
+
+Блюда плана остаются прежними, меняются только количества в строках
+продуктов. Для каждого дня подбирается множитель каждой строки: все строки
+масштабируются к норме калорий, а отклонения от общего множителя в пределах
+SCALE_SPREAD подгоняют белки, жиры и углеводы (регуляризованный метод
+наименьших квадратов по таблице продуктов). Количества округляются до
+удобных значений, калорийность и БЖУ приемов пищи пересчитываются по
+таблице, как при LOCAL_NUTRIENTS.
+
+Строки, которых нет в таблице, масштабируются общим множителем дня вместе с
+их долей в значениях, указанных моделью.
+"""
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from src.models.schemas import DailyPlan, NutritionAnalysis, WeeklyMealPlan
+from src.utils.food_db import GRAMS, MILLILITERS, PIECES, QUANTITY, FoodDatabase, get_food_db, parse_number, parse_unit
+from src.utils.validation import MEAL_FIELDS, recompute_day_totals
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# Допустимое отклонение множителя строки от общего множителя дня (доля)
+SCALE_SPREAD = 0.5
+# Вес отклонения от общего множителя: больше - порции ближе к пропорциональным
+REGULARIZATION = 0.05
+# Калории важнее макронутриентов при подгонке
+CALORIE_WEIGHT = 5.0
+
+
+def _round_base(value: float, unit: str) -> float:
+    """Округляет количество в базовой единице до удобного значения."""
+    if unit == GRAMS:
+        step = 5.0 if value >= 20 else 1.0
+    elif unit == MILLILITERS:
+        step = 10.0 if value >= 50 else 5.0
+    else:
+        step = 0.5 if value < 3 else 1.0
+    return max(step, round(value / step) * step)
+
+
+def _format_number(value: float, comma: bool) -> str:
+    text = f"{value:.2f}".rstrip("0").rstrip(".")
+    return text.replace(".", ",") if comma else text
+
+
+def _metric(unit: Optional[str]) -> bool:
+    """Количество в граммах, миллилитрах, килограммах или литрах (округляется точно)."""
+    base, factor = parse_unit(unit)
+    return base in (GRAMS, MILLILITERS) and factor in (1.0, 1000.0)
+
+
+def scale_food(text: str, factor: float) -> str:
+    """
+    Умножает все количества в строке продукта на factor.
+    
+    Граммы и миллилитры округляются до 1-10 единиц, штуки, ложки и
+    стаканы - до половины. Строка без количества получает «(N шт)», если
+    количество изменилось.
+    
+    Args:
+        text: Строка продукта, например «Овсянка (60г)» или «2 яйца»
+        factor: Множитель
+        
+    Returns:
+        str: Строка с новыми количествами
+    """
+    parts = []
+    position = 0
+    for match in QUANTITY.finditer(text):
+        number = match.group("number")
+        unit, unit_factor = parse_unit(match.group("unit"))
+        amount = parse_number(number) * factor
+        if _metric(match.group("unit")):
+            amount = _round_base(amount * unit_factor, unit) / unit_factor
+        else:
+            # Штуки, ложки, стаканы: половины исходной единицы
+            amount = max(0.5, round(amount * 2) / 2)
+        parts.append(text[position:match.start("number")])
+        parts.append(_format_number(amount, "," in number))
+        position = match.end("number")
+    if not parts:
+        pieces = _round_base(factor, PIECES)
+        return text if pieces == 1.0 else f"{text} ({_format_number(pieces, False)} {PIECES})"
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def _adjustable(text: str) -> bool:
+    """Все количества строки метрические: после округления ее можно подогнать точно."""
+    units = [match.group("unit") for match in QUANTITY.finditer(text)]
+    return bool(units) and all(_metric(unit) for unit in units)
+
+
+def _food_vector(db: FoodDatabase, text: str) -> Tuple["np.ndarray", bool]:
+    """Калории и БЖУ строки продукта по таблице и признак, что распознаны все части."""
+    import numpy as np
+    
+    portions = db.parse(text)
+    vector = np.zeros(len(MEAL_FIELDS))
+    if not portions or any(portion.row is None for portion in portions):
+        return vector, False
+    for portion in portions:
+        vector += db.values[portion.row] * (portion.grams / 100.0)
+    return vector, True
+
+
+def _day_vectors(db: FoodDatabase, day: DailyPlan) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    Вклад строк продуктов дня по таблице и остаток, известный только по модели.
+    
+    Returns:
+        Tuple: (вклад строк [строка, 4], признак распознанной строки [строка],
+            нераспознанная часть значений модели [4])
+    """
+    import numpy as np
+    
+    vectors, resolved = [], []
+    leftover = np.zeros(len(MEAL_FIELDS))
+    for meal in day.meals:
+        meal_vectors = [_food_vector(db, text) for text in meal.foods]
+        vectors.extend(vector for vector, _ in meal_vectors)
+        resolved.extend(known for _, known in meal_vectors)
+        if not all(known for _, known in meal_vectors):
+            stated = np.array([getattr(meal, field) for field in MEAL_FIELDS])
+            known_sum = sum((vector for vector, _ in meal_vectors), np.zeros(len(MEAL_FIELDS)))
+            leftover += np.maximum(stated - known_sum, 0.0)
+    return np.array(vectors).reshape(-1, len(MEAL_FIELDS)), np.array(resolved, dtype=bool), leftover
+
+
+def _solve(vectors: "np.ndarray", target: "np.ndarray") -> "np.ndarray":
+    """
+    Подбирает множители строк под норму.
+    
+    Минимизируется ||W (V s - T)||² + λ ||s - k||², где W - обратные
+    значения нормы, V - вклад строк, а k - общий множитель калорий.
+    Множители ограничены k (1 ± SCALE_SPREAD).
+    
+    Args:
+        vectors: Вклад строк [строка, 4]
+        target: Норма за вычетом того, что не подгоняется [4]
+        
+    Returns:
+        np.ndarray: Множители строк
+    """
+    import numpy as np
+    
+    calories = vectors[:, 0].sum()
+    scale = float(target[0] / calories) if calories > 0 and target[0] > 0 else 1.0
+    factors = np.full(len(vectors), scale)
+    weights = np.divide(1.0, target, out=np.zeros_like(target), where=target > 0)
+    weights[0] *= CALORIE_WEIGHT
+    a = (vectors * weights).T
+    gram = a.T @ a + REGULARIZATION * np.eye(len(vectors))
+    factors += np.linalg.solve(gram, a.T @ (weights * target - a @ factors))
+    return np.clip(factors, scale * (1 - SCALE_SPREAD), scale * (1 + SCALE_SPREAD))
+
+
+def _retarget_day(db: FoodDatabase, day: DailyPlan, target: "np.ndarray") -> None:
+    """Пересчитывает количества и значения одного дня (на месте)."""
+    import numpy as np
+    
+    texts = [text for meal in day.meals for text in meal.foods]
+    vectors, resolved, leftover = _day_vectors(db, day)
+    current = vectors.sum(axis=0) + leftover
+    scale = float(target[0] / current[0]) if current[0] > 0 else 1.0
+    # Нераспознанные строки и их доля в значениях модели масштабируются общим множителем
+    factors = np.full(len(texts), scale)
+    remaining = target - scale * leftover
+    if resolved.any():
+        factors[resolved] = _solve(vectors[resolved], remaining)
+    scaled = [scale_food(text, factor) for text, factor in zip(texts, factors)]
+    
+    # Строки в штуках и ложках округляются грубо; строки в граммах подгоняются под то, что получилось
+    fine = resolved & np.array([_adjustable(text) for text in texts], dtype=bool)
+    if fine.any():
+        for i in np.nonzero(resolved & ~fine)[0]:
+            remaining = remaining - _food_vector(db, scaled[i])[0]
+        factors[fine] = _solve(vectors[fine], np.maximum(remaining, 0.0))
+        for i in np.nonzero(fine)[0]:
+            scaled[i] = scale_food(texts[i], factors[i])
+    
+    index = 0
+    for meal in day.meals:
+        count = len(meal.foods)
+        meal_known = vectors[index:index + count][resolved[index:index + count]].sum(axis=0)
+        complete = bool(resolved[index:index + count].all())
+        meal.foods = scaled[index:index + count]
+        index += count
+        
+        totals = db.meal_nutrients(meal.foods)
+        values = np.array([totals.calories, totals.protein_g, totals.fats_g, totals.carbs_g])
+        if not complete and meal.calories > 0:
+            # Часть приема пищи известна только по значениям модели: она масштабируется целиком
+            stated = np.array([getattr(meal, field) for field in MEAL_FIELDS])
+            values = values + scale * np.maximum(stated - meal_known, 0.0)
+        for field, value in zip(MEAL_FIELDS, values.tolist()):
+            setattr(meal, field, round(value, 1))
+    recompute_day_totals(day)
+
+
+def retarget_plan(
+    plan: WeeklyMealPlan,
+    nutrition: NutritionAnalysis,
+    db: Optional[FoodDatabase] = None
+) -> WeeklyMealPlan:
+    """
+    Пересчитывает порции плана под новую норму (план изменяется на месте).
+    
+    Args:
+        plan: Недельный план
+        nutrition: Новая норма калорий и макронутриентов
+        db: База продуктов; по умолчанию встроенная
+        
+    Returns:
+        WeeklyMealPlan: Тот же план с новыми количествами, значениями
+        приемов пищи и итогами дней
+    """
+    import numpy as np
+    
+    db = db or get_food_db()
+    target = np.array([nutrition.daily_calories, nutrition.protein_g, nutrition.fats_g, nutrition.carbs_g])
+    for day in plan.week_plan:
+        _retarget_day(db, day, target)
+    return plan
+
+
+def retarget_plans(
+    plans: List[WeeklyMealPlan],
+    nutrition: List[NutritionAnalysis],
+    db: Optional[FoodDatabase] = None
+) -> List[WeeklyMealPlan]:
+    """
+    Пересчитывает порции нескольких планов (каждый под свою норму, на месте).
+    
+    Args:
+        plans: Недельные планы
+        nutrition: Нормы в порядке планов
+        db: База продуктов; по умолчанию встроенная
+        
+    Returns:
+        List: Те же планы
+    """
+    db = db or get_food_db()
+    return [retarget_plan(plan, target, db) for plan, target in zip(plans, nutrition)]
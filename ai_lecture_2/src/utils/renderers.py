@@ -0,0 +1,299 @@
+"""
+Экспорт плана питания в Markdown, JSON, CSV и HTML.
+
+Каждый документ собирается в памяти и записывается одной операцией.
+Путь (или поток) передается на каждый запуск, а запись в файл идет через
+временный файл, поэтому параллельные запуски не портят файлы друг друга.
+Пакетный экспорт распределяет планы по процессам.
+"""
+import csv
+import html
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple, Union
+
+
+PathOrStream = Union[str, "os.PathLike[str]", TextIO]
+
+# Формат -> расширение файла
+EXTENSIONS = {"md": "md", "json": "json", "csv": "csv", "html": "html"}
+CSV_COLUMNS = ("day", "meal", "time", "foods", "calories", "protein_g", "fats_g", "carbs_g")
+EXPORT_CHUNK_SIZE = 64
+
+
+def _macros(calories: float, protein: float, fats: float, carbs: float, separator: str) -> str:
+    return f"{calories:.0f} ккал{separator}Б: {protein:.0f}г{separator}Ж: {fats:.0f}г{separator}У: {carbs:.0f}г"
+
+
+def render_markdown(weekly_plan: Dict[str, Any]) -> str:
+    """
+    Собирает план в Markdown.
+    
+    Args:
+        weekly_plan: Словарь с недельным планом
+        
+    Returns:
+        str: Документ Markdown
+    """
+    parts = ["# 📋 Персональный план питания\n\n", f"{weekly_plan['summary']}\n\n"]
+    for day_plan in weekly_plan['week_plan']:
+        parts.append(
+            f"## 📅 {day_plan['day']}\n\n"
+            f"**Итого за день:** {day_plan['total_calories']:.0f} ккал "
+            f"(Б: {day_plan['total_protein_g']:.0f}г, "
+            f"Ж: {day_plan['total_fats_g']:.0f}г, "
+            f"У: {day_plan['total_carbs_g']:.0f}г)\n\n"
+        )
+        for meal in day_plan['meals']:
+            parts.append(
+                f"### {meal['name']} ({meal['time']})\n\n"
+                f"**Калории:** {meal['calories']:.0f} ккал | "
+                f"Б: {meal['protein_g']:.0f}г | "
+                f"Ж: {meal['fats_g']:.0f}г | "
+                f"У: {meal['carbs_g']:.0f}г\n\n"
+                "**Продукты:**\n"
+            )
+            parts.extend(f"- {food}\n" for food in meal['foods'])
+            parts.append("\n")
+        parts.append("---\n\n")
+    return "".join(parts)
+
+
+def render_json(weekly_plan: Dict[str, Any], indent: Optional[int] = None) -> str:
+    """
+    Собирает план в JSON (по умолчанию компактный).
+    
+    Args:
+        weekly_plan: Словарь с недельным планом
+        indent: Отступ для читаемого JSON; None - без пробелов и переносов
+        
+    Returns:
+        str: Документ JSON
+    """
+    if indent is None:
+        return json.dumps(weekly_plan, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(weekly_plan, ensure_ascii=False, indent=indent)
+
+
+def render_csv(weekly_plan: Dict[str, Any]) -> str:
+    """
+    Собирает план в CSV: одна строка на прием пищи.
+    
+    Args:
+        weekly_plan: Словарь с недельным планом
+        
+    Returns:
+        str: Документ CSV (продукты через "; ")
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(CSV_COLUMNS)
+    writer.writerows(
+        (
+            day_plan['day'], meal['name'], meal['time'], "; ".join(meal['foods']),
+            round(meal['calories'], 1), round(meal['protein_g'], 1),
+            round(meal['fats_g'], 1), round(meal['carbs_g'], 1)
+        )
+        for day_plan in weekly_plan['week_plan']
+        for meal in day_plan['meals']
+    )
+    return buffer.getvalue()
+
+
+def render_html(weekly_plan: Dict[str, Any]) -> str:
+    """
+    Собирает план в самостоятельную HTML страницу.
+    
+    Args:
+        weekly_plan: Словарь с недельным планом
+        
+    Returns:
+        str: Документ HTML
+    """
+    escape = html.escape
+    parts = [
+        "<!DOCTYPE html>\n<html lang=\"ru\">\n<head>\n<meta charset=\"utf-8\">\n"
+        "<title>Персональный план питания</title>\n"
+        "<style>body{font-family:sans-serif;max-width:960px;margin:auto}"
+        "table{border-collapse:collapse;width:100%;margin-bottom:1em}"
+        "th,td{border:1px solid #ccc;padding:4px 8px;text-align:left;vertical-align:top}</style>\n"
+        "</head>\n<body>\n<h1>📋 Персональный план питания</h1>\n",
+        f"<p>{escape(weekly_plan['summary'])}</p>\n"
+    ]
+    for day_plan in weekly_plan['week_plan']:
+        totals = _macros(
+            day_plan['total_calories'], day_plan['total_protein_g'],
+            day_plan['total_fats_g'], day_plan['total_carbs_g'], ", "
+        )
+        parts.append(
+            f"<h2>📅 {escape(day_plan['day'])}</h2>\n<p><b>Итого за день:</b> {totals}</p>\n"
+            "<table>\n<tr><th>Прием пищи</th><th>Время</th><th>Продукты</th><th>Калории и БЖУ</th></tr>\n"
+        )
+        for meal in day_plan['meals']:
+            foods = "<br>".join(escape(food) for food in meal['foods'])
+            macros = _macros(meal['calories'], meal['protein_g'], meal['fats_g'], meal['carbs_g'], "<br>")
+            parts.append(
+                f"<tr><td>{escape(meal['name'])}</td><td>{escape(meal['time'])}</td>"
+                f"<td>{foods}</td><td>{macros}</td></tr>\n"
+            )
+        parts.append("</table>\n")
+    parts.append("</body>\n</html>\n")
+    return "".join(parts)
+
+
+RENDERERS: Dict[str, Callable[[Dict[str, Any]], str]] = {
+    "md": render_markdown,
+    "json": render_json,
+    "csv": render_csv,
+    "html": render_html,
+}
+
+
+def render(weekly_plan: Dict[str, Any], fmt: str) -> str:
+    """
+    Собирает план в заданном формате.
+    
+    Args:
+        weekly_plan: Словарь с недельным планом
+        fmt: Формат: md, json, csv или html
+        
+    Returns:
+        str: Документ
+        
+    Raises:
+        ValueError: Если формат неизвестен
+    """
+    renderer = RENDERERS.get(fmt)
+    if renderer is None:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt}. Доступны: {', '.join(RENDERERS)}")
+    return renderer(weekly_plan)
+
+
+def _format_from_path(path: str) -> str:
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    return "md" if extension == "markdown" else extension
+
+
+def _write_file(path: str, document: str) -> None:
+    """Пишет документ во временный файл и атомарно подменяет им целевой."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # Уникальное имя: один путь могут писать несколько потоков одного процесса (arun_many)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8", newline="") as f:
+            f.write(document)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def export_plan(weekly_plan: Dict[str, Any], target: PathOrStream, fmt: Optional[str] = None) -> None:
+    """
+    Экспортирует план в файл или поток.
+    
+    Args:
+        weekly_plan: Словарь с недельным планом
+        target: Путь к файлу или открытый текстовый поток
+        fmt: Формат; по умолчанию определяется по расширению файла
+        
+    Raises:
+        ValueError: Если формат неизвестен или не задан для потока
+    """
+    if hasattr(target, "write"):
+        if fmt is None:
+            raise ValueError("Для экспорта в поток нужно указать формат")
+        target.write(render(weekly_plan, fmt))
+        return
+    path = os.fspath(target)
+    _write_file(path, render(weekly_plan, fmt or _format_from_path(path)))
+
+
+def plan_filename(name: str, fmt: str, directory: str = ".") -> str:
+    """
+    Путь к файлу плана конкретного запуска.
+    
+    Args:
+        name: Уникальное имя плана (run_id или номер записи)
+        fmt: Формат экспорта
+        directory: Каталог для файлов
+        
+    Returns:
+        str: Путь вида <directory>/meal_plan_<name>.<ext>
+    """
+    return os.path.join(directory, f"meal_plan_{name}.{EXTENSIONS[fmt]}")
+
+
+def _export_chunk(chunk: List[Tuple[str, Dict[str, Any]]], directory: str, formats: Sequence[str]) -> int:
+    """Экспортирует часть планов в процессе пула; возвращает число файлов."""
+    written = 0
+    for name, weekly_plan in chunk:
+        for fmt in formats:
+            _write_file(plan_filename(name, fmt, directory), render(weekly_plan, fmt))
+            written += 1
+    return written
+
+
+def _chunks(plans: Iterable[Tuple[str, Dict[str, Any]]], size: int) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+    chunk: List[Tuple[str, Dict[str, Any]]] = []
+    for item in plans:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_batch(
+    plans: Iterable[Tuple[str, Dict[str, Any]]],
+    directory: str,
+    formats: Sequence[str] = ("md",),
+    workers: Optional[int] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE
+) -> int:
+    """
+    Экспортирует много планов в пуле процессов.
+    
+    Планы передаются процессам частями по chunk_size, а в работе
+    одновременно не больше двух частей на процесс, поэтому входные данные
+    можно читать потоком.
+    
+    Args:
+        plans: Пары (уникальное имя, словарь плана)
+        directory: Каталог для файлов
+        formats: Форматы экспорта
+        workers: Число процессов; 1 - без пула, по умолчанию по числу CPU
+        chunk_size: Планов в одной задаче процесса
+        
+    Returns:
+        int: Число записанных файлов
+        
+    Raises:
+        ValueError: Если формат неизвестен
+    """
+    unknown = [fmt for fmt in formats if fmt not in RENDERERS]
+    if unknown:
+        raise ValueError(f"Неизвестный формат экспорта: {', '.join(unknown)}. Доступны: {', '.join(RENDERERS)}")
+    os.makedirs(directory, exist_ok=True)
+    
+    chunks = _chunks(plans, chunk_size)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return sum(_export_chunk(chunk, directory, formats) for chunk in chunks)
+    
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(_export_chunk, chunk, directory, formats))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                written += sum(future.result() for future in done)
+        written += sum(future.result() for future in pending)
+    return written
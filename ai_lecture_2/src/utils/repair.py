@@ -0,0 +1,153 @@
+"""
+Локальное исправление JSON ответов модели без повторного запроса.
+
+Модель иногда оборачивает JSON в код-блок, оставляет висячие запятые или
+обрывает ответ на середине массива. Дефекты формата чинятся здесь; из
+оборванного ответа извлекаются только завершенные элементы, а недописанные
+перезапрашиваются.
+"""
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL)
+_CLOSING = {"{": "}", "[": "]"}
+
+
+def _strip_fences(text: str) -> str:
+    """Извлекает содержимое код-блока и отбрасывает текст до первой скобки."""
+    match = _FENCE.search(text)
+    if match:
+        text = match.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    return text[min(starts):] if starts else text
+
+
+def _scan(text: str) -> Tuple[str, List[str], bool, List[Tuple[int, List[str]]]]:
+    """
+    Проходит по тексту, удаляя висячие запятые.
+    
+    Returns:
+        Tuple: (текст без висячих запятых, открытые скобки в конце,
+            оборвался ли текст внутри строки, безопасные точки обрыва
+            (позиция в результате, открытые скобки в ней))
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    safe_points: List[Tuple[int, List[str]]] = []
+    in_string = False
+    escape = False
+    pending_comma: Optional[int] = None
+    
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char.isspace():
+            out.append(char)
+            continue
+        if char in "}]":
+            # Висячая запятая перед закрывающей скобкой
+            if pending_comma is not None:
+                out[pending_comma] = ""
+            pending_comma = None
+            if stack:
+                stack.pop()
+            out.append(char)
+            safe_points.append((len(out), list(stack)))
+            continue
+        if char == ",":
+            # Обрыв перед запятой оставляет только завершенные элементы
+            safe_points.append((len(out), list(stack)))
+            pending_comma = len(out)
+            out.append(char)
+            continue
+        pending_comma = None
+        if char in "{[":
+            stack.append(char)
+        elif char == '"':
+            in_string = True
+        out.append(char)
+    return "".join(out), stack, in_string, safe_points
+
+
+def _close(text: str, stack: List[str]) -> str:
+    return text.rstrip().rstrip(",") + "".join(_CLOSING[c] for c in reversed(stack))
+
+
+def repair_json(text: str) -> str:
+    """
+    Исправляет типичные дефекты JSON ответа модели.
+    
+    Убирает код-блоки и текст вокруг JSON и висячие запятые. Оборванный
+    ответ не закрывается: недописанный объект с умолчаниями схемы прошел бы
+    проверку как полный (см. truncate_json).
+    
+    Args:
+        text: Ответ модели
+        
+    Returns:
+        str: Исправленный JSON (или текст без дефектов формата, если ответ оборван)
+    """
+    return _scan(_strip_fences(text).strip())[0]
+
+
+def truncate_json(text: str) -> Optional[str]:
+    """
+    Обрезает оборванный JSON до последнего завершенного элемента.
+    
+    Обрезка допускается только там, где открыты корневой объект и массивы:
+    вложенный объект (день, прием пищи), на котором оборвался ответ,
+    отбрасывается целиком, а не закрывается с недостающими полями.
+    
+    Args:
+        text: Ответ модели
+        
+    Returns:
+        Optional[str]: Обрезанный JSON или None, если обрезать негде
+    """
+    cleaned, stack, in_string, safe_points = _scan(_strip_fences(text).strip())
+    if not stack and not in_string:
+        return cleaned
+    for position, open_brackets in reversed(safe_points):
+        if any(bracket != "[" for bracket in open_brackets[1:]):
+            continue
+        candidate = _close(cleaned[:position], open_brackets)
+        if _is_json(candidate):
+            return candidate
+    return None
+
+
+def _is_json(text: str) -> bool:
+    try:
+        json.loads(text)
+    except ValueError:
+        return False
+    return True
+
+
+def loads_lenient(text: str) -> Optional[Any]:
+    """
+    Разбирает JSON ответа модели после локального исправления; оборванный
+    ответ обрезается до последнего завершенного элемента (truncate_json).
+    
+    Args:
+        text: Ответ модели
+        
+    Returns:
+        Разобранное значение или None, если JSON не удалось восстановить
+    """
+    truncated = truncate_json(text)
+    if truncated is None:
+        return None
+    try:
+        return json.loads(truncated)
+    except ValueError:
+        return None
@@ -0,0 +1,464 @@
+"""
+Общий планировщик запросов к модели с учетом квот провайдера.
+
+Все вызовы модели агентов процесса проходят через один RequestScheduler:
+- корзины токенов ограничивают запросы и токены в минуту (квоты Gemini);
+- очередь ожидающих упорядочена по классу приоритета: интерактивные запросы
+  (main.py) обслуживаются раньше пакетных (batch.py), внутри класса - по
+  порядку поступления;
+- число одновременных запросов подбирается по AIMD: растет на 1 за каждые
+  limit успешных ответов и уменьшается вдвое после 429 или при задержке
+  ответа выше целевой;
+- глубина очереди, число выполняющихся запросов, лимит и время ожидания
+  пишутся в метрики.
+
+Класс приоритета задается контекстом (llm_priority) и наследуется
+асинхронными задачами, созданными внутри него; так же задается оценка
+токенов ответа (llm_response_tokens). Разрешение берет клиент провайдера
+(ScheduledLLM в src/utils/llm_backends.py), поэтому ответы из кэша не
+занимают места в очереди.
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.utils.config import get_settings
+from src.utils.metrics import get_metrics
+
+
+# Доля квоты в минуту, которую можно отправить сразу, без равномерного распределения
+BURST = 0.1
+# Классы приоритета: меньше - раньше
+PRIORITIES = {"interactive": 0, "batch": 1}
+DEFAULT_PRIORITY = "interactive"
+# Оценка токенов ответа для квоты, пока ответ не получен (уточняется по ответу)
+DEFAULT_RESPONSE_TOKENS = 1024
+
+current_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default=DEFAULT_PRIORITY)
+current_response_tokens: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "llm_response_tokens", default=DEFAULT_RESPONSE_TOKENS
+)
+
+_RATE_LIMITED = re.compile(r"\b429\b|rate limit|resource exhausted|quota", re.IGNORECASE)
+_RATE_LIMIT_ERRORS = {"ResourceExhausted", "TooManyRequests", "RateLimitError"}
+
+
+@contextlib.contextmanager
+def llm_priority(priority: str):
+    """
+    Делает priority классом приоритета запросов к модели внутри блока.
+    
+    Args:
+        priority: interactive или batch
+        
+    Raises:
+        ValueError: Если класс неизвестен
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Неизвестный приоритет: {priority}. Доступны: {', '.join(PRIORITIES)}")
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+@contextlib.contextmanager
+def llm_response_tokens(tokens: int):
+    """
+    Делает tokens оценкой токенов ответа для запросов к модели внутри блока.
+    
+    Args:
+        tokens: Ожидаемая длина ответа в токенах
+    """
+    token = current_response_tokens.set(tokens)
+    try:
+        yield
+    finally:
+        current_response_tokens.reset(token)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Ошибка означает превышение квоты провайдера (HTTP 429)."""
+    if any(cls.__name__ in _RATE_LIMIT_ERRORS for cls in type(error).__mro__):
+        return True
+    return bool(_RATE_LIMITED.search(str(error)))
+
+
+class TokenBucket:
+    """
+    Корзина токенов под квоту limit за period_s секунд.
+    
+    Провайдер считает квоту в скользящем окне, поэтому запас и пополнение за
+    период вместе не превышают limit: запас - доля burst квоты, остальное
+    пополняется равномерно.
+    """
+    
+    def __init__(self, limit: float, period_s: float = 60.0, burst: float = BURST):
+        """
+        Инициализация корзины.
+        
+        Args:
+            limit: Квота за период; 0 - без ограничения
+            period_s: Длина периода, с
+            burst: Доля квоты, доступная сразу
+        """
+        self.capacity = max(1.0, limit * burst) if limit > 0 else 0.0
+        # Не меньше одного токена за период: при квоте 1 запрос в минуту корзина все равно пополняется
+        self.rate = max(limit - self.capacity, 1.0) / period_s if limit > 0 else 0.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+    
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount: float, now: float) -> float:
+        """Сколько секунд ждать, пока в корзине наберется amount (больше запаса - до полной корзины)."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+    
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self.tokens -= amount
+    
+    def adjust(self, amount: float) -> None:
+        """Возвращает (amount > 0) или доначисляет (amount < 0) токены после уточнения расхода."""
+        if not self.unlimited:
+            self.tokens = min(self.capacity, self.tokens + amount)
+    
+    def drain(self) -> None:
+        """Опустошает корзину (провайдер ответил 429 - его окно уже исчерпано)."""
+        if not self.unlimited:
+            self.tokens = min(self.tokens, 0.0)
+
+
+class Slot:
+    """Разрешение на один запрос; tokens уточняется после ответа модели."""
+    
+    def __init__(self, priority: str, tokens: int):
+        self.priority = priority
+        self.estimated = tokens
+        self.tokens = tokens
+        self.granted = False
+        self.waited = 0.0
+        self._event = threading.Event()
+        self._future: Optional[Tuple[asyncio.AbstractEventLoop, "asyncio.Future"]] = None
+    
+    def _wake(self) -> None:
+        self._event.set()
+        if self._future is not None:
+            loop, future = self._future
+            loop.call_soon_threadsafe(_resolve, future)
+
+
+def _resolve(future: "asyncio.Future") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class RequestScheduler:
+    """
+    Очередь запросов к модели с корзинами токенов, приоритетами и
+    адаптивным лимитом одновременных запросов.
+    
+    Безопасен для использования из нескольких потоков и event loop.
+    """
+    
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = 32,
+        min_concurrency: int = 1,
+        latency_target: float = 0,
+        adaptive: bool = True,
+        period_s: float = 60.0
+    ):
+        """
+        Инициализация планировщика.
+        
+        Args:
+            requests_per_minute: Квота запросов в минуту; 0 - без ограничения
+            tokens_per_minute: Квота токенов (промпт + ответ) в минуту; 0 - без ограничения
+            max_concurrency: Верхняя граница одновременных запросов
+            min_concurrency: Нижняя граница адаптивного лимита
+            latency_target: Задержка ответа (с), выше которой лимит снижается; 0 - не учитывать
+            adaptive: Подбирать лимит по 429 и задержкам; иначе лимит равен max_concurrency
+            period_s: Длина окна квот, с (короче минуты - в бенчмарке)
+        """
+        self.requests = TokenBucket(requests_per_minute, period_s)
+        self.tokens = TokenBucket(tokens_per_minute, period_s)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.latency_target = latency_target
+        self.adaptive = adaptive
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.throttled = 0
+        self._queue: List[Tuple[int, int, Slot]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        # Лимит снижается не чаще раза за время ответа: 429 одной волны запросов считаются одним сигналом
+        self._decreased_at = 0.0
+    
+    def _depth(self) -> Dict[str, int]:
+        depth = {priority: 0 for priority in PRIORITIES}
+        for _, _, slot in self._queue:
+            depth[slot.priority] += 1
+        return depth
+    
+    def _report(self) -> None:
+        """Пишет текущее состояние очереди в метрики (вызывается под блокировкой)."""
+        metrics = get_metrics()
+        for priority, depth in self._depth().items():
+            metrics.set("llm_queue_depth", depth, priority=priority)
+        metrics.set("llm_in_flight", self.in_flight)
+        metrics.set("llm_concurrency_limit", int(self.limit))
+    
+    def _dispatch(self, caller: Optional[Slot] = None) -> float:
+        """
+        Выдает разрешения голове очереди, пока позволяют лимиты.
+        
+        Args:
+            caller: Запрос, ожидающий проверки в текущем потоке
+            
+        Returns:
+            float: Сколько секунд ждать пополнения корзин (0 - ждать освобождения места)
+        """
+        wait = 0.0
+        now = time.monotonic()
+        while self._queue and self.in_flight < int(self.limit):
+            slot = self._queue[0][2]
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(slot.tokens, now))
+            if wait > 0:
+                # Голова очереди ждет пополнения корзин по таймеру: будим ее, чтобы она его завела
+                if slot is not caller:
+                    slot._wake()
+                break
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(slot.tokens)
+            self.in_flight += 1
+            slot.granted = True
+            slot._wake()
+        self._report()
+        return wait
+    
+    def _enqueue(self, tokens: int) -> Slot:
+        priority = current_priority.get()
+        slot = Slot(priority, tokens)
+        with self._lock:
+            heapq.heappush(self._queue, (PRIORITIES[priority], next(self._sequence), slot))
+        return slot
+    
+    def _poll(self, slot: Slot) -> Optional[float]:
+        """
+        Проверяет очередь от имени ожидающего запроса.
+        
+        Returns:
+            Optional[float]: Сколько ждать до следующей проверки; None - до пробуждения
+        """
+        with self._lock:
+            wait = self._dispatch(slot)
+        return wait if wait > 0 else None
+    
+    def _cancel(self, slot: Slot) -> None:
+        """Убирает из очереди запрос, ожидание которого прервано."""
+        with self._lock:
+            if slot.granted:
+                self._finish(slot, failed=True, throttled=False, latency=0.0)
+            else:
+                self._queue = [entry for entry in self._queue if entry[2] is not slot]
+                heapq.heapify(self._queue)
+            self._dispatch()
+    
+    def _granted(self, slot: Slot, enqueued: float) -> None:
+        slot.waited = time.perf_counter() - enqueued
+        get_metrics().observe("llm_queue_wait_seconds", slot.waited, priority=slot.priority)
+    
+    def acquire(self, tokens: int = 0) -> Slot:
+        """
+        Ждет разрешения на запрос (блокирует поток).
+        
+        Args:
+            tokens: Оценка токенов запроса (промпт + ответ)
+            
+        Returns:
+            Slot: Разрешение; его нужно вернуть через release
+        """
+        enqueued = time.perf_counter()
+        slot = self._enqueue(tokens)
+        try:
+            while True:
+                wait = self._poll(slot)
+                if slot.granted:
+                    break
+                slot._event.wait(wait)
+                slot._event.clear()
+        except BaseException:
+            self._cancel(slot)
+            raise
+        self._granted(slot, enqueued)
+        return slot
+    
+    async def aacquire(self, tokens: int = 0) -> Slot:
+        """Асинхронная версия acquire: ожидание не блокирует event loop."""
+        enqueued = time.perf_counter()
+        slot = self._enqueue(tokens)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                future = loop.create_future()
+                slot._future = (loop, future)
+                wait = self._poll(slot)
+                if slot.granted:
+                    break
+                try:
+                    await asyncio.wait_for(future, wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._cancel(slot)
+            raise
+        self._granted(slot, enqueued)
+        return slot
+    
+    def _finish(self, slot: Slot, failed: bool, throttled: bool, latency: float) -> None:
+        """Возвращает место и корректирует лимит (вызывается под блокировкой)."""
+        self.in_flight -= 1
+        self.tokens.adjust(slot.estimated - slot.tokens)
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        slow = self.latency_target > 0 and latency > self.latency_target
+        if throttled or slow:
+            # Мультипликативное снижение, не чаще раза за время ответа
+            if now - self._decreased_at > latency:
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                self._decreased_at = now
+        elif not failed:
+            # Аддитивный рост: +1 за limit успешных ответов
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+    
+    def release(self, slot: Slot, error: Optional[BaseException] = None, latency: float = 0.0) -> None:
+        """
+        Возвращает разрешение после ответа модели.
+        
+        Args:
+            slot: Разрешение из acquire
+            error: Ошибка запроса, если он не удался
+            latency: Длительность запроса, с
+        """
+        throttled = error is not None and is_rate_limited(error)
+        with self._lock:
+            if throttled:
+                self.throttled += 1
+                self.requests.drain()
+            self._finish(slot, failed=error is not None, throttled=throttled, latency=latency)
+            self._dispatch()
+        if throttled:
+            get_metrics().inc("llm_throttled_total", priority=slot.priority)
+    
+    @contextlib.contextmanager
+    def slot(self, tokens: int = 0) -> Iterator[Slot]:
+        """
+        Разрешение на запрос на время блока.
+        
+        Ошибки блока (в том числе 429) учитываются при подборе лимита.
+        Уточненный расход можно записать в slot.tokens.
+        
+        Args:
+            tokens: Оценка токенов запроса
+        """
+        slot = self.acquire(tokens)
+        started = time.perf_counter()
+        try:
+            yield slot
+        except BaseException as error:
+            self.release(slot, error, time.perf_counter() - started)
+            raise
+        self.release(slot, latency=time.perf_counter() - started)
+    
+    @contextlib.asynccontextmanager
+    async def aslot(self, tokens: int = 0):
+        """Асинхронная версия slot."""
+        slot = await self.aacquire(tokens)
+        started = time.perf_counter()
+        try:
+            yield slot
+        except BaseException as error:
+            self.release(slot, error, time.perf_counter() - started)
+            raise
+        self.release(slot, latency=time.perf_counter() - started)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Возвращает состояние планировщика.
+        
+        Returns:
+            Dict: Текущий лимит, выполняющиеся запросы, глубина очереди по
+            приоритетам и число ответов 429
+        """
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "queued": self._depth(),
+                "throttled": self.throttled
+            }
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """
+    Возвращает общий планировщик процесса (создается из настроек при первом вызове).
+    
+    Returns:
+        RequestScheduler: Планировщик запросов к модели
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                settings = get_settings()
+                _scheduler = RequestScheduler(
+                    requests_per_minute=settings.llm_rpm,
+                    tokens_per_minute=settings.llm_tpm,
+                    max_concurrency=settings.llm_max_concurrency,
+                    min_concurrency=settings.llm_min_concurrency,
+                    latency_target=settings.llm_latency_target
+                )
+    return _scheduler
+
+
+def configure_scheduler(scheduler: RequestScheduler) -> RequestScheduler:
+    """
+    Заменяет общий планировщик (например, в бенчмарке с другими квотами).
+    
+    Args:
+        scheduler: Новый планировщик
+        
+    Returns:
+        RequestScheduler: Тот же планировщик
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
+    return scheduler
@@ -0,0 +1,214 @@
+"""
+Список покупок: суммирование количества продуктов по планам питания.
+
+Строки продуктов разбираются парсером базы продуктов (src/utils/food_db.py):
+количество приводится к граммам, миллилитрам или штукам, а синонимы
+(«Индейка филе» и «Филе индейки») сводятся к одному названию из таблицы.
+Агрегатор проходит по планам один раз, поэтому подходит и для одной
+недели, и для семьи, и для всего пакетного запуска.
+"""
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.utils.food_db import GRAMS, MILLILITERS, PIECES, FoodDatabase, get_food_db, parse_quantity
+from src.utils.validation import PlanLike
+
+
+# Порядок единиц в выводе количества
+UNIT_ORDER = (GRAMS, MILLILITERS, PIECES)
+
+_PARENS = re.compile(r"\([^)]*\)|[()]")
+_NOISE = re.compile(r"[\s,.;:!\-–—]+")
+
+
+def _product_name(text: str) -> str:
+    """Название продукта, которого нет в таблице: без количества, скобок и знаков."""
+    name = _NOISE.sub(" ", _PARENS.sub(" ", text)).strip().lower().replace("ё", "е")
+    return name[:1].upper() + name[1:]
+
+
+def format_amount(amounts: Dict[str, float]) -> str:
+    """
+    Форматирует количество продукта: «1.2 кг», «350 г + 2 шт», «1.5 л».
+    
+    Args:
+        amounts: Количество по базовым единицам (г, мл, шт)
+        
+    Returns:
+        str: Количество для вывода
+    """
+    parts = []
+    for unit in UNIT_ORDER:
+        value = amounts.get(unit)
+        if not value:
+            continue
+        if unit == GRAMS and value >= 1000:
+            parts.append(f"{value / 1000:.1f} кг")
+        elif unit == MILLILITERS and value >= 1000:
+            parts.append(f"{value / 1000:.1f} л")
+        elif unit == PIECES:
+            # Штуки округляются вверх: половину яблока не купить
+            parts.append(f"{math.ceil(round(value, 6))} {unit}")
+        else:
+            parts.append(f"{value:.0f} {unit}")
+    return " + ".join(parts)
+
+
+@dataclass
+class ShoppingItem:
+    """Продукт в списке покупок."""
+    product: str
+    amounts: Dict[str, float] = field(default_factory=dict)
+    mentions: int = 0
+    portion_g: Optional[float] = None
+    
+    def merged_amounts(self) -> Dict[str, float]:
+        """
+        Количество по единицам; у продуктов из таблицы граммы и миллилитры
+        рядом со штуками пересчитываются в штуки по весу порции.
+        """
+        if not self.portion_g or PIECES not in self.amounts or len(self.amounts) == 1:
+            return dict(self.amounts)
+        weight = sum(value for unit, value in self.amounts.items() if unit != PIECES)
+        return {PIECES: self.amounts[PIECES] + weight / self.portion_g}
+    
+    @property
+    def amount(self) -> str:
+        return format_amount(self.merged_amounts())
+
+
+def _meals(plan: PlanLike) -> Iterator[List[str]]:
+    """Списки продуктов приемов пищи плана (модель или словарь)."""
+    if isinstance(plan, dict):
+        for day in plan["week_plan"]:
+            for meal in day["meals"]:
+                yield meal["foods"]
+    else:
+        for day in plan.week_plan:
+            for meal in day.meals:
+                yield meal.foods
+
+
+class ShoppingListAggregator:
+    """
+    Потоковое суммирование продуктов по планам.
+    
+    Разбор каждой уникальной строки продукта выполняется один раз; дальше
+    на каждую строку приходится поиск в словаре и сложение.
+    """
+    
+    def __init__(self, db: Optional[FoodDatabase] = None):
+        """
+        Инициализация агрегатора.
+        
+        Args:
+            db: База продуктов; по умолчанию встроенная
+        """
+        self.db = db or get_food_db()
+        self.plans = 0
+        self._items: Dict[str, ShoppingItem] = {}
+        self._parsed: Dict[str, Tuple[Tuple[str, str, float, Optional[float]], ...]] = {}
+    
+    def _parse(self, text: str) -> Tuple[Tuple[str, str, float, Optional[float]], ...]:
+        """Разбирает строку продукта в кортежи (продукт, единица, количество, вес порции)."""
+        entries = []
+        for portion in self.db.parse(text):
+            if portion.row is not None:
+                product, portion_g = portion.food, float(self.db.portions[portion.row])
+            else:
+                product, portion_g = _product_name(parse_quantity(portion.text)[2]), None
+            if not product:
+                continue
+            if portion.unit is None:
+                # Количество не указано: для известного продукта - стандартная порция
+                unit, amount = (GRAMS, portion.grams) if portion.row is not None else (PIECES, 1.0)
+            else:
+                unit, amount = portion.unit, portion.amount
+            entries.append((product, unit, amount, portion_g))
+        return tuple(entries)
+    
+    def add_foods(self, foods: Iterable[str]) -> None:
+        """
+        Добавляет продукты одного приема пищи.
+        
+        Args:
+            foods: Строки продуктов с количеством
+        """
+        seen = set()
+        for text in foods:
+            entries = self._parsed.get(text)
+            if entries is None:
+                entries = self._parsed[text] = self._parse(text)
+            for product, unit, amount, portion_g in entries:
+                item = self._items.get(product)
+                if item is None:
+                    item = self._items[product] = ShoppingItem(product, portion_g=portion_g)
+                item.amounts[unit] = item.amounts.get(unit, 0.0) + amount
+                if product not in seen:
+                    seen.add(product)
+                    item.mentions += 1
+    
+    def add_plan(self, plan: PlanLike) -> None:
+        """
+        Добавляет все приемы пищи плана.
+        
+        Args:
+            plan: План (модель или словарь, например из JSONL пакетного запуска)
+        """
+        for foods in _meals(plan):
+            self.add_foods(foods)
+        self.plans += 1
+    
+    def add_plans(self, plans: Iterable[PlanLike]) -> "ShoppingListAggregator":
+        """
+        Добавляет планы за один проход (подходит для генераторов).
+        
+        Args:
+            plans: Планы
+            
+        Returns:
+            ShoppingListAggregator: Этот же агрегатор
+        """
+        for plan in plans:
+            self.add_plan(plan)
+        return self
+    
+    def items(self) -> List[ShoppingItem]:
+        """
+        Возвращает список покупок.
+        
+        Returns:
+            List: Продукты по убыванию числа приемов пищи, затем по названию
+        """
+        return sorted(self._items.values(), key=lambda item: (-item.mentions, item.product))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Список покупок для сохранения в JSON."""
+        return {
+            "plans": self.plans,
+            "items": [
+                {
+                    "product": item.product,
+                    "amounts": {unit: round(value, 1) for unit, value in item.merged_amounts().items()},
+                    "amount": item.amount,
+                    "mentions": item.mentions
+                }
+                for item in self.items()
+            ]
+        }
+
+
+def aggregate_shopping_list(plans: Iterable[PlanLike], db: Optional[FoodDatabase] = None) -> List[ShoppingItem]:
+    """
+    Собирает общий список покупок для нескольких планов.
+    
+    Args:
+        plans: Планы (например, недели всех членов семьи или генератор по JSONL)
+        db: База продуктов; по умолчанию встроенная
+        
+    Returns:
+        List: Продукты с суммарным количеством
+    """
+    return ShoppingListAggregator(db).add_plans(plans).items()
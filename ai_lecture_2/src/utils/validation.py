@@ -0,0 +1,315 @@
+"""
+Локальная проверка плана питания без повторного обращения к модели.
+
+Итоги дней пересчитываются из приемов пищи, а калорийность и макронутриенты
+сравниваются с нормой из NutritionAnalysis. Для одного плана проверка идет
+на чистом Python, для больших пакетов планов - на массивах numpy.
+"""
+import re
+from operator import itemgetter
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from src.models.schemas import (
+    DailyPlan,
+    NutritionAnalysis,
+    PlanValidationReport,
+    PlanViolation,
+    PreferencesAnalysis,
+    WeeklyMealPlan
+)
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# Допустимое отклонение калорийности дня от нормы (как в промпте FinalAgent)
+CALORIE_TOLERANCE_KCAL = 50.0
+# Допустимое относительное отклонение макронутриентов от нормы
+MACRO_TOLERANCE = 0.15
+# Допустимое расхождение итогов дня, указанных моделью, с суммой приемов пищи
+TOTALS_TOLERANCE = 1.0
+DAYS_IN_PLAN = 7
+
+# Порядок показателей в массивах: калории, белки, жиры, углеводы
+MEAL_FIELDS = ("calories", "protein_g", "fats_g", "carbs_g")
+TOTAL_FIELDS = ("total_calories", "total_protein_g", "total_fats_g", "total_carbs_g")
+MACRO_KINDS = ("protein", "fats", "carbs")
+MACRO_LABELS = {"protein": "Белки", "fats": "Жиры", "carbs": "Углеводы"}
+_meal_values = itemgetter(*MEAL_FIELDS)
+_total_values = itemgetter(*TOTAL_FIELDS)
+
+PlanLike = Union[WeeklyMealPlan, Dict[str, Any]]
+
+
+def _day_sums(day: DailyPlan) -> Tuple[float, float, float, float]:
+    """Сумма калорий и макронутриентов приемов пищи дня."""
+    calories = protein = fats = carbs = 0.0
+    for meal in day.meals:
+        calories += meal.calories
+        protein += meal.protein_g
+        fats += meal.fats_g
+        carbs += meal.carbs_g
+    return calories, protein, fats, carbs
+
+
+def recompute_totals(plan: WeeklyMealPlan) -> WeeklyMealPlan:
+    """
+    Заменяет итоги дней суммой приемов пищи (план изменяется на месте).
+    
+    Args:
+        plan: Недельный план
+        
+    Returns:
+        WeeklyMealPlan: Тот же план с пересчитанными итогами
+    """
+    for day in plan.week_plan:
+        recompute_day_totals(day)
+    return plan
+
+
+def recompute_day_totals(day: DailyPlan) -> DailyPlan:
+    """
+    Заменяет итоги дня суммой приемов пищи (день изменяется на месте).
+    
+    Args:
+        day: План на день
+        
+    Returns:
+        DailyPlan: Тот же день с пересчитанными итогами
+    """
+    for field, value in zip(TOTAL_FIELDS, _day_sums(day)):
+        setattr(day, field, round(value, 1))
+    return day
+
+
+def _days_violation(count: int) -> PlanViolation:
+    return PlanViolation(
+        kind="days",
+        expected=DAYS_IN_PLAN,
+        actual=count,
+        message=f"В плане {count} дней вместо {DAYS_IN_PLAN}"
+    )
+
+
+def _mismatch_violation(day: str, field: str, stated: float, actual: float) -> PlanViolation:
+    return PlanViolation(
+        day=day,
+        kind="totals_mismatch",
+        expected=round(actual, 1),
+        actual=round(stated, 1),
+        message=f"{field} = {stated:.0f}, а сумма приемов пищи {actual:.0f}"
+    )
+
+
+def _calories_violation(day: str, target: float, actual: float) -> PlanViolation:
+    return PlanViolation(
+        day=day,
+        kind="calories",
+        expected=round(target, 1),
+        actual=round(actual, 1),
+        message=f"Калорийность {actual:.0f} ккал при норме {target:.0f} ккал (отклонение {actual - target:+.0f})"
+    )
+
+
+def _macro_violation(day: str, kind: str, target: float, actual: float) -> PlanViolation:
+    deviation = (actual - target) / target * 100 if target else 0.0
+    return PlanViolation(
+        day=day,
+        kind=kind,
+        expected=round(target, 1),
+        actual=round(actual, 1),
+        message=f"{MACRO_LABELS[kind]}: {actual:.0f} г при норме {target:.0f} г ({deviation:+.0f}%)"
+    )
+
+
+def _normalize(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+
+def _restricted_pattern(restricted_foods: Sequence[str]) -> Optional["re.Pattern"]:
+    """Шаблон поиска запрещенных продуктов по началу слова."""
+    terms = sorted({_normalize(food).strip() for food in restricted_foods if food.strip()}, key=len, reverse=True)
+    if not terms:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")")
+
+
+def _restricted_violations(plan: WeeklyMealPlan, restricted_foods: Sequence[str]) -> List[PlanViolation]:
+    pattern = _restricted_pattern(restricted_foods)
+    if pattern is None:
+        return []
+    violations = []
+    for day in plan.week_plan:
+        for meal in day.meals:
+            for food in meal.foods:
+                match = pattern.search(_normalize(food))
+                if match:
+                    violations.append(PlanViolation(
+                        day=day.day,
+                        kind="restricted_food",
+                        message=f"{meal.name}: «{food}» содержит запрещенный продукт «{match.group(0)}»"
+                    ))
+    return violations
+
+
+def validate_plan(
+    plan: WeeklyMealPlan,
+    nutrition_analysis: NutritionAnalysis,
+    preferences_analysis: Optional[PreferencesAnalysis] = None,
+    calorie_tolerance: float = CALORIE_TOLERANCE_KCAL,
+    macro_tolerance: float = MACRO_TOLERANCE
+) -> PlanValidationReport:
+    """
+    Проверяет план питания.
+    
+    Проверяются число дней, совпадение итогов дня с суммой приемов пищи,
+    отклонение калорийности и макронутриентов (по сумме приемов пищи) от
+    нормы и, если передан анализ предпочтений, запрещенные продукты.
+    
+    Args:
+        plan: Недельный план
+        nutrition_analysis: Норма калорий и макронутриентов
+        preferences_analysis: Анализ предпочтений со списком запрещенных продуктов
+        calorie_tolerance: Допустимое отклонение калорийности, ккал
+        macro_tolerance: Допустимое относительное отклонение макронутриентов
+        
+    Returns:
+        PlanValidationReport: Результат проверки
+    """
+    violations = []
+    if len(plan.week_plan) != DAYS_IN_PLAN:
+        violations.append(_days_violation(len(plan.week_plan)))
+    
+    macro_targets = (nutrition_analysis.protein_g, nutrition_analysis.fats_g, nutrition_analysis.carbs_g)
+    for day in plan.week_plan:
+        sums = _day_sums(day)
+        for field, actual in zip(TOTAL_FIELDS, sums):
+            stated = getattr(day, field)
+            if abs(stated - actual) > TOTALS_TOLERANCE:
+                violations.append(_mismatch_violation(day.day, field, stated, actual))
+        
+        if abs(sums[0] - nutrition_analysis.daily_calories) > calorie_tolerance:
+            violations.append(_calories_violation(day.day, nutrition_analysis.daily_calories, sums[0]))
+        for kind, target, actual in zip(MACRO_KINDS, macro_targets, sums[1:]):
+            if target and abs(actual - target) / target > macro_tolerance:
+                violations.append(_macro_violation(day.day, kind, target, actual))
+    
+    if preferences_analysis is not None:
+        violations.extend(_restricted_violations(plan, preferences_analysis.restricted_foods))
+    
+    return PlanValidationReport(valid=not violations, violations=violations)
+
+
+def _as_dict(plan: PlanLike) -> Dict[str, Any]:
+    return plan.model_dump() if isinstance(plan, WeeklyMealPlan) else plan
+
+
+def plan_arrays(plans: Sequence[PlanLike]) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray", List[List[str]]]:
+    """
+    Переводит планы в массивы для векторизованной проверки.
+    
+    Args:
+        plans: Планы (модели или словари, например из JSON)
+        
+    Returns:
+        Tuple: (показатели приемов пищи [план, день, прием, 4],
+            итоги дней по версии модели [план, день, 4],
+            число дней в каждом плане [план],
+            названия дней)
+    """
+    import numpy as np
+    
+    dicts = [_as_dict(plan) for plan in plans]
+    # Значения собираются плоскими списками и переносятся в массивы одной операцией
+    meal_rows, meal_index = [], []
+    stated_rows, stated_index = [], []
+    day_names = []
+    max_meals = 0
+    for p, plan in enumerate(dicts):
+        names = []
+        for d, day in enumerate(plan["week_plan"]):
+            names.append(day["day"])
+            stated_rows.append(_total_values(day))
+            stated_index.append((p, d))
+            meals_of_day = day["meals"]
+            max_meals = max(max_meals, len(meals_of_day))
+            for m, meal in enumerate(meals_of_day):
+                meal_rows.append(_meal_values(meal))
+                meal_index.append((p, d, m))
+        day_names.append(names)
+    
+    day_counts = np.array([len(names) for names in day_names], dtype=np.int64)
+    max_days = int(day_counts.max()) if len(day_counts) else 0
+    meals = np.zeros((len(dicts), max_days, max_meals, len(MEAL_FIELDS)))
+    stated = np.zeros((len(dicts), max_days, len(TOTAL_FIELDS)))
+    if meal_rows:
+        p_idx, d_idx, m_idx = np.array(meal_index).T
+        meals[p_idx, d_idx, m_idx] = meal_rows
+    if stated_rows:
+        p_idx, d_idx = np.array(stated_index).T
+        stated[p_idx, d_idx] = stated_rows
+    return meals, stated, day_counts, day_names
+
+
+def validate_batch(
+    plans: Sequence[PlanLike],
+    targets: Union[Dict[str, Sequence[float]], Sequence[NutritionAnalysis]],
+    calorie_tolerance: float = CALORIE_TOLERANCE_KCAL,
+    macro_tolerance: float = MACRO_TOLERANCE
+) -> List[PlanValidationReport]:
+    """
+    Проверяет много планов сразу на массивах numpy.
+    
+    Проверки те же, что в validate_plan, кроме запрещенных продуктов.
+    
+    Args:
+        plans: Планы (модели или словари)
+        targets: Нормы для каждого плана: список NutritionAnalysis или словарь
+            массивов daily_calories, protein_g, fats_g, carbs_g (результат
+            calculate_nutrition_batch)
+        calorie_tolerance: Допустимое отклонение калорийности, ккал
+        macro_tolerance: Допустимое относительное отклонение макронутриентов
+        
+    Returns:
+        List: Отчеты в порядке планов
+    """
+    import numpy as np
+    
+    if not plans:
+        return []
+    if not isinstance(targets, dict):
+        targets = {
+            field: [getattr(target, field) for target in targets]
+            for field in ("daily_calories", "protein_g", "fats_g", "carbs_g")
+        }
+    target = np.column_stack([
+        np.asarray(targets[field], dtype=np.float64)
+        for field in ("daily_calories", "protein_g", "fats_g", "carbs_g")
+    ])
+    
+    meals, stated, day_counts, day_names = plan_arrays(plans)
+    sums = meals.sum(axis=2)
+    present = np.arange(sums.shape[1])[None, :] < day_counts[:, None]
+    
+    mismatch = (np.abs(stated - sums) > TOTALS_TOLERANCE) & present[:, :, None]
+    calories_off = (np.abs(sums[:, :, 0] - target[:, None, 0]) > calorie_tolerance) & present
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative = np.abs(sums[:, :, 1:] - target[:, None, 1:]) / target[:, None, 1:]
+    macros_off = (relative > macro_tolerance) & (target[:, None, 1:] > 0) & present[:, :, None]
+    
+    violations: List[List[PlanViolation]] = [[] for _ in plans]
+    for p in np.nonzero(day_counts != DAYS_IN_PLAN)[0]:
+        violations[p].append(_days_violation(int(day_counts[p])))
+    # Объекты нарушений создаются только для отмеченных ячеек
+    for p, d, f in zip(*np.nonzero(mismatch)):
+        violations[p].append(_mismatch_violation(
+            day_names[p][d], TOTAL_FIELDS[f], float(stated[p, d, f]), float(sums[p, d, f])
+        ))
+    for p, d in zip(*np.nonzero(calories_off)):
+        violations[p].append(_calories_violation(day_names[p][d], float(target[p, 0]), float(sums[p, d, 0])))
+    for p, d, f in zip(*np.nonzero(macros_off)):
+        violations[p].append(_macro_violation(
+            day_names[p][d], MACRO_KINDS[f], float(target[p, f + 1]), float(sums[p, d, f + 1])
+        ))
+    
+    return [PlanValidationReport(valid=not items, violations=items) for items in violations]
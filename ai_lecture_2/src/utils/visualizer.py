@@ -2,7 +2,10 @@
 Утилиты для визуализации результатов.
 """
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+from src.utils.renderers import export_plan
+from src.utils.shopping import ShoppingItem, aggregate_shopping_list
 
 
 def print_nutrition_analysis(analysis: Dict[str, Any]) -> None:
@@ -83,12 +86,13 @@ def print_daily_plan(day_plan: Dict[str, Any]) -> None:
           f"Углеводы: {day_plan['total_carbs_g']:.0f}г")
 
 
-def print_weekly_plan(weekly_plan: Dict[str, Any]) -> None:
+def print_weekly_plan(weekly_plan: Dict[str, Any], include_days: bool = True) -> None:
     """
     Красиво выводит недельный план.
     
     Args:
         weekly_plan: Словарь с недельным планом
+        include_days: Выводить ли дни (False, если они уже выведены по мере готовности)
     """
     print("\n" + "="*60)
     print("📋 НЕДЕЛЬНЫЙ ПЛАН ПИТАНИЯ")
@@ -96,8 +100,9 @@ def print_weekly_plan(weekly_plan: Dict[str, Any]) -> None:
     
     print(f"\n{weekly_plan['summary']}")
     
-    for day_plan in weekly_plan['week_plan']:
-        print_daily_plan(day_plan)
+    if include_days:
+        for day_plan in weekly_plan['week_plan']:
+            print_daily_plan(day_plan)
     
     # Статистика по неделе
     total_calories = sum(day['total_calories'] for day in weekly_plan['week_plan'])
@@ -119,33 +124,12 @@ def export_to_markdown(weekly_plan: Dict[str, Any], filename: str = "meal_plan.m
         weekly_plan: Словарь с недельным планом
         filename: Имя файла для сохранения
     """
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write("# 📋 Персональный план питания\n\n")
-        f.write(f"{weekly_plan['summary']}\n\n")
-        
-        for day_plan in weekly_plan['week_plan']:
-            f.write(f"## 📅 {day_plan['day']}\n\n")
-            f.write(f"**Итого за день:** {day_plan['total_calories']:.0f} ккал ")
-            f.write(f"(Б: {day_plan['total_protein_g']:.0f}г, ")
-            f.write(f"Ж: {day_plan['total_fats_g']:.0f}г, ")
-            f.write(f"У: {day_plan['total_carbs_g']:.0f}г)\n\n")
-            
-            for meal in day_plan['meals']:
-                f.write(f"### {meal['name']} ({meal['time']})\n\n")
-                f.write(f"**Калории:** {meal['calories']:.0f} ккал | ")
-                f.write(f"Б: {meal['protein_g']:.0f}г | ")
-                f.write(f"Ж: {meal['fats_g']:.0f}г | ")
-                f.write(f"У: {meal['carbs_g']:.0f}г\n\n")
-                f.write("**Продукты:**\n")
-                for food in meal['foods']:
-                    f.write(f"- {food}\n")
-                f.write("\n")
-            f.write("---\n\n")
+    export_plan(weekly_plan, filename, "md")
     
     print(f"\n💾 План экспортирован в Markdown: {filename}")
 
 
-def generate_shopping_list(weekly_plan: Dict[str, Any]) -> Dict[str, int]:
+def generate_shopping_list(weekly_plan: Dict[str, Any]) -> List[ShoppingItem]:
     """
     Генерирует список покупок из недельного плана.
     
@@ -153,22 +137,9 @@ def generate_shopping_list(weekly_plan: Dict[str, Any]) -> Dict[str, int]:
         weekly_plan: Словарь с недельным планом
         
     Returns:
-        Dict: Словарь с продуктами и их количеством (количество упоминаний)
+        List: Продукты с суммарным количеством и числом приемов пищи
     """
-    shopping_list = {}
-    
-    for day_plan in weekly_plan['week_plan']:
-        for meal in day_plan['meals']:
-            for food in meal['foods']:
-                # Извлекаем название продукта (до первой цифры или спец. символа)
-                product_name = food.split()[0] if food else food
-                
-                if product_name in shopping_list:
-                    shopping_list[product_name] += 1
-                else:
-                    shopping_list[product_name] = 1
-    
-    return dict(sorted(shopping_list.items(), key=lambda x: x[1], reverse=True))
+    return aggregate_shopping_list([weekly_plan])
 
 
 def print_shopping_list(weekly_plan: Dict[str, Any]) -> None:
@@ -185,6 +156,40 @@ def print_shopping_list(weekly_plan: Dict[str, Any]) -> None:
     print("="*60)
     print()
     
-    for product, count in shopping_list.items():
-        print(f"• {product} (используется в {count} приемах пищи)")
+    for item in shopping_list:
+        amount = f" — {item.amount}" if item.amount else ""
+        print(f"• {item.product}{amount} (используется в {item.mentions} приемах пищи)")
+
 
+def print_timings(timings: Dict[str, float], total: float, first_day: Optional[float] = None) -> None:
+    """
+    Выводит время выполнения узлов графа.
+    
+    Args:
+        timings: Словарь {имя узла: длительность в секундах}
+        total: Общее время работы графа в секундах
+        first_day: Время до первого готового дня плана в секундах
+    """
+    print("\n⏱️  Время выполнения узлов:")
+    for node, seconds in timings.items():
+        print(f"  - {node}: {seconds:.2f} с")
+    if first_day is not None:
+        print(f"  - Первый день плана: {first_day:.2f} с")
+    print(f"  - Всего: {total:.2f} с")
+
+
+def print_validation_report(report: Dict[str, Any]) -> None:
+    """
+    Выводит результат локальной проверки плана.
+    
+    Args:
+        report: Словарь с результатом проверки (PlanValidationReport)
+    """
+    if report["valid"]:
+        print("\n✅ План прошел проверку калорийности и макронутриентов")
+        return
+    
+    print(f"\n⚠️  Найдено нарушений: {len(report['violations'])}")
+    for violation in report["violations"]:
+        day = f"{violation['day']}: " if violation.get("day") else ""
+        print(f"  • {day}{violation['message']}")
@@ -0,0 +1,100 @@
+"""
+Колоночное хранилище планов: импорт архива и сводка без разбора JSON.
+
+Примеры:
+    python store.py import plans.store plans.jsonl
+    python store.py import plans.store meal_plan.json archive/*.json
+    python store.py stats plans.store
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from export import read_plans
+from src.utils.plan_store import PlanStore
+
+
+def read_archive(paths: Sequence[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Читает планы из JSONL результатов batch.py и отдельных JSON файлов планов.
+    
+    Args:
+        paths: Пути к файлам (.jsonl или .json)
+        
+    Returns:
+        Iterator: Словари планов
+    """
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for _, plan in read_plans(f):
+                    yield plan
+            else:
+                yield json.load(f)
+
+
+def import_plans(store_path: str, paths: Sequence[str]) -> None:
+    """Дописывает планы из файлов в хранилище."""
+    started = time.perf_counter()
+    with PlanStore(store_path) as store:
+        added = store.append(read_archive(paths))
+    elapsed = time.perf_counter() - started
+    print(f"🗄️ Добавлено планов: {len(added)} за {elapsed:.1f} с, всего {len(store)}, "
+          f"{store.size_bytes() / 1024:.0f} КБ", file=sys.stderr)
+
+
+def print_stats(store_path: str) -> None:
+    """Сводка по хранилищу: считается по колонкам без сборки планов."""
+    import numpy as np
+    
+    store = PlanStore(store_path)
+    if not len(store):
+        print("⚠️ Хранилище пусто")
+        return
+    started = time.perf_counter()
+    day_calories = np.bincount(
+        np.repeat(np.arange(store.rows("days")), store.column("days", "meals")),
+        weights=store.column("meals", "calories"),
+        minlength=store.rows("days")
+    )
+    foods = np.bincount(store.column("foods", "food"), minlength=len(store.strings))
+    elapsed = time.perf_counter() - started
+    
+    print(f"🗄️ Планов: {len(store)}, дней: {store.rows('days')}, приемов пищи: {store.rows('meals')}")
+    print(f"💾 Размер: {store.size_bytes() / 1024:.0f} КБ ({store.size_bytes() / len(store):.0f} байт на план)")
+    print(f"🔥 Калорийность дня: среднее {day_calories.mean():.0f} ккал, "
+          f"p5-p95 {np.percentile(day_calories, 5):.0f}-{np.percentile(day_calories, 95):.0f} ккал")
+    print("🥗 Частые продукты:")
+    for string_id in np.argsort(foods)[::-1][:10]:
+        if foods[string_id]:
+            print(f"   • {store.strings[string_id]} — {foods[string_id]}")
+    print(f"⏱️ Подсчет по колонкам: {elapsed * 1000:.1f} мс")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Колоночное хранилище планов питания")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    importer = commands.add_parser("import", help="Дописать планы из JSONL batch.py или JSON файлов")
+    importer.add_argument("store", help="Каталог хранилища")
+    importer.add_argument("paths", nargs="+", help="Файлы .jsonl (результаты batch.py) или .json (план)")
+    
+    stats = commands.add_parser("stats", help="Сводка по хранилищу")
+    stats.add_argument("store", help="Каталог хранилища")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Точка входа."""
+    args = parse_args(argv)
+    if args.command == "import":
+        import_plans(args.store, args.paths)
+    else:
+        print_stats(args.store)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+Модульные тесты.
+"""
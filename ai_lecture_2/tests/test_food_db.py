@@ -0,0 +1,54 @@
+"""
+Тесты разбора строк продуктов по таблице (src/utils/food_db.py).
+"""
+from src.utils.food_db import GRAMS, MILLILITERS, PIECES, get_food_db, parse_number, parse_quantity, parse_unit
+
+
+def _foods(text: str) -> list:
+    return [(portion.food, portion.grams) for portion in get_food_db().parse(text)]
+
+
+def test_grains_without_marker_are_cooked():
+    assert _foods("Рис отварной 200 г") == [("Рис отварной", 200.0)]
+    assert _foods("Гречка (150г)") == [("Гречка отварная", 150.0)]
+    assert get_food_db().meal_nutrients(["Гречка отварная (150г)"]).calories == 165.0
+
+
+def test_dry_weight_is_marked():
+    assert _foods("Бурый рис (120г сухого веса)") == [("Бурый рис сухой", 120.0)]
+    assert _foods("Чечевица красная (120г сухого веса)") == [("Чечевица сухая", 120.0)]
+    assert _foods("Гречневая крупа (80г)") == [("Гречневая крупа", 80.0)]
+
+
+def test_word_order_does_not_matter():
+    assert _foods("Орехи грецкие 30 г") == [("Грецкие орехи", 30.0)]
+    assert _foods("Грецкие орехи (15г)") == [("Грецкие орехи", 15.0)]
+
+
+def test_dish_weight_is_split_between_ingredients():
+    assert _foods("Салат из огурцов и помидоров (200г)") == [("Огурец", 100.0), ("Помидор", 100.0)]
+
+
+def test_pieces_belong_to_their_component():
+    assert _foods("Хлеб и 2 яйца") == [("Цельнозерновой хлеб", 30.0), ("Яйцо", 100.0)]
+    assert _foods("Омлет из 2 яиц") == [("Яйцо", 100.0)]
+
+
+def test_alternatives_share_quantity():
+    assert _foods("Батончик или порция протеина (30г)") == [("Сывороточный протеин", 30.0)]
+
+
+def test_quantity_helpers():
+    assert [parse_number(text) for text in ("1,5", "1/2", "½", "3")] == [1.5, 0.5, 0.5, 3.0]
+    assert parse_unit("ст. л.") == (MILLILITERS, 15.0)
+    assert parse_unit("кг") == (GRAMS, 1000.0)
+    assert parse_unit(None) == (PIECES, 1.0)
+    assert parse_quantity("Оливковое масло 1 ст.л")[:2] == (15.0, MILLILITERS)
+
+
+def test_decimal_fat_percentage_is_not_quantity():
+    assert parse_quantity("Молоко 2,5% 200 мл")[:2] == (200.0, MILLILITERS)
+    assert parse_quantity("Йогурт 1.5% 150 г")[:2] == (150.0, GRAMS)
+    assert _foods("Молоко 2,5% 200 мл") == [("Молоко", 200.0)]
+    assert _foods("Молоко 3.2% 250 мл") == [("Молоко", 250.0)]
+    assert _foods("Творог 5 % 150г") == [("Творог 5%", 150.0)]
@@ -0,0 +1,58 @@
+"""
+Тесты потокового разбора массива дней (src/utils/json_stream.py).
+"""
+import json
+
+from src.utils.json_stream import JsonArrayStreamParser
+
+
+DAYS = [{"day": "Понедельник", "note": "скобки } и ] в строке"}, {"day": "Вторник", "meals": [{"foods": ["Рис"]}]}]
+TEXT = "```json\n" + json.dumps({"week_plan": DAYS, "summary": "Итог"}, ensure_ascii=False) + "\n```"
+
+
+def _feed(parser: JsonArrayStreamParser, text: str, size: int) -> list:
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(parser.feed(text[i:i + size]))
+    return items
+
+
+def test_items_are_emitted_for_any_chunking():
+    for size in (1, 3, 7, len(TEXT)):
+        parser = JsonArrayStreamParser("week_plan")
+        
+        assert _feed(parser, TEXT, size) == DAYS
+        assert parser.done
+        assert parser.buffer == TEXT
+
+
+def test_item_is_emitted_as_soon_as_it_closes():
+    parser = JsonArrayStreamParser("week_plan")
+    first_end = TEXT.index('"}') + 2
+    
+    assert parser.feed(TEXT[:first_end - 1]) == []
+    assert parser.feed(TEXT[first_end - 1:first_end]) == [DAYS[0]]
+
+
+def test_truncated_item_is_not_emitted():
+    parser = JsonArrayStreamParser("week_plan")
+    cut = TEXT.index('"Рис"')
+    
+    assert parser.feed(TEXT[:cut]) == [DAYS[0]]
+    assert not parser.done
+
+
+def test_invalid_item_is_skipped():
+    parser = JsonArrayStreamParser("week_plan")
+    
+    items = parser.feed('{"week_plan": [{"day": 1,, }, {"day": 2}]}')
+    
+    assert items == [{"day": 2}]
+    assert parser.done
+
+
+def test_text_before_array_is_ignored():
+    parser = JsonArrayStreamParser("week_plan")
+    
+    assert parser.feed('Пример: {"other": [{"day": 0}]} ') == []
+    assert parser.feed('{"week_plan": [{"day": 1}]}') == [{"day": 1}]
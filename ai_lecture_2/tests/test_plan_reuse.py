@@ -0,0 +1,81 @@
+"""
+Тесты индекса повторного использования планов (src/utils/plan_reuse.py).
+"""
+import json
+from pathlib import Path
+
+from src.models.schemas import PreferencesAnalysis, UserInput, WeeklyMealPlan
+from src.utils.plan_reuse import PROFILES_FILE, PlanReuseIndex
+
+SAMPLE_PLAN = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "sample_plan.json"
+PREFERENCES = PreferencesAnalysis(allowed_foods=["Овсянка"], restricted_foods=["Свинина"], recommendations="")
+
+
+def _plan(summary: str) -> WeeklyMealPlan:
+    plan = WeeklyMealPlan.model_validate(json.loads(SAMPLE_PLAN.read_text(encoding="utf-8")))
+    plan.summary = summary
+    return plan
+
+
+def _user(**fields) -> UserInput:
+    values = dict(goal="gain_weight", gender="male", weight=75, height=180, age=28, preferences="Без свинины")
+    values.update(fields)
+    return UserInput(**values)
+
+
+def test_nearest_profile_of_same_partition():
+    index = PlanReuseIndex(max_distance=5.0)
+    index.add(_user(), _plan("75 кг"), PREFERENCES, run_id="a")
+    index.add(_user(weight=90), _plan("90 кг"), PREFERENCES, run_id="b")
+    
+    match = index.lookup(_user(weight=76, preferences="  без СВИНИНЫ "))
+    
+    assert match.plan.summary == "75 кг"
+    assert match.run_id == "a"
+    assert match.preferences_analysis == PREFERENCES
+    assert 0 < match.distance <= 5.0
+    # Отдается копия: изменения не попадают в индекс
+    match.plan.summary = "изменен"
+    assert index.lookup(_user()).plan.summary == "75 кг"
+
+
+def test_other_partition_or_far_profile_is_miss():
+    index = PlanReuseIndex(max_distance=5.0)
+    index.add(_user(), _plan("A"), PREFERENCES)
+    
+    assert index.lookup(_user(goal="lose_weight")) is None
+    assert index.lookup(_user(gender="female")) is None
+    assert index.lookup(_user(preferences="Вегетарианец")) is None
+    assert index.lookup(_user(weight=82)) is None
+    assert index.lookup(_user(weight=77)) is not None
+    
+    index.reject()
+    
+    assert index.stats() == {
+        "hits": 0, "misses": 5, "rejected": 1, "hit_rate": 0.0, "plans": 1, "partitions": 1
+    }
+
+
+def test_partition_grows_past_initial_capacity():
+    index = PlanReuseIndex(max_distance=0.5)
+    for age in range(20, 60):
+        index.add(_user(age=age), _plan(str(age)), PREFERENCES)
+    
+    assert len(index) == 40
+    assert index.lookup(_user(age=47)).plan.summary == "47"
+
+
+def test_index_is_restored_from_disk(tmp_path):
+    index = PlanReuseIndex(str(tmp_path))
+    index.add(_user(), _plan("A"), PREFERENCES, run_id="a")
+    index.add(_user(goal="maintain"), _plan("B"), PREFERENCES, run_id="b")
+    # Сбой посреди записи профиля: недописанная строка пропускается
+    with open(tmp_path / PROFILES_FILE, "a", encoding="utf-8") as f:
+        f.write('{"key": "gain_weight|male')
+    
+    restored = PlanReuseIndex(str(tmp_path))
+    
+    assert len(restored) == 2
+    assert restored.lookup(_user(goal="maintain", age=29)).plan.summary == "B"
+    assert restored.lookup(_user()).run_id == "a"
+    assert restored.lookup(_user()).plan.model_dump() == _plan("A").model_dump()
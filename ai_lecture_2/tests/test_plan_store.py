@@ -0,0 +1,56 @@
+"""
+Тесты колоночного хранилища планов (src/utils/plan_store.py).
+"""
+import numpy as np
+import pytest
+
+from src.utils.plan_store import PlanStore
+
+
+def _plan(summary: str) -> dict:
+    meal = {
+        "name": "Завтрак", "time": "08:00", "foods": ["Овсяные хлопья (60г)", "Банан"],
+        "calories": 330.0, "protein_g": 9.0, "fats_g": 4.0, "carbs_g": 60.0
+    }
+    day = {
+        "day": "Понедельник", "meals": [meal, dict(meal, name="Ужин")],
+        "total_calories": 660.0, "total_protein_g": 18.0, "total_fats_g": 8.0, "total_carbs_g": 120.0
+    }
+    return {"week_plan": [day, dict(day, day="Вторник")], "summary": summary}
+
+
+def test_round_trip(tmp_path):
+    with PlanStore(tmp_path) as store:
+        assert store.append([_plan("A"), _plan("B")]) == range(0, 2)
+    
+    store = PlanStore(tmp_path)
+    
+    assert len(store) == 2
+    assert store.get(1).model_dump() == _plan("B")
+
+
+def test_interrupted_append_does_not_corrupt_store(tmp_path, monkeypatch):
+    store = PlanStore(tmp_path)
+    store.append([_plan("A")])
+    
+    # Сбой при записи колонок таблицы приемов пищи: планы и дни уже дописаны
+    real = np.ascontiguousarray
+    calls = {"count": 0}
+    
+    def failing(array):
+        calls["count"] += 1
+        if calls["count"] == 12:
+            raise OSError("Нет места на диске")
+        return real(array)
+    
+    monkeypatch.setattr(np, "ascontiguousarray", failing)
+    with pytest.raises(OSError):
+        store.append([_plan("B")])
+    monkeypatch.setattr(np, "ascontiguousarray", real)
+    
+    store.append([_plan("C")])
+    reopened = PlanStore(tmp_path)
+    
+    assert len(store) == len(reopened) == 2
+    assert [reopened.get(i).summary for i in range(2)] == ["A", "C"]
+    assert reopened.get(1).model_dump() == _plan("C")
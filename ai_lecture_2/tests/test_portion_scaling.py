@@ -0,0 +1,63 @@
+"""
+Тесты пересчета порций под новую норму (src/utils/portion_scaling.py).
+"""
+import pytest
+
+from src.models.schemas import UserInput, WeeklyMealPlan
+from src.utils.food_db import fill_plan_nutrients, get_food_db
+from src.utils.nutrition_calculator import calculate_nutrition
+from src.utils.portion_scaling import retarget_plan, scale_food
+
+
+MEALS = [
+    ("Завтрак", "08:00", ["Овсяные хлопья (60г)", "Молоко 2,5% 200 мл", "Банан"]),
+    ("Обед", "13:00", ["Куриная грудка (150г)", "Рис отварной (200г)", "Огурец (100г)"]),
+    ("Ужин", "19:00", ["Творог 5% 200г", "Грецкие орехи (20г)"])
+]
+
+
+def _plan() -> WeeklyMealPlan:
+    meals = [
+        {"name": name, "time": time, "foods": foods, "calories": 0, "protein_g": 0, "fats_g": 0, "carbs_g": 0}
+        for name, time, foods in MEALS
+    ]
+    days = [
+        {"day": day, "meals": meals, "total_calories": 0, "total_protein_g": 0, "total_fats_g": 0, "total_carbs_g": 0}
+        for day in ("Понедельник", "Вторник")
+    ]
+    plan = WeeklyMealPlan.model_validate({"week_plan": days, "summary": "План"})
+    assert fill_plan_nutrients(plan) == []
+    return plan
+
+
+def test_fat_percentage_is_not_scaled():
+    assert scale_food("Молоко 2,5% 200 мл", 0.7) == "Молоко 2,5% 140 мл"
+    assert scale_food("Йогурт 1.5% 150 г", 1.5) == "Йогурт 1.5% 225 г"
+    assert scale_food("Творог 5% 200г", 1.2) == "Творог 5% 240г"
+
+
+def test_quantities_are_rounded_by_unit():
+    assert scale_food("Овсянка (60г)", 1.3) == "Овсянка (80г)"
+    assert scale_food("2 яйца", 1.6) == "3 яйца"
+    assert scale_food("Оливковое масло 1 ст.л", 1.4) == "Оливковое масло 1.5 ст.л"
+    assert scale_food("Рис 1,5 стакана", 1.2) == "Рис 2 стакана"
+    assert scale_food("Банан", 2.0) == "Банан (2 шт)"
+    assert scale_food("Банан", 1.1) == "Банан"
+
+
+@pytest.mark.parametrize("goal", ["gain_weight", "lose_weight"])
+def test_retarget_plan_matches_new_norm(goal):
+    nutrition = calculate_nutrition(
+        UserInput(goal=goal, gender="male", weight=80, height=180, age=30, preferences="")
+    )
+    plan = retarget_plan(_plan(), nutrition)
+    db = get_food_db()
+    
+    for day in plan.week_plan:
+        assert day.total_calories == pytest.approx(nutrition.daily_calories, rel=0.03)
+        assert day.total_protein_g == pytest.approx(nutrition.protein_g, rel=0.1)
+        # Значения приемов пищи пересчитаны по таблице для новых количеств
+        for meal in day.meals:
+            assert meal.calories == pytest.approx(db.meal_nutrients(meal.foods).calories, abs=0.1)
+        assert day.total_calories == pytest.approx(sum(meal.calories for meal in day.meals), abs=0.1)
+        assert day.meals[0].foods[1].startswith("Молоко 2,5% ")
@@ -0,0 +1,102 @@
+"""
+Тесты локального исправления JSON ответов модели (src/utils/repair.py).
+"""
+import json
+
+from src.utils.repair import loads_lenient, repair_json, truncate_json
+
+
+MEAL = {"name": "Завтрак", "time": "08:00", "foods": ["Овсяные хлопья (60г)"], "calories": 350.0}
+
+
+def _day(name: str, meals: int = 2) -> dict:
+    return {"day": name, "meals": [dict(MEAL) for _ in range(meals)], "total_calories": 350.0 * meals}
+
+
+def _week_text() -> str:
+    week = {"week_plan": [_day(name) for name in ("Понедельник", "Вторник", "Среда")], "summary": "Итог"}
+    return json.dumps(week, ensure_ascii=False, indent=2)
+
+
+def test_repair_strips_fences_and_trailing_commas():
+    text = 'Вот план:\n```json\n{"foods": ["Рис", "Гречка",], "summary": "ok",}\n```'
+    
+    assert json.loads(repair_json(text)) == {"foods": ["Рис", "Гречка"], "summary": "ok"}
+
+
+def test_repair_keeps_commas_inside_strings():
+    text = '{"foods": ["Творог, 5%",]}'
+    
+    assert json.loads(repair_json(text)) == {"foods": ["Творог, 5%"]}
+
+
+def test_repair_does_not_close_truncated_response():
+    text = _week_text()
+    truncated = text[:text.index('"Вторник"') + 40]
+    
+    repaired = repair_json(truncated)
+    
+    try:
+        json.loads(repaired)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError(f"Оборванный ответ принят как валидный: {repaired}")
+
+
+def test_truncate_drops_day_cut_inside_meal():
+    text = _week_text()
+    wednesday = text.index('"Среда"')
+    second_meal = text.index('"name"', text.index('"name"', wednesday) + 1)
+    
+    data = json.loads(truncate_json(text[:second_meal + 20]))
+    
+    assert [day["day"] for day in data["week_plan"]] == ["Понедельник", "Вторник"]
+    assert all(len(day["meals"]) == 2 for day in data["week_plan"])
+    assert "summary" not in data
+
+
+def test_truncate_drops_day_cut_inside_string():
+    text = _week_text()
+    
+    data = json.loads(truncate_json(text[:text.index('"Среда"') + 4]))
+    
+    assert [day["day"] for day in data["week_plan"]] == ["Понедельник", "Вторник"]
+
+
+def test_truncate_drops_day_cut_after_closed_meal():
+    text = _week_text()
+    wednesday = text.index('"Среда"')
+    first_meal_end = text.index("}", wednesday) + 1
+    
+    data = json.loads(truncate_json(text[:first_meal_end]))
+    
+    assert [day["day"] for day in data["week_plan"]] == ["Понедельник", "Вторник"]
+
+
+def test_truncate_keeps_all_days_when_cut_in_summary():
+    text = _week_text()
+    
+    data = json.loads(truncate_json(text[:text.index('"Итог"') + 3]))
+    
+    assert len(data["week_plan"]) == 3
+    assert "summary" not in data
+
+
+def test_truncate_returns_complete_json_unchanged():
+    text = _week_text()
+    
+    assert json.loads(truncate_json(text)) == json.loads(text)
+
+
+def test_truncate_without_complete_element():
+    assert truncate_json('{"week_plan": [{"day": "Понедельник", "meals": [') is None
+    assert loads_lenient('{"day": "Понеде') is None
+
+
+def test_loads_lenient_repairs_and_truncates():
+    text = "```json\n" + _week_text()[:-30]
+    
+    data = loads_lenient(text)
+    
+    assert [day["day"] for day in data["week_plan"]] == ["Понедельник", "Вторник"]
@@ -0,0 +1,127 @@
+"""
+Тесты планировщика запросов (src/utils/scheduler.py) за ScheduledLLM
+против локальной имитации квот провайдера (ThrottlingLLM).
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.utils.cache import PersistentLRUCache
+from src.utils.llm_backends import CachedLLM, LLMResponse, RateLimitError, ScheduledLLM, ThrottlingLLM
+from src.utils.scheduler import RequestScheduler, llm_priority
+
+
+class RecordingLLM:
+    """Стабовая модель: запоминает промпты и отвечает после задержки."""
+    
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.prompts = []
+    
+    def invoke(self, messages, **kwargs):
+        self.prompts.append(messages)
+        time.sleep(self.latency_s)
+        return LLMResponse(content="ответ")
+    
+    async def ainvoke(self, messages, **kwargs):
+        self.prompts.append(messages)
+        await asyncio.sleep(self.latency_s)
+        return LLMResponse(content="ответ")
+    
+    def stream(self, messages, **kwargs):
+        self.prompts.append(messages)
+        for part in ("пер", "вый ", "ответ"):
+            time.sleep(self.latency_s)
+            yield LLMResponse(content=part)
+
+
+def test_interactive_requests_overtake_batch():
+    model = RecordingLLM()
+    scheduler = RequestScheduler(max_concurrency=1, adaptive=False)
+    llm = ScheduledLLM(ThrottlingLLM(model, requests_per_window=0), scheduler)
+    
+    async def submit(priority: str, prompt: str) -> None:
+        with llm_priority(priority):
+            await llm.ainvoke(prompt)
+    
+    async def scenario() -> None:
+        # Единственное место занято: все запросы встают в очередь, пакетные - первыми
+        holder = await scheduler.aacquire()
+        tasks = [
+            asyncio.ensure_future(submit(priority, prompt))
+            for priority, prompt in (("batch", "b1"), ("batch", "b2"), ("interactive", "i1"), ("interactive", "i2"))
+        ]
+        await asyncio.sleep(0.05)
+        assert scheduler.stats()["queued"] == {"interactive": 2, "batch": 2}
+        scheduler.release(holder)
+        await asyncio.gather(*tasks)
+    
+    asyncio.run(scenario())
+    
+    assert model.prompts == ["i1", "i2", "b1", "b2"]
+
+
+def test_token_bucket_keeps_requests_within_provider_quota():
+    # Квота 10 запросов за 0.5 с: сразу уходит 1 запрос, дальше по 18 в секунду
+    provider = ThrottlingLLM(RecordingLLM(), requests_per_window=10, window_s=0.5)
+    scheduler = RequestScheduler(requests_per_minute=10, period_s=0.5, adaptive=False)
+    llm = ScheduledLLM(provider, scheduler)
+    
+    async def scenario() -> None:
+        await asyncio.gather(*(llm.ainvoke(f"запрос {i}") for i in range(12)))
+    
+    started = time.perf_counter()
+    asyncio.run(scenario())
+    elapsed = time.perf_counter() - started
+    
+    assert provider.stats()["rejected"] == 0
+    assert provider.stats()["accepted"] == 12
+    assert elapsed >= 11 / 18 - 0.05
+
+
+def test_rate_limit_halves_concurrency_limit():
+    provider = ThrottlingLLM(RecordingLLM(), requests_per_window=1, window_s=60.0)
+    scheduler = RequestScheduler(max_concurrency=8)
+    llm = ScheduledLLM(provider, scheduler)
+    
+    llm.invoke("первый")
+    assert scheduler.stats()["limit"] == 8
+    
+    with pytest.raises(RateLimitError):
+        llm.invoke("второй")
+    
+    assert scheduler.stats() == {"limit": 4, "in_flight": 0, "queued": {"interactive": 0, "batch": 0}, "throttled": 1}
+
+
+def test_stream_releases_slot_after_last_chunk():
+    scheduler = RequestScheduler(max_concurrency=1, adaptive=False)
+    llm = ScheduledLLM(RecordingLLM(latency_s=0.01), scheduler)
+    
+    chunks = llm.stream("план")
+    first = next(chunks)
+    # Потребитель еще обрабатывает первый кусок, а поток модели уже дочитан
+    deadline = time.monotonic() + 2.0
+    while scheduler.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    
+    assert scheduler.stats()["in_flight"] == 0
+    assert first.content + "".join(chunk.content for chunk in chunks) == "первый ответ"
+
+
+def test_cached_responses_do_not_take_slot():
+    provider = ThrottlingLLM(RecordingLLM(), requests_per_window=1, window_s=60.0)
+    scheduler = RequestScheduler(max_concurrency=1, adaptive=False)
+    llm = CachedLLM(ScheduledLLM(provider, scheduler), PersistentLRUCache(), {"model": "test"})
+    
+    holder = scheduler.acquire()
+    released = threading.Timer(0.05, scheduler.release, args=(holder,))
+    released.start()
+    # Первый запрос ждет место, повторы берутся из кэша даже при занятом месте и исчерпанной квоте
+    assert llm.invoke("план").content == "ответ"
+    holder = scheduler.acquire()
+    assert [llm.invoke("план").content for _ in range(3)] == ["ответ"] * 3
+    scheduler.release(holder)
+    
+    assert provider.stats()["accepted"] == 1
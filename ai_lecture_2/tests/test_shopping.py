@@ -0,0 +1,34 @@
+"""
+Тесты списка покупок (src/utils/shopping.py).
+"""
+from src.utils.shopping import ShoppingListAggregator, format_amount
+
+
+def _amounts(aggregator: ShoppingListAggregator) -> dict:
+    return {item.product: item.amount for item in aggregator.items()}
+
+
+def test_fat_percentage_strings_are_summed_by_volume():
+    aggregator = ShoppingListAggregator()
+    aggregator.add_foods(["Молоко 2,5% 200 мл"])
+    aggregator.add_foods(["Молоко 250 мл"])
+    aggregator.add_foods(["Йогурт 1.5% 150 г", "Творог 5% 200г"])
+    
+    assert _amounts(aggregator) == {"Молоко": "450 мл", "Йогурт натуральный": "150 г", "Творог 5%": "200 г"}
+    assert aggregator.items()[0].mentions == 2
+
+
+def test_mixed_units():
+    aggregator = ShoppingListAggregator()
+    aggregator.add_foods(["Овсяные хлопья (60г)", "Кефир 1 стакан"])
+    aggregator.add_foods(["Овсянка 0.5 кг", "Кефир 1% 300 мл"])
+    # Граммы рядом со штуками пересчитываются в штуки по весу порции (яйцо - 50 г)
+    aggregator.add_foods(["2 яйца"])
+    aggregator.add_foods(["Яйцо (50г)"])
+    
+    assert _amounts(aggregator) == {"Кефир": "500 мл", "Овсяные хлопья": "560 г", "Яйцо": "3 шт"}
+
+
+def test_format_amount():
+    assert format_amount({"г": 1200.0, "шт": 1.5}) == "1.2 кг + 2 шт"
+    assert format_amount({"мл": 1500.0}) == "1.5 л"
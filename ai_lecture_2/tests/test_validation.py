@@ -0,0 +1,90 @@
+"""
+Тесты локальной проверки плана (src/utils/validation.py): validate_batch
+должен находить те же нарушения, что validate_plan.
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from src.models.schemas import UserInput, WeeklyMealPlan
+from src.utils.nutrition_calculator import calculate_nutrition, calculate_nutrition_batch
+from src.utils.validation import recompute_totals, validate_batch, validate_plan
+
+SAMPLE_PLAN = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "sample_plan.json"
+
+
+def _sample() -> WeeklyMealPlan:
+    return WeeklyMealPlan.model_validate(json.loads(SAMPLE_PLAN.read_text(encoding="utf-8")))
+
+
+def _plans() -> list:
+    exact = _sample()
+    
+    mismatch = _sample()
+    mismatch.week_plan[0].total_calories += 120
+    mismatch.week_plan[3].total_fats_g -= 5
+    
+    short = _sample()
+    del short.week_plan[5:]
+    
+    light = _sample()
+    for day in light.week_plan:
+        for meal in day.meals:
+            meal.calories *= 0.8
+            meal.protein_g *= 0.6
+    recompute_totals(light)
+    return [exact, mismatch, short, light]
+
+
+def _key(report) -> list:
+    # Порядок нарушений у проверок разный: сравниваются наборы
+    return sorted((v.day or "", v.kind, v.expected, v.actual, v.message) for v in report.violations)
+
+
+def _kinds(report) -> list:
+    return sorted((v.day or "", v.kind) for v in report.violations)
+
+
+def _profiles() -> list:
+    return [
+        UserInput(goal=goal, gender=gender, weight=weight, height=height, age=age, preferences="")
+        for goal, gender, weight, height, age in (
+            ("gain_weight", "male", 75, 180, 28),
+            ("lose_weight", "female", 68, 165, 35),
+            ("maintain", "male", 90, 190, 50),
+            ("gain_weight", "female", 55, 160, 22),
+        )
+    ]
+
+
+@pytest.mark.parametrize("as_dict", [False, True])
+def test_batch_matches_single_plan_validation(as_dict):
+    plans = _plans()
+    targets = [calculate_nutrition(user) for user in _profiles()]
+    
+    expected = [validate_plan(plan, target) for plan, target in zip(plans, targets)]
+    reports = validate_batch([plan.model_dump() if as_dict else plan for plan in plans], targets)
+    
+    assert [report.valid for report in reports] == [report.valid for report in expected]
+    assert [_key(report) for report in reports] == [_key(report) for report in expected]
+    assert {v.kind for report in expected for v in report.violations} >= {"days", "totals_mismatch", "calories", "protein"}
+
+
+def test_batch_accepts_vectorized_targets():
+    plans = _plans()
+    users = _profiles()
+    targets = calculate_nutrition_batch(
+        [u.goal for u in users], [u.gender for u in users],
+        [u.weight for u in users], [u.height for u in users], [u.age for u in users]
+    )
+    
+    reports = validate_batch(plans, targets)
+    expected = [validate_plan(plan, calculate_nutrition(user)) for plan, user in zip(plans, users)]
+    
+    # calculate_nutrition округляет норму, поэтому сравниваются дни и виды нарушений
+    assert [_kinds(report) for report in reports] == [_kinds(report) for report in expected]
+
+
+def test_empty_batch():
+    assert validate_batch([], []) == []
@@ -0,0 +1,207 @@
+"""
+Тесты инкрементального перезапуска MealPlannerWorkflow (rerun) и
+продолжения запуска по чекпоинтам (resume) на стабовых агентах: узлы
+выполняются вне графа, модель не нужна.
+"""
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from src.graph.retry import RetryPolicy
+from src.graph.workflow import LLM_NODES, MealPlannerWorkflow
+from src.models.schemas import NutritionAnalysis, PreferencesAnalysis, UserInput, WeeklyMealPlan
+from src.utils.checkpoints import CheckpointStore
+from src.utils.nutrition_calculator import calculate_nutrition
+from src.utils.portion_scaling import retarget_plan
+
+SAMPLE_PLAN = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "sample_plan.json"
+USER = UserInput(goal="gain_weight", gender="male", weight=75, height=180, age=28, preferences="Без свинины")
+
+
+def _plan(nutrition: NutritionAnalysis) -> WeeklyMealPlan:
+    plan = WeeklyMealPlan.model_validate(json.loads(SAMPLE_PLAN.read_text(encoding="utf-8")))
+    return retarget_plan(plan, nutrition)
+
+
+class StubNutritionAgent:
+    def __init__(self, calls: list):
+        self.calls = calls
+    
+    def analyze(self, user_input: UserInput) -> NutritionAnalysis:
+        self.calls.append("analyze_nutrition")
+        return calculate_nutrition(user_input)
+    
+    async def aanalyze(self, user_input: UserInput) -> NutritionAnalysis:
+        return self.analyze(user_input)
+
+
+class StubPreferencesAgent:
+    def __init__(self, calls: list):
+        self.calls = calls
+    
+    def analyze(self, user_input: UserInput) -> PreferencesAnalysis:
+        self.calls.append("analyze_preferences")
+        restricted = ["Свинина"] if "свинин" in user_input.preferences.lower() else []
+        return PreferencesAnalysis(allowed_foods=["Овсянка"], restricted_foods=restricted, recommendations="")
+    
+    async def aanalyze(self, user_input: UserInput) -> PreferencesAnalysis:
+        return self.analyze(user_input)
+
+
+class StubFinalAgent:
+    def __init__(self, calls: list):
+        self.calls = calls
+        self.error = None
+    
+    def create_plan(self, user_input, nutrition, preferences, on_day=None, completed_days=None) -> WeeklyMealPlan:
+        self.calls.append("create_plan")
+        if self.error is not None:
+            raise self.error
+        plan = _plan(nutrition)
+        if on_day is not None:
+            for daily_plan in plan.week_plan:
+                on_day(daily_plan)
+        return plan
+    
+    async def acreate_plan(self, *args, **kwargs) -> WeeklyMealPlan:
+        return self.create_plan(*args, **kwargs)
+
+
+def _workflow(checkpoints=None) -> MealPlannerWorkflow:
+    # Конструктор создает агентов с моделью и граф LangGraph: rerun не нужно ни то, ни другое
+    workflow = MealPlannerWorkflow.__new__(MealPlannerWorkflow)
+    workflow.max_concurrency = 2
+    workflow.plan_index = None
+    workflow.checkpoints = checkpoints
+    workflow.retry_policies = {node: RetryPolicy(max_attempts=1) for node in LLM_NODES}
+    workflow._tokens = {}
+    workflow._semaphore = None
+    workflow._semaphore_loop = None
+    workflow.calls = []
+    workflow.nutrition_agent = StubNutritionAgent(workflow.calls)
+    workflow.preferences_agent = StubPreferencesAgent(workflow.calls)
+    workflow.final_agent = StubFinalAgent(workflow.calls)
+    return workflow
+
+
+def _previous_state(workflow: MealPlannerWorkflow) -> dict:
+    state = workflow.rerun({"user_input": USER}, USER, run_id="first")
+    workflow.calls.clear()
+    return state
+
+
+def _rerun(workflow: MealPlannerWorkflow, mode: str, previous_state: dict, user_input: UserInput, **kwargs) -> dict:
+    if mode == "async":
+        return asyncio.run(workflow.arerun(previous_state, user_input, **kwargs))
+    return workflow.rerun(previous_state, user_input, **kwargs)
+
+
+def test_first_run_executes_all_nodes():
+    workflow = _workflow()
+    
+    state = workflow.rerun({"user_input": USER}, USER)
+    
+    assert workflow.calls == ["analyze_nutrition", "analyze_preferences", "create_plan"]
+    assert state["error"] is None
+    assert state["validation"] is not None
+    assert workflow._tokens == {}
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_preferences_change_reruns_only_dependent_nodes(mode):
+    workflow = _workflow()
+    previous = _previous_state(workflow)
+    
+    state = _rerun(workflow, mode, previous, USER.model_copy(update={"preferences": "Вегетарианец"}))
+    
+    assert workflow.calls == ["analyze_preferences", "create_plan"]
+    assert state["nutrition_analysis"] == previous["nutrition_analysis"]
+    assert state["preferences_analysis"].restricted_foods == []
+    assert state["validation"] is not None
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_weight_change_retargets_previous_plan_without_model(mode):
+    workflow = _workflow()
+    previous = _previous_state(workflow)
+    before = previous["final_plan"].model_dump()
+    days = []
+    
+    state = _rerun(workflow, mode, previous, USER.model_copy(update={"weight": 82}), on_day=days.append)
+    
+    assert workflow.calls == ["analyze_nutrition"]
+    assert state["nutrition_analysis"].daily_calories > previous["nutrition_analysis"].daily_calories
+    assert state["validation"].valid
+    assert [day.day for day in days] == [day.day for day in state["final_plan"].week_plan]
+    # Блюда те же, меняются только количества
+    meals = state["final_plan"].week_plan[0].meals
+    assert [meal.name for meal in meals] == [meal.name for meal in previous["final_plan"].week_plan[0].meals]
+    assert meals[0].foods != previous["final_plan"].week_plan[0].meals[0].foods
+    # Прошлое состояние не изменяется
+    assert previous["final_plan"].model_dump() == before
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_unchanged_input_only_revalidates(mode):
+    workflow = _workflow()
+    previous = _previous_state(workflow)
+    
+    state = _rerun(workflow, mode, previous, USER.model_copy(update={"preferences": "  без СВИНИНЫ"}))
+    
+    assert workflow.calls == []
+    assert state["final_plan"] == previous["final_plan"]
+    assert state["final_plan"] is not previous["final_plan"]
+    assert state["validation"] is not None
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_resume_repeats_only_failed_nodes(mode):
+    workflow = _workflow(CheckpointStore())
+    workflow.final_agent.error = RuntimeError("503 Service Unavailable")
+    
+    failed = workflow.rerun({"user_input": USER}, USER, run_id="run")
+    
+    assert failed["error"]
+    assert workflow.checkpoints.status("run") == "error"
+    
+    workflow.final_agent.error = None
+    workflow.calls.clear()
+    days = []
+    if mode == "async":
+        state = asyncio.run(workflow.aresume("run", on_day=days.append))
+    else:
+        state = workflow.resume("run", on_day=days.append)
+    
+    assert workflow.calls == ["create_plan"]
+    assert state["error"] is None
+    assert state["nutrition_analysis"] == failed["nutrition_analysis"]
+    assert len(days) == len(state["final_plan"].week_plan)
+    assert workflow.checkpoints.status("run") == "ok"
+
+
+def test_cancelled_run_is_closed_and_resumable():
+    workflow = _workflow(CheckpointStore())
+    workflow.final_agent.error = asyncio.CancelledError()
+    
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(workflow.arerun({"user_input": USER}, USER, run_id="run"))
+    
+    assert workflow._tokens == {}
+    assert workflow.checkpoints.status("run") == "error"
+    
+    workflow.final_agent.error = None
+    workflow.calls.clear()
+    state = workflow.resume("run")
+    
+    assert workflow.calls == ["create_plan"]
+    assert state["final_plan"] is not None
+    assert workflow.checkpoints.status("run") == "ok"
+
+
+def test_resume_requires_checkpoints():
+    with pytest.raises(ValueError):
+        _workflow().resume("run")
+    with pytest.raises(KeyError):
+        _workflow(CheckpointStore()).resume("unknown")